@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, JSON, LargeBinary
+from sqlalchemy import create_engine, text, Column, Integer, String, Text, DateTime, JSON, LargeBinary, Float, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -36,8 +36,18 @@ class CV(Base):
     raw_data = Column(JSON, nullable=True)  # Store original parsed data
     # embedding moved to ChromaDB
     has_embedding = Column(Integer, default=0)  # Flag to track if embedding exists
+    embedding_text_hash = Column(String, nullable=True)  # sha256 của text đã embed, để phát hiện vector cũ
+    embedding_model = Column(String, nullable=True)  # Model đã dùng để tạo embedding
+    has_field_embeddings = Column(Integer, default=0)  # Đã có vector từng field (skills, role, ...) trong ChromaDB
+    has_chunk_embeddings = Column(Integer, default=0)  # Đã có vector chunk kinh nghiệm trong cv_chunk_embeddings
+    minhash_signature = Column(LargeBinary, nullable=True)  # MinHash của text trích xuất (xem DedupService)
+    duplicate_of = Column(Integer, nullable=True, index=True)  # CV gốc nếu CV này là bản gần trùng
+    extracted_text = Column(Text, nullable=True)  # Text trích xuất từ file, được index trong cv_fts
+    parser_version = Column(String, nullable=True)  # Prompt/model đã parse record (openai_service.PARSER_VERSION)
+    thumbnail_path = Column(String, nullable=True)  # Ảnh trang 1 (xem PreviewService), None nếu chưa có
+    preview_path = Column(String, nullable=True)  # File text xem trước
     created_at = Column(DateTime, default=datetime.utcnow)
-    status = Column(String, default="new")  # new, awaiting_interview, interviewed, etc.
+    status = Column(String, default="new", index=True)  # new, awaiting_interview, interviewed, etc.
 
 class JobDescription(Base):
     __tablename__ = "job_descriptions"
@@ -56,7 +66,14 @@ class JobDescription(Base):
     raw_data = Column(JSON, nullable=True)  # Store original parsed data
     # embedding moved to ChromaDB
     has_embedding = Column(Integer, default=0)  # Flag to track if embedding exists
+    embedding_text_hash = Column(String, nullable=True)  # sha256 của text đã embed, để phát hiện vector cũ
+    embedding_model = Column(String, nullable=True)  # Model đã dùng để tạo embedding
+    has_field_embeddings = Column(Integer, default=0)  # Đã có vector từng field (skills, role, ...) trong ChromaDB
     priority = Column(String, default="medium")  # Priority: high, medium, low
+    extracted_text = Column(Text, nullable=True)  # Text trích xuất từ file, được index trong jd_fts
+    parser_version = Column(String, nullable=True)
+    thumbnail_path = Column(String, nullable=True)
+    preview_path = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class ComparisonHistory(Base):
@@ -67,10 +84,158 @@ class ComparisonHistory(Base):
     jd_id = Column(Integer, nullable=False)
     match_score = Column(Text, nullable=False)  # Store as JSON string
     comparison_result = Column(JSON, nullable=False)  # Full comparison result
+    model_tier = Column(String, nullable=True)  # template, fast, expensive (xem ModelRouter)
+    model = Column(String, nullable=True)  # OpenAI model đã dùng, None nếu trả lời bằng template
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class ReindexJob(Base):
+    __tablename__ = "reindex_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    target = Column(String, nullable=False, default="all")  # cv, jd, all
+    status = Column(String, nullable=False, default="pending")  # pending, running, completed, failed, interrupted
+    force = Column(Integer, default=0)  # 1 = re-embed tất cả, kể cả vector còn mới
+    batch_size = Column(Integer, default=64)
+    concurrency = Column(Integer, default=4)
+    # Checkpoint: id lớn nhất đã xử lý xong cho mỗi loại record
+    last_cv_id = Column(Integer, default=0)
+    last_jd_id = Column(Integer, default=0)
+    total = Column(Integer, default=0)
+    scanned = Column(Integer, default=0)
+    embedded = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    elapsed_seconds = Column(Float, default=0.0)  # Cộng dồn qua các lần resume
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class CVJDMatch(Base):
+    """Materialized top-k CV matches per JD, updated incrementally on ingest"""
+    __tablename__ = "cv_jd_matches"
+    __table_args__ = (
+        UniqueConstraint("jd_id", "cv_id", name="uq_cv_jd_matches_jd_cv"),
+        Index("ix_cv_jd_matches_jd_similarity", "jd_id", "similarity"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    jd_id = Column(Integer, nullable=False)
+    cv_id = Column(Integer, nullable=False, index=True)
+    similarity = Column(Float, nullable=False)  # Cosine similarity giữa embedding CV và JD
+    rule_score = Column(Float, nullable=True)  # Điểm của ComparisonService (0-1)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class CVSkill(Base):
+    """Normalized CV skills (một row cho mỗi cặp CV-skill) để filter AND/OR bằng index"""
+    __tablename__ = "cv_skills"
+    __table_args__ = (
+        UniqueConstraint("cv_id", "skill", name="uq_cv_skills_cv_skill"),
+        Index("ix_cv_skills_skill_cv", "skill", "cv_id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cv_id = Column(Integer, nullable=False)
+    skill = Column(String, nullable=False)  # Đã chuẩn hóa (lowercase, alias), xem SkillIndex.normalize_skill
+
+class CVLanguage(Base):
+    __tablename__ = "cv_languages"
+    __table_args__ = (
+        UniqueConstraint("cv_id", "language", name="uq_cv_languages_cv_language"),
+        Index("ix_cv_languages_language_cv", "language", "cv_id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cv_id = Column(Integer, nullable=False)
+    language = Column(String, nullable=False)  # english, japanese, ... (MetadataEncoder.normalize_language)
+
+class JDSkill(Base):
+    __tablename__ = "jd_skills"
+    __table_args__ = (
+        UniqueConstraint("jd_id", "skill", name="uq_jd_skills_jd_skill"),
+        Index("ix_jd_skills_skill_jd", "skill", "jd_id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    jd_id = Column(Integer, nullable=False)
+    skill = Column(String, nullable=False)
+    required = Column(Integer, default=1)  # 1 = required_skills, 0 = preferred_skills
+
+class TableVersion(Base):
+    """Change counter per table, bumped by triggers on every insert/update/delete (see create_version_triggers)"""
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+# Bảng có version dùng cho ETag / cache của các endpoint list
+VERSIONED_TABLES = ("cvs", "job_descriptions", "comparison_history")
+
+# Bảng FTS5 (external content) trên text trích xuất, đồng bộ bằng trigger khi insert/update/delete
+FULLTEXT_TABLES = {
+    "cv_fts": ("cvs", ("extracted_text", "name", "role")),
+    "jd_fts": ("job_descriptions", ("extracted_text", "job_title", "company")),
+}
+
+def _fulltext_ddl(fts_table: str, content_table: str, columns) -> list:
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    insert_new = f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values});"
+    delete_old = f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5({column_list}, content='{content_table}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {content_table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {content_table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {column_list} ON {content_table} "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+def create_fulltext_tables():
+    """Create FTS5 tables and triggers (SQLite only); a freshly created index is rebuilt from existing rows"""
+    if engine.dialect.name != "sqlite":
+        return
+    try:
+        with engine.begin() as conn:
+            for fts_table, (content_table, columns) in FULLTEXT_TABLES.items():
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": fts_table}
+                ).first()
+                for statement in _fulltext_ddl(fts_table, content_table, columns):
+                    conn.execute(text(statement))
+                if not exists:
+                    # Các row có trước trigger chưa được index
+                    conn.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+    except Exception as e:
+        print(f"Warning: Could not create full-text index (FTS5): {str(e)}")
+
+def create_version_triggers():
+    """Create the triggers that bump table_versions (SQLite only)
+
+    Mọi thay đổi đều tăng version, kể cả ghi từ session khác, worker nền hay script migration.
+    Version khởi đầu ngẫu nhiên để database tạo lại từ đầu không trùng ETag cũ.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    try:
+        with engine.begin() as conn:
+            for table in VERSIONED_TABLES:
+                conn.execute(
+                    text("INSERT OR IGNORE INTO table_versions(table_name, version) VALUES (:table, abs(random() % 1000000000))"),
+                    {"table": table}
+                )
+                bump = f"UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';"
+                for suffix, event in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE")):
+                    conn.execute(text(
+                        f"CREATE TRIGGER IF NOT EXISTS {table}_version_{suffix} AFTER {event} ON {table} BEGIN {bump} END"
+                    ))
+    except Exception as e:
+        print(f"Warning: Could not create table version triggers: {str(e)}")
+
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    create_fulltext_tables()
+    create_version_triggers()
 
 def get_db():
     db = SessionLocal()
@@ -1,9 +1,15 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
-from typing import List
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query, Request
+from fastapi.encoders import jsonable_encoder
+from typing import List, Optional, Tuple
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse, ORJSONResponse, Response
+from sqlalchemy.orm import Session, defer
 import os
+import asyncio
+import shutil
+import tempfile
+import time
+from urllib.parse import urlencode
 from dotenv import load_dotenv
 
 from app.services.file_processor import FileProcessor
@@ -11,14 +17,35 @@ from app.services.openai_service import OpenAIService
 from app.services.comparison_service import ComparisonService
 from app.services.embedding_service import EmbeddingService
 from app.services.vector_service import VectorService
+from app.services.model_router import ModelRouter
+from app.services.compare_stream import StreamMetrics, sse_event
+from app.services.reindex_service import ReindexService
+from app.services.reprocess_service import ReprocessService
+from app.services.reconciler import ConsistencyReconciler, RECONCILE_ON_STARTUP, RECONCILE_INTERVAL_SECONDS
+from app.services.match_service import MatchService
+from app.services.dedup_service import DedupService
+from app.services.skill_index import SkillIndex
+from app.services.fulltext_service import FullTextService
+from app.services.ingestion_service import IngestionService, RECORD_TYPES, is_supported_file, save_upload
+from app.services.zip_ingest import ZipIngestSource
+from app.services.export_service import ExportService, EXPORT_FORMATS
+from app.services.response_cache import ResponseCache
+from app.services.preview_service import PreviewService
+from app.services.embedding_service import EMBEDDING_FIELDS, DEFAULT_FIELD_WEIGHTS
 from app.models.schemas import (
     FileUploadResponse, ComparisonResult, CVResponse, JDResponse,
     ComparisonRequest, ComparisonHistoryResponse, EmbeddingComparisonRequest,
     EmbeddingComparisonResult, JDEmbeddingComparisonRequest, JDEmbeddingComparisonResult,
     BulkUploadResponse, BulkUploadResult, CVSearchRequest, CVSearchResult,
-    JDSearchRequest, JDSearchResult, UpdateJDPriorityRequest
+    JDSearchRequest, JDSearchResult, UpdateJDPriorityRequest, BatchComparisonRequest,
+    ReindexRequest, ReindexJobResponse, BatchCVSearchRequest, BatchCVSearchResult,
+    BatchJDSearchRequest, BatchJDSearchResult, BatchEmbeddingComparisonRequest,
+    BatchEmbeddingComparisonResult, BatchJDEmbeddingComparisonRequest, BatchJDEmbeddingComparisonResult,
+    CVSkillFilterRequest, CVSkillFilterResult, ReprocessRequest
 )
-from app.database import get_db, create_tables, CV, JobDescription, ComparisonHistory
+from app.middleware import CompressionMiddleware
+from app.static_files import UploadStaticFiles
+from app.database import get_db, create_tables, SessionLocal, CV, JobDescription, ComparisonHistory, CVJDMatch
 import json
 
 load_dotenv()
@@ -38,388 +65,438 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# Nén Brotli/GZip cho response lớn (list, search, export)
+app.add_middleware(CompressionMiddleware)
+
 # Serve uploaded files statically at /uploads
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Tên file đã duy nhất: cache immutable, hỗ trợ Range cho trình xem PDF
+app.mount("/uploads", UploadStaticFiles(directory="uploads"), name="uploads")
 
 file_processor = FileProcessor()
 openai_service = OpenAIService()
 comparison_service = ComparisonService()
 embedding_service = EmbeddingService()
 vector_service = VectorService()
+model_router = ModelRouter(openai_service, comparison_service)
+compare_stream_metrics = StreamMetrics()
+reindex_service = ReindexService(embedding_service, vector_service)
+reconciler = ConsistencyReconciler(vector_service)
+match_service = MatchService(vector_service, comparison_service)
+dedup_service = DedupService()
+skill_index = SkillIndex()
+fulltext_service = FullTextService()
+export_service = ExportService()
+response_cache = ResponseCache()
+response_cache.track_writes(SessionLocal)
+preview_service = PreviewService(file_processor)
+ingestion_service = IngestionService(
+    file_processor, openai_service, embedding_service, vector_service, dedup_service, skill_index, match_service,
+    preview_service=preview_service
+)
+reprocess_service = ReprocessService(
+    file_processor, openai_service, embedding_service, vector_service, skill_index, match_service
+)
+
+@app.on_event("startup")
+async def start_match_worker():
+    match_service.start()
+
+@app.on_event("startup")
+async def start_preview_worker():
+    preview_service.start()
+
+@app.on_event("startup")
+async def backfill_cv_status_metadata():
+    """Backfill the status facet of CV vectors stored before it existed, in the background"""
+    async def _backfill():
+        try:
+            synced = await asyncio.to_thread(_sync_missing_cv_status)
+            if synced:
+                print(f"Backfilled status metadata of {synced} CV vectors")
+            vector_service.cv_status_metadata_ready = True
+        except Exception as e:
+            print(f"Warning: Could not backfill CV status metadata, filtering status in SQL: {str(e)}")
+
+    asyncio.create_task(_backfill())
+
+@app.on_event("startup")
+async def resume_reindex_jobs():
+    """Mark reindex jobs left running by a previous process; optionally resume them"""
+    interrupted = reindex_service.mark_interrupted_jobs()
+    if interrupted and os.getenv("REINDEX_RESUME_ON_STARTUP", "0") == "1":
+        for job_id in interrupted:
+            reindex_service.start(job_id)
+
+@app.on_event("startup")
+async def schedule_reconcile():
+    """Reconcile SQLite and ChromaDB at startup and/or periodically (see RECONCILE_* env vars)"""
+    async def _reconcile_once():
+        try:
+            ConsistencyReconciler._log(await reconciler.reconcile_async())
+        except Exception as e:
+            print(f"Warning: Startup reconcile failed: {str(e)}")
+
+    if RECONCILE_ON_STARTUP:
+        asyncio.create_task(_reconcile_once())
+    if RECONCILE_INTERVAL_SECONDS > 0:
+        asyncio.create_task(reconciler.run_periodically(RECONCILE_INTERVAL_SECONDS))
 
 @app.get("/")
 async def root():
     return {"message": "CV-JD Matching API is running!"}
 
-@app.post("/upload/cv", response_model=FileUploadResponse)
-async def upload_cv(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    if not file.filename.lower().endswith(('.pdf', '.docx')):
+async def _upload_one(record_type: str, file: UploadFile) -> FileUploadResponse:
+    if not is_supported_file(file.filename):
         raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported")
     
     try:
-        # Ensure upload directory exists
-        os.makedirs("uploads/cvs", exist_ok=True)
-        # Create unique filename to avoid conflicts
-        import uuid
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{timestamp}_{unique_id}_{file.filename}"
-        file_path = f"uploads/cvs/{unique_filename}"
-        
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        text_content = file_processor.extract_text(file_path)
-        parsed_cv = await openai_service.parse_cv(text_content, file.filename)
-        
         # Keep the file - don't remove it
-        # os.remove(file_path)
-        
-        # Save to database (without embedding)
-        cv_record = CV(
-            filename=file.filename,
-            file_path=file_path,
-            name=parsed_cv.get('name'),
-            email=parsed_cv.get('email'),
-            phone=parsed_cv.get('phone'),
-            role=parsed_cv.get('role'),
-            role_category=parsed_cv.get('role_category'),
-            experience_years=parsed_cv.get('experience_years'),
-            birth_year=parsed_cv.get('birth_year'),
-            languages=parsed_cv.get('languages', []),
-            project_scope=parsed_cv.get('project_scope', []),
-            customer=parsed_cv.get('customer', []),
-            location=parsed_cv.get('location'),
-            skills=parsed_cv.get('skills', []),
-            education=parsed_cv.get('education', []),
-            work_experience=parsed_cv.get('work_experience', []),
-            certifications=parsed_cv.get('certifications', []),
-            raw_data=parsed_cv,
-            has_embedding=0
-        )
-        db.add(cv_record)
-        db.commit()
-        db.refresh(cv_record)
-        
-        # Generate and store embedding in ChromaDB
-        try:
-            cv_text_for_embedding = embedding_service.create_text_for_embedding(parsed_cv, "cv")
-            embedding = embedding_service.generate_embedding(cv_text_for_embedding)
-            
-            # Store in ChromaDB with metadata
-            metadata = {
-                "name": parsed_cv.get('name', ''),
-                "role": parsed_cv.get('role', ''),
-                "role_category": parsed_cv.get('role_category', ''),
-                "skills_count": len(parsed_cv.get('skills', [])),
-                "experience_years": parsed_cv.get('experience_years', 0),
-                "birth_year": parsed_cv.get('birth_year'),
-                "languages": parsed_cv.get('languages', []),
-                "project_scope": parsed_cv.get('project_scope', []),
-                "customer": parsed_cv.get('customer', []),
-                "location": parsed_cv.get('location', '')
-            }
-            vector_service.store_cv_embedding(cv_record.id, embedding, metadata)
-            
-            # Update flag in SQLite
-            cv_record.has_embedding = 1
-            db.commit()
-            
-        except Exception as e:
-            print(f"Warning: Could not create embedding for CV {cv_record.id}: {str(e)}")
-            # Continue without embedding - not critical
-        
-        return FileUploadResponse(
-            id=cv_record.id,
-            filename=file.filename,
-            file_type="CV",
-            status="success",
-            parsed_data=parsed_cv,
-            created_at=cv_record.created_at
-        )
+        file_path = save_upload(await file.read(), file.filename, RECORD_TYPES[record_type][2])
+        event = await ingestion_service.ingest_one(record_type, file_path, file.filename)
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    if event["stage"] == "failed":
+        raise HTTPException(status_code=500, detail=event["error"])
+    return event["result"]
 
-@app.post("/upload/cvs/bulk", response_model=BulkUploadResponse)
-async def bulk_upload_cvs(files: List[UploadFile] = File(...), db: Session = Depends(get_db)):
-    """
-    Upload multiple CV files at once
-    """
+@app.post("/upload/cv", response_model=FileUploadResponse)
+async def upload_cv(file: UploadFile = File(...)):
+    return await _upload_one("cv", file)
+
+async def _bulk_upload(record_type: str, files: List[UploadFile]) -> BulkUploadResponse:
     if not files:
         raise HTTPException(status_code=400, detail="No files provided")
     
-    results = []
-    successful_uploads = 0
-    failed_uploads = 0
-    
-    for file in files:
-        result = BulkUploadResult(filename=file.filename, success=False)
-        
+    results = [BulkUploadResult(filename=file.filename, success=False) for file in files]
+    items = []
+    for index, file in enumerate(files):
+        # Validate file type
+        if not is_supported_file(file.filename):
+            results[index].error = "Only PDF and DOCX files are supported"
+            continue
         try:
-            # Validate file type
-            if not file.filename.lower().endswith(('.pdf', '.docx')):
-                result.error = "Only PDF and DOCX files are supported"
-                result.success = False
-                failed_uploads += 1
-                results.append(result)
-                continue
-            
-            # Ensure upload directory exists
-            os.makedirs("uploads/cvs", exist_ok=True)
-            
-            # Create unique filename to avoid conflicts
-            import uuid
-            from datetime import datetime
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_id = str(uuid.uuid4())[:8]
-            file_extension = os.path.splitext(file.filename)[1]
-            unique_filename = f"{timestamp}_{unique_id}_{file.filename}"
-            file_path = f"uploads/cvs/{unique_filename}"
-            
-            # Save file
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
-            
-            # Process file
-            text_content = file_processor.extract_text(file_path)
-            parsed_cv = await openai_service.parse_cv(text_content, file.filename)
-            
-            # Save to database
-            cv_record = CV(
-                filename=file.filename,
-                file_path=file_path,
-                name=parsed_cv.get('name'),
-                email=parsed_cv.get('email'),
-                phone=parsed_cv.get('phone'),
-                role=parsed_cv.get('role'),
-                role_category=parsed_cv.get('role_category'),
-                experience_years=parsed_cv.get('experience_years'),
-                birth_year=parsed_cv.get('birth_year'),
-                languages=parsed_cv.get('languages', []),
-                project_scope=parsed_cv.get('project_scope', []),
-                customer=parsed_cv.get('customer', []),
-                location=parsed_cv.get('location'),
-                skills=parsed_cv.get('skills', []),
-                education=parsed_cv.get('education', []),
-                work_experience=parsed_cv.get('work_experience', []),
-                certifications=parsed_cv.get('certifications', []),
-                raw_data=parsed_cv,
-                has_embedding=0
-            )
-            db.add(cv_record)
-            db.commit()
-            db.refresh(cv_record)
-            
-            # Generate and store embedding in ChromaDB
-            try:
-                cv_text_for_embedding = embedding_service.create_text_for_embedding(parsed_cv, "cv")
-                embedding = embedding_service.generate_embedding(cv_text_for_embedding)
-                
-                # Store in ChromaDB with metadata
-                metadata = {
-                    "name": parsed_cv.get('name', ''),
-                    "role": parsed_cv.get('role', ''),
-                    "role_category": parsed_cv.get('role_category', ''),
-                    "skills_count": len(parsed_cv.get('skills', [])),
-                    "experience_years": parsed_cv.get('experience_years', 0)
-                }
-                vector_service.store_cv_embedding(cv_record.id, embedding, metadata)
-                
-                # Update flag in SQLite
-                cv_record.has_embedding = 1
-                db.commit()
-                
-            except Exception as e:
-                print(f"Warning: Could not create embedding for CV {cv_record.id}: {str(e)}")
-                # Continue without embedding - not critical
-            
-            # Create successful response
-            upload_response = FileUploadResponse(
-                id=cv_record.id,
-                filename=file.filename,
-                file_type="CV",
-                status="success",
-                parsed_data=parsed_cv,
-                created_at=cv_record.created_at
-            )
-            
-            result.result = upload_response
-            result.success = True
-            successful_uploads += 1
-            
+            items.append((index, save_upload(await file.read(), file.filename, RECORD_TYPES[record_type][2]), file.filename))
         except Exception as e:
-            db.rollback()
-            result.error = f"Error processing file: {str(e)}"
-            result.success = False
-            failed_uploads += 1
-        
-        results.append(result)
+            results[index].error = f"Error processing file: {str(e)}"
+    
+    # Các file được xử lý song song (BULK_UPLOAD_CONCURRENCY) và ghi theo batch; kết quả giữ thứ tự upload
+    for index, event in (await ingestion_service.ingest_many(record_type, items)).items():
+        if event["stage"] == "failed":
+            results[index].error = event["error"]
+        else:
+            results[index].result = event["result"]
+            results[index].success = True
     
+    successful_uploads = sum(1 for result in results if result.success)
     return BulkUploadResponse(
         total_files=len(files),
         successful_uploads=successful_uploads,
-        failed_uploads=failed_uploads,
+        failed_uploads=len(files) - successful_uploads,
         results=results
     )
 
-@app.post("/upload/jd", response_model=FileUploadResponse)
-async def upload_jd(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    if not file.filename.lower().endswith(('.pdf', '.docx')):
-        raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported")
-    
-    try:
-        # Ensure upload directory exists
-        os.makedirs("uploads/jds", exist_ok=True)
+@app.post("/upload/cvs/bulk", response_model=BulkUploadResponse)
+async def bulk_upload_cvs(files: List[UploadFile] = File(...)):
+    """
+    Upload multiple CV files at once
+    """
+    return await _bulk_upload("cv", files)
 
-        # Create unique filename similar to CV flow
-        import uuid
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{timestamp}_{unique_id}_{file.filename}"
-        file_path = f"uploads/jds/{unique_filename}"
-        
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        text_content = file_processor.extract_text(file_path)
-        parsed_jd = await openai_service.parse_jd(text_content)
-        
-        # Keep the file - don't remove it
-        
-        # Save to database (without embedding)
-        jd_record = JobDescription(
-            filename=file.filename,
-            file_path=file_path,
-            job_title=parsed_jd.get('job_title', ''),
-            job_category=parsed_jd.get('job_category'),
-            company=parsed_jd.get('company', ''),
-            required_skills=parsed_jd.get('required_skills', []),
-            preferred_skills=parsed_jd.get('preferred_skills', []),
-            experience_required=parsed_jd.get('experience_required'),
-            education_required=parsed_jd.get('education_required', []),
-            responsibilities=parsed_jd.get('responsibilities', []),
-            raw_data=parsed_jd,
-            has_embedding=0
-        )
-        db.add(jd_record)
-        db.commit()
-        db.refresh(jd_record)
-        
-        # Generate and store embedding in ChromaDB
+def _progress_line(event: dict, stream_format: str) -> str:
+    data = jsonable_encoder(event)
+    if stream_format == "sse":
+        return sse_event(event["stage"], data)
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+def _progress_response(events, stream_format: str) -> StreamingResponse:
+    return StreamingResponse(
+        (_progress_line(event, stream_format) async for event in events),
+        media_type="text/event-stream" if stream_format == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _bulk_upload_stream(record_type: str, files: List[UploadFile], stream_format: str) -> StreamingResponse:
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided")
+    if stream_format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be one of: ndjson, sse")
+    
+    started = time.perf_counter()
+    # Lưu file trước khi trả response: UploadFile chỉ đọc được trong lúc xử lý request
+    initial_events, items = [], []
+    for index, file in enumerate(files):
+        file_started = time.perf_counter()
+        if not is_supported_file(file.filename):
+            initial_events.append({
+                "index": index, "filename": file.filename, "stage": "failed", "total_ms": 0.0,
+                "error": "Only PDF and DOCX files are supported"
+            })
+            continue
         try:
-            jd_text_for_embedding = embedding_service.create_text_for_embedding(parsed_jd, "jd")
-            embedding = embedding_service.generate_embedding(jd_text_for_embedding)
-            
-            # Store in ChromaDB with metadata
-            metadata = {
-                "job_title": parsed_jd.get('job_title', ''),
-                "job_category": parsed_jd.get('job_category', ''),
-                "company": parsed_jd.get('company', ''),
-                "required_skills_count": len(parsed_jd.get('required_skills', [])),
-                "experience_required": parsed_jd.get('experience_required', 0)
-            }
-            vector_service.store_jd_embedding(jd_record.id, embedding, metadata)
-            
-            # Update flag in SQLite
-            jd_record.has_embedding = 1
-            db.commit()
-            
+            content = await file.read()
+            items.append((index, save_upload(content, file.filename, RECORD_TYPES[record_type][2]), file.filename))
+            elapsed_ms = round((time.perf_counter() - file_started) * 1000, 1)
+            initial_events.append({
+                "index": index, "filename": file.filename, "stage": "saved",
+                "elapsed_ms": elapsed_ms, "total_ms": elapsed_ms, "bytes": len(content)
+            })
         except Exception as e:
-            print(f"Warning: Could not create embedding for JD {jd_record.id}: {str(e)}")
-            # Continue without embedding - not critical
-        
-        return FileUploadResponse(
-            id=jd_record.id,
-            filename=file.filename,
-            file_type="JD",
-            status="success",
-            parsed_data=parsed_jd,
-            created_at=jd_record.created_at
-        )
+            initial_events.append({
+                "index": index, "filename": file.filename, "stage": "failed", "total_ms": 0.0,
+                "error": f"Error processing file: {str(e)}"
+            })
+    
+    async def events():
+        counts = {"completed": 0, "duplicate": 0, "failed": 0}
+        for event in initial_events:
+            if event["stage"] == "failed":
+                counts["failed"] += 1
+            yield event
+        async for event in ingestion_service.stream(record_type, items):
+            if event["stage"] in counts:
+                counts[event["stage"]] += 1
+            yield event
+        yield {
+            "stage": "summary",
+            "total_files": len(files),
+            "successful_uploads": counts["completed"] + counts["duplicate"],
+            "failed_uploads": counts["failed"],
+            "duplicates": counts["duplicate"],
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+    
+    return _progress_response(events(), stream_format)
+
+@app.post("/upload/cvs/bulk/stream")
+async def bulk_upload_cvs_stream(files: List[UploadFile] = File(...),
+                                 stream_format: str = Query("ndjson", alias="format")):
+    """Upload nhiều CV, trả về tiến độ từng file dạng NDJSON (mặc định) hoặc SSE (format=sse)
+
+    Stage: saved, extracted, parsed, stored, embedded, rồi completed | duplicate | failed; cuối cùng là summary.
+    Các file xử lý song song nên event tới theo thứ tự xử lý xong, dùng "index" để ghép với file upload.
+    """
+    return await _bulk_upload_stream("cv", files, stream_format)
+
+@app.post("/upload/cvs/zip")
+async def upload_cvs_zip(file: UploadFile = File(...),
+                         stream_format: str = Query("ndjson", alias="format")):
+    """Upload một file ZIP chứa nhiều CV, tiến độ trả về giống /upload/cvs/bulk/stream
+
+    Member được đọc lần lượt và đưa vào pipeline khi còn slot, không giải nén hết trước.
+    File không phải PDF/DOCX có stage "skipped". Archive vượt ZIP_MAX_MEMBERS / ZIP_MAX_UNCOMPRESSED_MB bị từ chối (400).
+    """
+    if stream_format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be one of: ndjson, sse")
+    
+    started = time.perf_counter()
+    # Chép archive ra file tạm: UploadFile bị đóng khi request kết thúc, còn stream thì chạy tiếp
+    with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as archive_file:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, archive_file)
+    source = ZipIngestSource(archive_file.name, RECORD_TYPES["cv"][2])
+    try:
+        await asyncio.to_thread(source.plan)
+    except ValueError as e:
+        os.remove(archive_file.name)
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        db.rollback()
+        os.remove(archive_file.name)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    
+    async def events():
+        counts = {"completed": 0, "duplicate": 0, "failed": 0, "skipped": 0}
+        
+        def _count(event: dict) -> dict:
+            if event["stage"] in counts:
+                counts[event["stage"]] += 1
+            return event
+        
+        try:
+            for event in source.drain_events():
+                yield _count(event)
+            async for event in ingestion_service.stream("cv", source.items()):
+                # Event saved/skipped/failed của phần đọc archive đi trước event của pipeline
+                for archive_event in source.drain_events():
+                    yield _count(archive_event)
+                yield _count(event)
+            for event in source.drain_events():
+                yield _count(event)
+        finally:
+            os.remove(archive_file.name)
+        yield {
+            "stage": "summary",
+            "total_files": source.total_entries,
+            "successful_uploads": counts["completed"] + counts["duplicate"],
+            "failed_uploads": counts["failed"],
+            "duplicates": counts["duplicate"],
+            "skipped": counts["skipped"],
+            "uncompressed_bytes": source.bytes_read,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+    
+    return _progress_response(events(), stream_format)
+
+@app.post("/upload/jd", response_model=FileUploadResponse)
+async def upload_jd(file: UploadFile = File(...)):
+    return await _upload_one("jd", file)
+
+@app.post("/upload/jds/bulk", response_model=BulkUploadResponse)
+async def bulk_upload_jds(files: List[UploadFile] = File(...)):
+    """
+    Upload multiple JD files at once
+    """
+    return await _bulk_upload("jd", files)
+
+@app.post("/upload/jds/bulk/stream")
+async def bulk_upload_jds_stream(files: List[UploadFile] = File(...),
+                                 stream_format: str = Query("ndjson", alias="format")):
+    """Upload nhiều JD với tiến độ từng file (NDJSON hoặc SSE), cùng stage như /upload/cvs/bulk/stream"""
+    return await _bulk_upload_stream("jd", files, stream_format)
 
 # New endpoints for listing stored data
-@app.get("/cvs", response_model=list[CVResponse])
-async def list_cvs(status: str | None = None, db: Session = Depends(get_db)):
-    query = db.query(CV)
-    if status:
-        query = query.filter(CV.status == status)
-    cvs = query.order_by(CV.created_at.desc()).all()
-    print(cvs)
-    return [
-        CVResponse(
-            id=cv.id,
-            filename=cv.filename,
-            file_url=(f"/uploads/{cv.file_path.split('uploads/')[1]}" if cv.file_path and 'uploads/' in cv.file_path else None),
-            name=cv.name,
-            email=cv.email,
-            phone=cv.phone,
-            role=cv.role,
-            experience_years=cv.experience_years,
-            birth_year=getattr(cv, 'birth_year', None),
-            languages=getattr(cv, 'languages', []) or [],
-            project_scope=getattr(cv, 'project_scope', []) or [],
-            customer=getattr(cv, 'customer', []) or [],
-            location=getattr(cv, 'location', None),
-            skills=cv.skills or [],
-            education=cv.education or [],
-            work_experience=cv.work_experience or [],
-            certifications=cv.certifications or [],
-            created_at=cv.created_at,
-            status=getattr(cv, 'status', 'new')
-        ) for cv in cvs
-    ]
-
-@app.get("/jds", response_model=list[JDResponse])
-async def list_jds(db: Session = Depends(get_db)):
-    jds = db.query(JobDescription).order_by(JobDescription.created_at.desc()).all()
-    return [
-        JDResponse(
-            id=jd.id,
-            filename=jd.filename,
-            file_url=(f"/uploads/{jd.file_path.split('uploads/')[1]}" if getattr(jd, 'file_path', None) and 'uploads/' in jd.file_path else None),
-            job_title=jd.job_title,
-            company=jd.company,
-            required_skills=jd.required_skills or [],
-            preferred_skills=jd.preferred_skills or [],
-            experience_required=jd.experience_required,
-            education_required=jd.education_required or [],
-            responsibilities=jd.responsibilities or [],
-            priority=getattr(jd, 'priority', 'medium'),
-            created_at=jd.created_at
-        ) for jd in jds
-    ]
-
-@app.get("/comparisons", response_model=list[ComparisonHistoryResponse])
-async def list_comparisons(cv_id: int | None = None, jd_id: int | None = None, db: Session = Depends(get_db)):
-    query = db.query(ComparisonHistory)
-    if cv_id is not None:
-        query = query.filter(ComparisonHistory.cv_id == cv_id)
-    if jd_id is not None:
-        query = query.filter(ComparisonHistory.jd_id == jd_id)
-    comparisons = query.order_by(ComparisonHistory.created_at.desc()).all()
-    return [
-        ComparisonHistoryResponse(
-            id=comp.id,
-            cv_id=comp.cv_id,
-            jd_id=comp.jd_id,
-            match_score=float(comp.match_score),
-            comparison_result=comp.comparison_result,
-            created_at=comp.created_at
-        ) for comp in comparisons
-    ]
+def _cv_list_item(cv: CV) -> dict:
+    return {
+        "id": cv.id,
+        "filename": cv.filename,
+        "file_url": _file_url(cv.file_path),
+        "thumbnail_url": _file_url(cv.thumbnail_path),
+        "preview_url": _file_url(cv.preview_path),
+        "name": cv.name,
+        "email": cv.email,
+        "phone": cv.phone,
+        "role": cv.role,
+        "experience_years": cv.experience_years,
+        "birth_year": cv.birth_year,
+        "languages": cv.languages or [],
+        "project_scope": cv.project_scope or [],
+        "customer": cv.customer or [],
+        "location": cv.location,
+        "skills": cv.skills or [],
+        "education": cv.education or [],
+        "work_experience": cv.work_experience or [],
+        "certifications": cv.certifications or [],
+        "created_at": cv.created_at,
+        "status": cv.status or "new"
+    }
+
+def _jd_list_item(jd: JobDescription) -> dict:
+    return {
+        "id": jd.id,
+        "filename": jd.filename,
+        "file_url": _file_url(jd.file_path),
+        "thumbnail_url": _file_url(jd.thumbnail_path),
+        "preview_url": _file_url(jd.preview_path),
+        "job_title": jd.job_title,
+        "company": jd.company,
+        "required_skills": jd.required_skills or [],
+        "preferred_skills": jd.preferred_skills or [],
+        "experience_required": jd.experience_required,
+        "education_required": jd.education_required or [],
+        "responsibilities": jd.responsibilities or [],
+        "priority": jd.priority or "medium",
+        "created_at": jd.created_at
+    }
+
+# List/search trả về dict qua ORJSONResponse: không dựng Pydantic model cho từng row,
+# response_model chỉ còn dùng cho tài liệu OpenAPI
+def _cached_list(request: Request, db: Session, tables: tuple, build) -> Response:
+    """Conditional GET on the table versions: 304 without running the list query, cached body if still current"""
+    key = request.url.path + "?" + urlencode(sorted(request.query_params.multi_items()))
+    versions = response_cache.versions(db, tables)
+    if versions is None:
+        return ORJSONResponse(build())
+    etag = response_cache.etag(key, versions)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if response_cache.matches(request.headers.get("if-none-match"), etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    body = response_cache.get(key, versions)
+    if body is None:
+        body = ORJSONResponse(build()).body
+        response_cache.put(key, versions, etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/cvs", response_model=list[CVResponse], response_class=ORJSONResponse)
+async def list_cvs(request: Request, status: str | None = None, db: Session = Depends(get_db)):
+    def build():
+        # Không load các cột lớn không có trong response
+        query = db.query(CV).options(defer(CV.extracted_text), defer(CV.raw_data), defer(CV.minhash_signature))
+        if status:
+            query = query.filter(CV.status == status)
+        return [_cv_list_item(cv) for cv in query.order_by(CV.created_at.desc()).all()]
+    return _cached_list(request, db, ("cvs",), build)
+
+@app.get("/jds", response_model=list[JDResponse], response_class=ORJSONResponse)
+async def list_jds(request: Request, db: Session = Depends(get_db)):
+    def build():
+        jds = (
+            db.query(JobDescription)
+            .options(defer(JobDescription.extracted_text), defer(JobDescription.raw_data))
+            .order_by(JobDescription.created_at.desc())
+            .all()
+        )
+        return [_jd_list_item(jd) for jd in jds]
+    return _cached_list(request, db, ("job_descriptions",), build)
+
+def _comparison_list_item(comp: ComparisonHistory) -> dict:
+    return {
+        "id": comp.id,
+        "cv_id": comp.cv_id,
+        "jd_id": comp.jd_id,
+        "match_score": float(comp.match_score),
+        "comparison_result": comp.comparison_result,
+        "model_tier": comp.model_tier,
+        "model": comp.model,
+        "created_at": comp.created_at
+    }
+
+@app.get("/comparisons", response_model=list[ComparisonHistoryResponse], response_class=ORJSONResponse)
+async def list_comparisons(request: Request, cv_id: int | None = None, jd_id: int | None = None,
+                           db: Session = Depends(get_db)):
+    def build():
+        query = db.query(ComparisonHistory)
+        if cv_id is not None:
+            query = query.filter(ComparisonHistory.cv_id == cv_id)
+        if jd_id is not None:
+            query = query.filter(ComparisonHistory.jd_id == jd_id)
+        return [_comparison_list_item(comp) for comp in query.order_by(ComparisonHistory.created_at.desc()).all()]
+    return _cached_list(request, db, ("comparison_history",), build)
+
+@app.get("/cache/stats")
+async def response_cache_stats():
+    return response_cache.stats()
+
+def _export_response(target: str, export_format: str, columns: str | None, filters: dict) -> StreamingResponse:
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be one of: ndjson, csv")
+    try:
+        selected = export_service.resolve_columns(target, columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filename = f"{target}_{time.strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    return StreamingResponse(
+        export_service.stream(target, export_format, selected, filters),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/export/cvs")
+async def export_cvs(status: str | None = None, columns: str | None = None,
+                     export_format: str = Query("ndjson", alias="format")):
+    """Xuất toàn bộ CV dạng NDJSON hoặc CSV theo từng batch; columns=id,name,skills để chọn cột"""
+    return _export_response("cvs", export_format, columns, {"status": status})
+
+@app.get("/export/jds")
+async def export_jds(priority: str | None = None, columns: str | None = None,
+                     export_format: str = Query("ndjson", alias="format")):
+    return _export_response("jds", export_format, columns, {"priority": priority})
+
+@app.get("/export/comparisons")
+async def export_comparisons(cv_id: int | None = None, jd_id: int | None = None, columns: str | None = None,
+                             export_format: str = Query("ndjson", alias="format")):
+    return _export_response("comparisons", export_format, columns, {"cv_id": cv_id, "jd_id": jd_id})
 
 @app.post("/cvs/{cv_id}/approve", response_model=CVResponse)
 async def approve_cv(cv_id: int, db: Session = Depends(get_db)):
@@ -428,8 +505,14 @@ async def approve_cv(cv_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail=f"CV with id {cv_id} not found")
     try:
         cv_record.status = "awaiting_interview"
+        # CV không còn ở status 'new' nên không xuất hiện trong match view nữa
+        affected_jd_ids = match_service.remove_cv(db, cv_id)
         db.commit()
         db.refresh(cv_record)
+        # Đồng bộ status facet trong ChromaDB để filter theo status chạy trong ANN query
+        vector_service.update_cv_status(cv_id, cv_record.status)
+        # Top-k của các JD bị hụt một CV: chấm lại để lấp chỗ trống
+        match_service.enqueue_jds(affected_jd_ids)
         return CVResponse(
             id=cv_record.id,
             filename=cv_record.filename,
@@ -489,63 +572,166 @@ async def update_jd_priority(jd_id: int, request: UpdateJDPriorityRequest, db: S
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error updating JD priority: {str(e)}")
 
-@app.post("/cvs/search", response_model=CVSearchResult)
+def _file_url(file_path: str | None) -> str | None:
+    return f"/uploads/{file_path.split('uploads/')[1]}" if file_path and 'uploads/' in file_path else None
+
+def _cv_search_item(cv_record: CV, similarity_score: float) -> dict:
+    return {
+        "cv_id": cv_record.id,
+        "name": cv_record.name,
+        "role": cv_record.role,
+        "experience_years": cv_record.experience_years,
+        "location": cv_record.location,
+        "skills": cv_record.skills or [],
+        "filename": cv_record.filename,
+        "file_url": _file_url(cv_record.file_path),
+        "thumbnail_url": _file_url(cv_record.thumbnail_path),
+        "preview_url": _file_url(cv_record.preview_path),
+        "similarity_score": similarity_score,
+        "email": cv_record.email,
+        "phone": cv_record.phone,
+        "birth_year": getattr(cv_record, 'birth_year', None),
+        "languages": getattr(cv_record, 'languages', []) or [],
+        "project_scope": getattr(cv_record, 'project_scope', []) or [],
+        "customer": getattr(cv_record, 'customer', []) or [],
+        "education": cv_record.education or [],
+        "work_experience": cv_record.work_experience or [],
+        "certifications": cv_record.certifications or [],
+        "created_at": cv_record.created_at.isoformat(),
+        "status": getattr(cv_record, 'status', 'new')
+    }
+
+def _jd_search_item(jd_record: JobDescription, similarity_score: float) -> dict:
+    return {
+        "jd_id": jd_record.id,
+        "job_title": jd_record.job_title,
+        "company": jd_record.company,
+        "required_skills": jd_record.required_skills or [],
+        "preferred_skills": jd_record.preferred_skills or [],
+        "experience_required": jd_record.experience_required,
+        "education_required": jd_record.education_required or [],
+        "responsibilities": jd_record.responsibilities or [],
+        "filename": jd_record.filename,
+        "file_url": _file_url(getattr(jd_record, 'file_path', None)),
+        "thumbnail_url": _file_url(jd_record.thumbnail_path),
+        "preview_url": _file_url(jd_record.preview_path),
+        "similarity_score": similarity_score,
+        "created_at": jd_record.created_at.isoformat()
+    }
+
+def _jd_match_item(jd_record: JobDescription, similarity_score: float) -> dict:
+    return {
+        "jd_id": jd_record.id,
+        "similarity_score": similarity_score,
+        "job_title": jd_record.job_title,
+        "company": jd_record.company,
+        "required_skills": jd_record.required_skills or [],
+        "experience_required": jd_record.experience_required,
+        "created_at": jd_record.created_at.isoformat()
+    }
+
+def _cv_match_item(cv_record: CV, similarity_score: float) -> dict:
+    return {
+        "cv_id": cv_record.id,
+        "similarity_score": similarity_score,
+        "name": cv_record.name,
+        "email": cv_record.email,
+        "role": cv_record.raw_data.get('role') if cv_record.raw_data else None,
+        "skills": cv_record.skills or [],
+        "experience_years": cv_record.experience_years,
+        "created_at": cv_record.created_at.isoformat()
+    }
+
+def _field_weights(field_weights: dict) -> dict:
+    """Validate per-request field weights; an empty dict means the default weights"""
+    unknown = set(field_weights) - set(EMBEDDING_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields in field_weights: {sorted(unknown)}. Allowed: {list(EMBEDDING_FIELDS)}"
+        )
+    return field_weights or DEFAULT_FIELD_WEIGHTS
+
+def _with_details(item: dict, details: dict = None) -> dict:
+    """Attach per-result scoring details (field_scores, best_chunk) to a result item"""
+    if details:
+        item.update(details)
+    return item
+
+def _load_by_ids(db: Session, model, ids) -> dict:
+    """Hydrate many records in a single SQL round-trip"""
+    ids = list(set(ids))
+    if not ids:
+        return {}
+    return {record.id: record for record in db.query(model).filter(model.id.in_(ids)).all()}
+
+def _cv_where(filters: dict, default_status: Optional[str] = None) -> Tuple[Optional[dict], Optional[str]]:
+    """Chroma where for CV facet filters, plus the status to filter in SQL instead
+
+    Status chỉ được đưa vào where khi backfill metadata status của vector CV cũ đã xong.
+    """
+    status = filters.get("status") or default_status
+    if vector_service.cv_status_metadata_ready or not status:
+        return vector_service.metadata_encoder.cv_facet_where(**{**filters, "status": status}), None
+    return vector_service.metadata_encoder.cv_facet_where(**{**filters, "status": None}), status
+
+def _filter_status(cv_records: dict, status: Optional[str]) -> dict:
+    if not status:
+        return cv_records
+    return {cv_id: cv for cv_id, cv in cv_records.items() if (cv.status or "new") == status}
+
+@app.post("/cvs/search", response_model=CVSearchResult, response_class=ORJSONResponse)
 async def search_cvs_by_text(request: CVSearchRequest, db: Session = Depends(get_db)):
     """Tìm kiếm CV bằng text query sử dụng embedding similarity"""
     try:
+        # Facet filters được push xuống ChromaDB query
+        where, sql_status = _cv_where(request.filters.dict() if request.filters else {})
+        
         # Tìm kiếm CV sử dụng vector service
-        similar_cv_ids = vector_service.search_cvs_by_text(
-            query_text=request.query,
-            n_results=request.top_k,
-            similarity_threshold=request.similarity_threshold
-        )
+        details = {}
+        if request.field_weights is not None:
+            # Multi-vector: query so với từng field của CV, cộng có trọng số
+            scored = vector_service.search_by_text_fields(
+                "cv", request.query, _field_weights(request.field_weights),
+                request.top_k, request.similarity_threshold, where
+            )
+            similar_cv_ids = [(cv_id, score) for cv_id, score, _ in scored]
+            details = {cv_id: {"field_scores": scores} for cv_id, _, scores in scored}
+        elif request.chunk_aggregation:
+            # Chunk kinh nghiệm: gộp điểm các chunk theo CV (max hoặc trung bình top-n)
+            query_embedding = embedding_service.generate_embedding(request.query)
+            scored = vector_service.search_cv_chunks(
+                query_embedding.tolist(), request.top_k, request.similarity_threshold,
+                request.chunk_aggregation, request.chunk_top_n, where
+            )
+            similar_cv_ids = [(cv_id, score) for cv_id, score, _ in scored]
+            details = {cv_id: {"best_chunk": chunk} for cv_id, _, chunk in scored}
+        else:
+            similar_cv_ids = vector_service.search_cvs_by_text(
+                query_text=request.query,
+                n_results=request.top_k,
+                similarity_threshold=request.similarity_threshold,
+                where=where
+            )
         
         if not similar_cv_ids:
-            return CVSearchResult(
-                query=request.query,
-                matched_cvs=[],
-                total_matches=0
-            )
+            return ORJSONResponse({"query": request.query, "matched_cvs": [], "total_matches": 0})
         
-        # Lấy thông tin chi tiết của các CV match
-        matched_cvs = []
-        for cv_id, similarity_score in similar_cv_ids:
-            cv_record = db.query(CV).filter(CV.id == cv_id).first()
-            if cv_record:
-                cv_data = {
-                    "cv_id": cv_record.id,
-                    "name": cv_record.name,
-                    "role": cv_record.role,
-                    "experience_years": cv_record.experience_years,
-                    "location": cv_record.location,
-                    "skills": cv_record.skills or [],
-                    "filename": cv_record.filename,
-                    "file_url": (f"/uploads/{cv_record.file_path.split('uploads/')[1]}" if cv_record.file_path and 'uploads/' in cv_record.file_path else None),
-                    "similarity_score": similarity_score,
-                    "email": cv_record.email,
-                    "phone": cv_record.phone,
-                    "birth_year": getattr(cv_record, 'birth_year', None),
-                    "languages": getattr(cv_record, 'languages', []) or [],
-                    "project_scope": getattr(cv_record, 'project_scope', []) or [],
-                    "customer": getattr(cv_record, 'customer', []) or [],
-                    "education": cv_record.education or [],
-                    "work_experience": cv_record.work_experience or [],
-                    "certifications": cv_record.certifications or [],
-                    "created_at": cv_record.created_at.isoformat(),
-                    "status": getattr(cv_record, 'status', 'new')
-                }
-                matched_cvs.append(cv_data)
+        # Lấy thông tin chi tiết của các CV match (một query SQL)
+        cv_records = _filter_status(_load_by_ids(db, CV, [cv_id for cv_id, _ in similar_cv_ids]), sql_status)
+        matched_cvs = [
+            _with_details(_cv_search_item(cv_records[cv_id], similarity_score), details.get(cv_id))
+            for cv_id, similarity_score in similar_cv_ids if cv_id in cv_records
+        ]
         
-        return CVSearchResult(
-            query=request.query,
-            matched_cvs=matched_cvs,
-            total_matches=len(matched_cvs)
-        )
+        return ORJSONResponse({"query": request.query, "matched_cvs": matched_cvs, "total_matches": len(matched_cvs)})
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching CVs: {str(e)}")
 
-@app.post("/jds/search", response_model=JDSearchResult)
+@app.post("/jds/search", response_model=JDSearchResult, response_class=ORJSONResponse)
 async def search_jds_by_text(request: JDSearchRequest, db: Session = Depends(get_db)):
     """Tìm kiếm JD bằng text query sử dụng embedding similarity"""
     try:
@@ -557,47 +743,193 @@ async def search_jds_by_text(request: JDSearchRequest, db: Session = Depends(get
         )
         
         if not similar_jd_ids:
-            return JDSearchResult(
-                query=request.query,
-                matched_jds=[],
-                total_matches=0
-            )
+            return ORJSONResponse({"query": request.query, "matched_jds": [], "total_matches": 0})
         
-        # Lấy thông tin chi tiết của các JD match
-        matched_jds = []
-        for jd_id, similarity_score in similar_jd_ids:
-            jd_record = db.query(JobDescription).filter(JobDescription.id == jd_id).first()
-            if jd_record:
-                jd_data = {
-                    "jd_id": jd_record.id,
-                    "job_title": jd_record.job_title,
-                    "company": jd_record.company,
-                    "required_skills": jd_record.required_skills or [],
-                    "preferred_skills": jd_record.preferred_skills or [],
-                    "experience_required": jd_record.experience_required,
-                    "education_required": jd_record.education_required or [],
-                    "responsibilities": jd_record.responsibilities or [],
-                    "filename": jd_record.filename,
-                    "file_url": (f"/uploads/{jd_record.file_path.split('uploads/')[1]}" if getattr(jd_record, 'file_path', None) and 'uploads/' in jd_record.file_path else None),
-                    "similarity_score": similarity_score,
-                    "created_at": jd_record.created_at.isoformat()
-                }
-                matched_jds.append(jd_data)
+        # Lấy thông tin chi tiết của các JD match (một query SQL)
+        jd_records = _load_by_ids(db, JobDescription, [jd_id for jd_id, _ in similar_jd_ids])
+        matched_jds = [
+            _jd_search_item(jd_records[jd_id], similarity_score)
+            for jd_id, similarity_score in similar_jd_ids if jd_id in jd_records
+        ]
         
-        return JDSearchResult(
-            query=request.query,
-            matched_jds=matched_jds,
-            total_matches=len(matched_jds)
+        return ORJSONResponse({"query": request.query, "matched_jds": matched_jds, "total_matches": len(matched_jds)})
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching JDs: {str(e)}")
+
+@app.post("/cvs/search/batch", response_model=BatchCVSearchResult, response_class=ORJSONResponse)
+async def search_cvs_by_texts(request: BatchCVSearchRequest, db: Session = Depends(get_db)):
+    """Tìm kiếm CV cho nhiều query: một lần embedding, một ChromaDB query, một SQL query"""
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    try:
+        where, sql_status = _cv_where(request.filters.dict() if request.filters else {})
+        
+        similar_lists = vector_service.search_cvs_by_texts(
+            query_texts=request.queries,
+            n_results=request.top_k,
+            similarity_threshold=request.similarity_threshold,
+            where=where
+        )
+        cv_records = _filter_status(
+            _load_by_ids(db, CV, [cv_id for similar in similar_lists for cv_id, _ in similar]), sql_status
         )
         
+        results = []
+        for query, similar in zip(request.queries, similar_lists):
+            matched_cvs = [
+                _cv_search_item(cv_records[cv_id], similarity_score)
+                for cv_id, similarity_score in similar if cv_id in cv_records
+            ]
+            results.append({"query": query, "matched_cvs": matched_cvs, "total_matches": len(matched_cvs)})
+        return ORJSONResponse({"results": results})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching CVs: {str(e)}")
+
+@app.post("/jds/search/batch", response_model=BatchJDSearchResult, response_class=ORJSONResponse)
+async def search_jds_by_texts(request: BatchJDSearchRequest, db: Session = Depends(get_db)):
+    """Tìm kiếm JD cho nhiều query: một lần embedding, một ChromaDB query, một SQL query"""
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    try:
+        similar_lists = vector_service.search_jds_by_texts(
+            query_texts=request.queries,
+            n_results=request.top_k,
+            similarity_threshold=request.similarity_threshold
+        )
+        jd_records = _load_by_ids(db, JobDescription, [jd_id for similar in similar_lists for jd_id, _ in similar])
+        
+        results = []
+        for query, similar in zip(request.queries, similar_lists):
+            matched_jds = [
+                _jd_search_item(jd_records[jd_id], similarity_score)
+                for jd_id, similarity_score in similar if jd_id in jd_records
+            ]
+            results.append({"query": query, "matched_jds": matched_jds, "total_matches": len(matched_jds)})
+        return ORJSONResponse({"results": results})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching JDs: {str(e)}")
 
+@app.post("/cvs/filter", response_model=CVSkillFilterResult, response_class=ORJSONResponse)
+async def filter_cvs(request: CVSkillFilterRequest, db: Session = Depends(get_db)):
+    """Lọc CV theo skill (AND/OR), ngôn ngữ và facet bằng SQL trên bảng cv_skills/cv_languages"""
+    try:
+        query = skill_index.filter_cvs_query(
+            db,
+            all_skills=request.all_skills,
+            any_skills=request.any_skills,
+            languages=request.languages,
+            status=request.status,
+            role_category=request.role_category,
+            min_experience=request.min_experience,
+            max_experience=request.max_experience
+        )
+        total_matches = query.count()
+        cv_records = query.order_by(CV.created_at.desc(), CV.id.desc()).offset(request.offset).limit(request.limit).all()
+        matched_skills = skill_index.matched_skills(
+            db, [cv_record.id for cv_record in cv_records], request.all_skills + request.any_skills
+        )
+        matched_cvs = []
+        for cv_record in cv_records:
+            item = _cv_search_item(cv_record, None)
+            item.pop("similarity_score")
+            item["matched_skills"] = matched_skills.get(cv_record.id, [])
+            matched_cvs.append(item)
+        return ORJSONResponse({"matched_cvs": matched_cvs, "total_matches": total_matches})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error filtering CVs: {str(e)}")
+
+def _fulltext_results(db: Session, target: str, q: str, mode: str, limit: int, offset: int) -> dict:
+    if mode not in ("all", "any", "phrase", "raw"):
+        raise HTTPException(status_code=400, detail="mode must be one of: all, any, phrase, raw")
+    try:
+        hits, total = fulltext_service.search(db, target, q, mode=mode, limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    model, item_builder, id_key = (CV, _cv_match_item, "cv_id") if target == "cv" else (JobDescription, _jd_match_item, "jd_id")
+    records = _load_by_ids(db, model, [hit["id"] for hit in hits])
+    results = []
+    for hit in hits:
+        record = records.get(hit["id"])
+        if record is None:
+            continue
+        item = item_builder(record, None)
+        item.pop("similarity_score")
+        item.update({"score": hit["score"], "snippet": hit["snippet"], "file_url": _file_url(record.file_path)})
+        results.append(item)
+    return {"query": q, "mode": mode, "results": results, "total_matches": total}
+
+@app.get("/cvs/fulltext", response_class=ORJSONResponse)
+async def fulltext_search_cvs(q: str, mode: str = "all", limit: int = 20, offset: int = 0, db: Session = Depends(get_db)):
+    """Tìm từ khóa trong text gốc của CV (FTS5, xếp hạng BM25, có snippet); không gọi OpenAI"""
+    try:
+        return ORJSONResponse(_fulltext_results(db, "cv", q, mode, limit, offset))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching CV text: {str(e)}")
+
+@app.get("/jds/fulltext", response_class=ORJSONResponse)
+async def fulltext_search_jds(q: str, mode: str = "all", limit: int = 20, offset: int = 0, db: Session = Depends(get_db)):
+    try:
+        return ORJSONResponse(_fulltext_results(db, "jd", q, mode, limit, offset))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching JD text: {str(e)}")
+
+@app.post("/maintenance/fulltext/backfill")
+async def backfill_fulltext(rebuild: bool = False):
+    """Trích xuất lại text cho CV/JD upload trước khi text được lưu; rebuild=true dựng lại toàn bộ FTS index"""
+    try:
+        counts = await asyncio.to_thread(fulltext_service.backfill_text, file_processor.extract_text)
+        if rebuild:
+            await asyncio.to_thread(fulltext_service.rebuild)
+        return {"backfilled": counts, "rebuilt": rebuild}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error backfilling full-text index: {str(e)}")
+
+@app.get("/cvs/duplicates")
+async def list_duplicate_clusters(backfill: bool = False, db: Session = Depends(get_db)):
+    """Liệt kê các cụm CV gần trùng; backfill=true tính MinHash cho CV cũ từ file đã lưu trước"""
+    try:
+        backfilled = None
+        if backfill:
+            backfilled = await asyncio.to_thread(dedup_service.backfill_signatures, file_processor.extract_text)
+        clusters = await asyncio.to_thread(dedup_service.clusters)
+        
+        cv_records = _load_by_ids(db, CV, [cv_id for cluster in clusters for cv_id in cluster["cv_ids"]])
+        for cluster in clusters:
+            cluster["cvs"] = [
+                {
+                    "cv_id": cv_id,
+                    "name": cv_records[cv_id].name,
+                    "email": cv_records[cv_id].email,
+                    "filename": cv_records[cv_id].filename,
+                    "file_url": _file_url(cv_records[cv_id].file_path),
+                    "duplicate_of": cv_records[cv_id].duplicate_of,
+                    "status": cv_records[cv_id].status,
+                    "created_at": cv_records[cv_id].created_at.isoformat()
+                }
+                for cv_id in cluster["cv_ids"] if cv_id in cv_records
+            ]
+        return {
+            "total_clusters": len(clusters),
+            "clusters": clusters,
+            "backfilled": backfilled,
+            "index": dedup_service.stats()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing duplicate CVs: {str(e)}")
+
 @app.delete("/cvs")
 async def delete_all_cvs(db: Session = Depends(get_db)):
     try:
-        # Delete all comparison histories related to CVs first
+        # Delete all comparison histories and materialized matches related to CVs first
         db.query(ComparisonHistory).delete()
+        db.query(CVJDMatch).delete()
+        
+        skill_index.clear(db, jds=False)
         
         # Delete all CVs
         deleted_count = db.query(CV).count()
@@ -605,6 +937,14 @@ async def delete_all_cvs(db: Session = Depends(get_db)):
         
         db.commit()
         
+        dedup_service.reset()
+        
+        # Xóa vector tương ứng trong ChromaDB; nếu lỗi, reconciler sẽ dọn orphan sau
+        try:
+            vector_service.clear_cv_embeddings()
+        except Exception as e:
+            print(f"Warning: Could not clear CV embeddings: {str(e)}")
+        
         return {"message": f"Successfully deleted {deleted_count} CVs and related comparison histories"}
     except Exception as e:
         db.rollback()
@@ -613,8 +953,11 @@ async def delete_all_cvs(db: Session = Depends(get_db)):
 @app.delete("/jds")
 async def delete_all_jds(db: Session = Depends(get_db)):
     try:
-        # Delete all comparison histories related to JDs first
+        # Delete all comparison histories and materialized matches related to JDs first
         db.query(ComparisonHistory).delete()
+        db.query(CVJDMatch).delete()
+        
+        skill_index.clear(db, cvs=False)
         
         # Delete all JDs
         deleted_count = db.query(JobDescription).count()
@@ -622,6 +965,12 @@ async def delete_all_jds(db: Session = Depends(get_db)):
         
         db.commit()
         
+        # Xóa vector tương ứng trong ChromaDB; nếu lỗi, reconciler sẽ dọn orphan sau
+        try:
+            vector_service.clear_jd_embeddings()
+        except Exception as e:
+            print(f"Warning: Could not clear JD embeddings: {str(e)}")
+        
         return {"message": f"Successfully deleted {deleted_count} Job Descriptions and related comparison histories"}
     except Exception as e:
         db.rollback()
@@ -671,15 +1020,17 @@ async def compare_cv_jd_with_openai(request: ComparisonRequest, db: Session = De
         if not jd_record:
             raise HTTPException(status_code=404, detail=f"JD with id {request.jd_id} not found")
         
-        # Compare using OpenAI
-        openai_result = await openai_service.compare_cv_jd(cv_record.raw_data, jd_record.raw_data)
+        # Compare using OpenAI (rule score decides template / fast / expensive tier)
+        openai_result = await model_router.compare(cv_record.raw_data, jd_record.raw_data)
         
         # Save comparison history with OpenAI results
         history_record = ComparisonHistory(
             cv_id=request.cv_id,
             jd_id=request.jd_id,
             match_score=str(openai_result.get('match_score', 0)),
-            comparison_result=openai_result
+            comparison_result=openai_result,
+            model_tier=openai_result.get('tier'),
+            model=openai_result.get('model')
         )
         db.add(history_record)
         db.commit()
@@ -688,6 +1039,7 @@ async def compare_cv_jd_with_openai(request: ComparisonRequest, db: Session = De
             "comparison_type": "openai",
             "cv_id": request.cv_id,
             "jd_id": request.jd_id,
+            "tier": openai_result.get('tier'),
             "result": openai_result
         }
     except HTTPException:
@@ -696,6 +1048,141 @@ async def compare_cv_jd_with_openai(request: ComparisonRequest, db: Session = De
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error comparing CV and JD with OpenAI: {str(e)}")
 
+@app.post("/compare/openai/stream")
+async def compare_cv_jd_with_openai_stream(request: ComparisonRequest, db: Session = Depends(get_db)):
+    """Server-sent events: meta, score (ngay khi model trả về), reason (HTML từng đoạn), rồi done hoặc error
+
+    Kết quả cuối được validate và lưu vào ComparisonHistory khi stream hoàn tất.
+    """
+    cv_record = db.query(CV).filter(CV.id == request.cv_id).first()
+    jd_record = db.query(JobDescription).filter(JobDescription.id == request.jd_id).first()
+    if not cv_record:
+        raise HTTPException(status_code=404, detail=f"CV with id {request.cv_id} not found")
+    if not jd_record:
+        raise HTTPException(status_code=404, detail=f"JD with id {request.jd_id} not found")
+    cv_data, jd_data = cv_record.raw_data, jd_record.raw_data
+    started = time.perf_counter()
+    
+    def _elapsed_ms() -> float:
+        return round((time.perf_counter() - started) * 1000, 1)
+    
+    async def event_stream():
+        ttfb_ms = score_ms = None
+        tier = None
+        try:
+            async for event, data in model_router.compare_stream(cv_data, jd_data):
+                if event == "tier":
+                    tier = data["tier"]
+                    yield sse_event("meta", {"cv_id": request.cv_id, "jd_id": request.jd_id, **data})
+                    continue
+                if event == "result":
+                    openai_result = data
+                    break
+                # TTFB = thời điểm nội dung đầu tiên của model tới client
+                if ttfb_ms is None:
+                    ttfb_ms = _elapsed_ms()
+                if event == "score":
+                    score_ms = _elapsed_ms()
+                    yield sse_event("score", {"match_score": data})
+                else:
+                    yield sse_event("reason", {"delta": data})
+            
+            history_db = SessionLocal()
+            try:
+                history_record = ComparisonHistory(
+                    cv_id=request.cv_id,
+                    jd_id=request.jd_id,
+                    match_score=str(openai_result.get('match_score', 0)),
+                    comparison_result=openai_result,
+                    model_tier=openai_result.get('tier'),
+                    model=openai_result.get('model')
+                )
+                history_db.add(history_record)
+                history_db.commit()
+                history_id = history_record.id
+            finally:
+                history_db.close()
+            
+            total_ms = _elapsed_ms()
+            compare_stream_metrics.record(ttfb_ms, score_ms, total_ms, tier)
+            print(f"Compare stream cv={request.cv_id} jd={request.jd_id} tier={tier} "
+                  f"ttfb_ms={ttfb_ms} score_ms={score_ms} total_ms={total_ms}")
+            yield sse_event("done", {
+                "comparison_type": "openai",
+                "cv_id": request.cv_id,
+                "jd_id": request.jd_id,
+                "tier": tier,
+                "history_id": history_id,
+                "result": openai_result,
+                "metrics": {"ttfb_ms": ttfb_ms, "score_ms": score_ms, "total_ms": total_ms}
+            })
+        except Exception as e:
+            compare_stream_metrics.record(ttfb_ms, score_ms, _elapsed_ms(), tier, ok=False)
+            yield sse_event("error", {"detail": f"Error comparing CV and JD with OpenAI: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Tắt buffer của proxy (nginx) để token tới client ngay
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/compare/openai/stream/metrics")
+async def compare_stream_metrics_summary():
+    """p50/p95 TTFB, thời điểm có điểm và tổng thời gian của các stream gần nhất"""
+    return compare_stream_metrics.summary()
+
+@app.post("/compare/openai/batch")
+async def compare_cv_jds_with_openai_batch(request: BatchComparisonRequest, db: Session = Depends(get_db)):
+    """So sánh một CV với nhiều JD, gửi CV một lần cho mỗi nhóm JD thay vì mỗi cặp"""
+    if not request.jd_ids:
+        raise HTTPException(status_code=400, detail="No JD ids provided")
+    
+    try:
+        cv_record = db.query(CV).filter(CV.id == request.cv_id).first()
+        if not cv_record:
+            raise HTTPException(status_code=404, detail=f"CV with id {request.cv_id} not found")
+        
+        # Lấy tất cả JD trong một query, giữ nguyên thứ tự request (bỏ trùng)
+        jd_ids = list(dict.fromkeys(request.jd_ids))
+        jd_records = {
+            jd.id: jd for jd in db.query(JobDescription).filter(JobDescription.id.in_(jd_ids)).all()
+        }
+        missing_ids = [jd_id for jd_id in jd_ids if jd_id not in jd_records]
+        if missing_ids:
+            raise HTTPException(status_code=404, detail=f"JD with id {missing_ids} not found")
+        
+        openai_results = await model_router.compare_batch(
+            cv_record.raw_data,
+            [(jd_id, jd_records[jd_id].raw_data) for jd_id in jd_ids]
+        )
+        
+        # Save comparison history per pair
+        for jd_id in jd_ids:
+            db.add(ComparisonHistory(
+                cv_id=request.cv_id,
+                jd_id=jd_id,
+                match_score=str(openai_results[jd_id].get('match_score', 0)),
+                comparison_result=openai_results[jd_id],
+                model_tier=openai_results[jd_id].get('tier'),
+                model=openai_results[jd_id].get('model')
+            ))
+        db.commit()
+        
+        return {
+            "comparison_type": "openai_batch",
+            "cv_id": request.cv_id,
+            "results": [
+                {"jd_id": jd_id, "tier": openai_results[jd_id].get('tier'), "result": openai_results[jd_id]}
+                for jd_id in jd_ids
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error comparing CV and JDs with OpenAI: {str(e)}")
+
 @app.post("/compare/cv_embedding", response_model=EmbeddingComparisonResult)
 async def find_matching_jds_by_cv_embedding(request: EmbeddingComparisonRequest, db: Session = Depends(get_db)):
     """Tìm các JD phù hợp với CV dựa trên embedding similarity using ChromaDB"""
@@ -709,26 +1196,30 @@ async def find_matching_jds_by_cv_embedding(request: EmbeddingComparisonRequest,
             raise HTTPException(status_code=400, detail="CV embedding not found. Please re-upload the CV.")
         
         # Sử dụng VectorService để tìm JDs tương tự (nhanh hơn rất nhiều!)
-        similar_jds = vector_service.find_similar_jds_for_cv(
-            request.cv_id, 
-            request.top_k, 
-            request.similarity_threshold
-        )
+        details = {}
+        if request.field_weights is not None:
+            try:
+                scored = vector_service.find_similar_by_fields(
+                    "cv", request.cv_id, _field_weights(request.field_weights),
+                    request.top_k, request.similarity_threshold
+                )
+            except ValueError:
+                raise HTTPException(status_code=400, detail="CV field embeddings not found. Run /embeddings/reindex.")
+            similar_jds = [(jd_id, score) for jd_id, score, _ in scored]
+            details = {jd_id: {"field_scores": scores} for jd_id, _, scores in scored}
+        else:
+            similar_jds = vector_service.find_similar_jds_for_cv(
+                request.cv_id, 
+                request.top_k, 
+                request.similarity_threshold
+            )
         
         # Lấy chi tiết JDs từ SQLite
-        matched_jds = []
-        for jd_id, similarity_score in similar_jds:
-            jd_record = db.query(JobDescription).filter(JobDescription.id == jd_id).first()
-            if jd_record:
-                matched_jds.append({
-                    "jd_id": jd_id,
-                    "similarity_score": similarity_score,
-                    "job_title": jd_record.job_title,
-                    "company": jd_record.company,
-                    "required_skills": jd_record.required_skills or [],
-                    "experience_required": jd_record.experience_required,
-                    "created_at": jd_record.created_at.isoformat()
-                })
+        jd_records = _load_by_ids(db, JobDescription, [jd_id for jd_id, _ in similar_jds])
+        matched_jds = [
+            _with_details(_jd_match_item(jd_records[jd_id], similarity_score), details.get(jd_id))
+            for jd_id, similarity_score in similar_jds if jd_id in jd_records
+        ]
         
         return EmbeddingComparisonResult(
             cv_id=request.cv_id,
@@ -753,32 +1244,42 @@ async def find_matching_cvs_by_jd_embedding(request: JDEmbeddingComparisonReques
         if not jd_record.has_embedding:
             raise HTTPException(status_code=400, detail="JD embedding not found. Please re-upload the JD.")
         
+        # Chỉ lấy CV ở status 'new' (mặc định); filter chạy trong ChromaDB query
+        where, sql_status = _cv_where(request.filters.dict() if request.filters else {}, "new")
+        
         # Sử dụng VectorService để tìm CVs tương tự (nhanh hơn rất nhiều!)
-        similar_cvs = vector_service.find_similar_cvs_for_jd(
-            request.jd_id, 
-            request.top_k, 
-            request.similarity_threshold
-        )
+        details = {}
+        if request.field_weights is not None:
+            try:
+                scored = vector_service.find_similar_by_fields(
+                    "jd", request.jd_id, _field_weights(request.field_weights),
+                    request.top_k, request.similarity_threshold, where=where
+                )
+            except ValueError:
+                raise HTTPException(status_code=400, detail="JD field embeddings not found. Run /embeddings/reindex.")
+            similar_cvs = [(cv_id, score) for cv_id, score, _ in scored]
+            details = {cv_id: {"field_scores": scores} for cv_id, _, scores in scored}
+        elif request.chunk_aggregation:
+            scored = vector_service.find_similar_cvs_for_jd_by_chunks(
+                request.jd_id, request.top_k, request.similarity_threshold,
+                request.chunk_aggregation, request.chunk_top_n, where=where
+            )
+            similar_cvs = [(cv_id, score) for cv_id, score, _ in scored]
+            details = {cv_id: {"best_chunk": chunk} for cv_id, _, chunk in scored}
+        else:
+            similar_cvs = vector_service.find_similar_cvs_for_jd(
+                request.jd_id, 
+                request.top_k, 
+                request.similarity_threshold,
+                where=where
+            )
         
         # Lấy chi tiết CVs từ SQLite
-        matched_cvs = []
-        for cv_id, similarity_score in similar_cvs:
-            cv_record = db.query(CV).filter(CV.id == cv_id).first()
-            if not cv_record:
-                continue
-            # Skip CVs that are not in 'new' status (e.g., awaiting_interview, interviewed, etc.)
-            if getattr(cv_record, 'status', 'new') != 'new':
-                continue
-            matched_cvs.append({
-                "cv_id": cv_id,
-                "similarity_score": similarity_score,
-                "name": cv_record.name,
-                "email": cv_record.email,
-                "role": cv_record.raw_data.get('role') if cv_record.raw_data else None,
-                "skills": cv_record.skills or [],
-                "experience_years": cv_record.experience_years,
-                "created_at": cv_record.created_at.isoformat()
-            })
+        cv_records = _filter_status(_load_by_ids(db, CV, [cv_id for cv_id, _ in similar_cvs]), sql_status)
+        matched_cvs = [
+            _with_details(_cv_match_item(cv_records[cv_id], similarity_score), details.get(cv_id))
+            for cv_id, similarity_score in similar_cvs if cv_id in cv_records
+        ]
         
         return JDEmbeddingComparisonResult(
             jd_id=request.jd_id,
@@ -791,6 +1292,220 @@ async def find_matching_cvs_by_jd_embedding(request: JDEmbeddingComparisonReques
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error finding matching CVs: {str(e)}")
 
+@app.post("/compare/cv_embedding/batch", response_model=BatchEmbeddingComparisonResult)
+async def find_matching_jds_by_cv_embeddings(request: BatchEmbeddingComparisonRequest, db: Session = Depends(get_db)):
+    """Tìm JD phù hợp cho nhiều CV; CV chưa có embedding trả về danh sách rỗng"""
+    if not request.cv_ids:
+        raise HTTPException(status_code=400, detail="No CV ids provided")
+    try:
+        cv_ids = list(dict.fromkeys(request.cv_ids))
+        similar_by_cv = vector_service.find_similar_jds_for_cvs(cv_ids, request.top_k, request.similarity_threshold)
+        jd_records = _load_by_ids(
+            db, JobDescription, [jd_id for similar in similar_by_cv.values() for jd_id, _ in similar]
+        )
+        
+        results = []
+        for cv_id in cv_ids:
+            matched_jds = [
+                _jd_match_item(jd_records[jd_id], similarity_score)
+                for jd_id, similarity_score in similar_by_cv.get(cv_id, []) if jd_id in jd_records
+            ]
+            results.append(EmbeddingComparisonResult(cv_id=cv_id, matched_jds=matched_jds, total_matches=len(matched_jds)))
+        return BatchEmbeddingComparisonResult(results=results)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding matching JDs: {str(e)}")
+
+@app.post("/compare/jd_embedding/batch", response_model=BatchJDEmbeddingComparisonResult)
+async def find_matching_cvs_by_jd_embeddings(request: BatchJDEmbeddingComparisonRequest, db: Session = Depends(get_db)):
+    """Tìm CV phù hợp cho nhiều JD; JD chưa có embedding trả về danh sách rỗng"""
+    if not request.jd_ids:
+        raise HTTPException(status_code=400, detail="No JD ids provided")
+    try:
+        where, sql_status = _cv_where(request.filters.dict() if request.filters else {}, "new")
+        
+        jd_ids = list(dict.fromkeys(request.jd_ids))
+        similar_by_jd = vector_service.find_similar_cvs_for_jds(
+            jd_ids, request.top_k, request.similarity_threshold, where=where
+        )
+        cv_records = _filter_status(
+            _load_by_ids(db, CV, [cv_id for similar in similar_by_jd.values() for cv_id, _ in similar]), sql_status
+        )
+        
+        results = []
+        for jd_id in jd_ids:
+            matched_cvs = [
+                _cv_match_item(cv_records[cv_id], similarity_score)
+                for cv_id, similarity_score in similar_by_jd.get(jd_id, []) if cv_id in cv_records
+            ]
+            results.append(JDEmbeddingComparisonResult(jd_id=jd_id, matched_cvs=matched_cvs, total_matches=len(matched_cvs)))
+        return BatchJDEmbeddingComparisonResult(results=results)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding matching CVs: {str(e)}")
+
+@app.get("/jds/{jd_id}/matches", response_model=JDEmbeddingComparisonResult)
+async def get_jd_matches(jd_id: int, limit: int | None = None, db: Session = Depends(get_db)):
+    """Đọc danh sách CV phù hợp đã được tính sẵn (bảng cv_jd_matches) cho một JD"""
+    jd_exists = db.query(JobDescription.id).filter(JobDescription.id == jd_id).first()
+    if not jd_exists:
+        raise HTTPException(status_code=404, detail=f"JD with id {jd_id} not found")
+    matched_cvs = match_service.get_matches(db, jd_id, limit)
+    return JDEmbeddingComparisonResult(jd_id=jd_id, matched_cvs=matched_cvs, total_matches=len(matched_cvs))
+
+@app.post("/matches/rebuild")
+async def rebuild_matches():
+    """Tính lại bảng match cho tất cả JD (JD priority cao chạy trước)"""
+    queued = match_service.enqueue_all_jds()
+    return {"queued_jds": queued, "pending_tasks": match_service.pending()}
+
+@app.post("/embeddings/reindex", response_model=ReindexJobResponse)
+async def start_reindex(request: ReindexRequest):
+    """Tạo lại embedding cho các CV/JD chưa có vector hoặc vector đã cũ (chạy nền)"""
+    try:
+        job = reindex_service.create_job(
+            target=request.target,
+            batch_size=request.batch_size,
+            concurrency=request.concurrency,
+            force=request.force
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    reindex_service.start(job.id)
+    return ReindexJobResponse(**reindex_service.job_progress(job))
+
+@app.get("/embeddings/reindex/{job_id}", response_model=ReindexJobResponse)
+async def get_reindex_job(job_id: int):
+    job = reindex_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Reindex job with id {job_id} not found")
+    return ReindexJobResponse(**reindex_service.job_progress(job))
+
+@app.post("/embeddings/reindex/{job_id}/resume", response_model=ReindexJobResponse)
+async def resume_reindex_job(job_id: int):
+    """Chạy tiếp một job bị gián đoạn/lỗi từ checkpoint cuối cùng"""
+    job = reindex_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Reindex job with id {job_id} not found")
+    if job.status == "completed":
+        raise HTTPException(status_code=400, detail="Reindex job already completed")
+    reindex_service.start(job_id)
+    return ReindexJobResponse(**reindex_service.job_progress(job))
+
+def _sync_metadata(record_type: str, records: list) -> None:
+    if record_type == "cv":
+        metadatas = [vector_service.build_cv_metadata(r.raw_data or {}, r.status) for r in records]
+    else:
+        metadatas = [vector_service.build_jd_metadata(r.raw_data or {}) for r in records]
+    vector_service.update_metadatas(record_type, [r.id for r in records], metadatas)
+
+def _sync_missing_cv_status(batch_size: int = 500) -> int:
+    """Re-encode metadata of CV vectors that have no status facet; returns how many were found"""
+    cv_ids = vector_service.ids_missing_metadata("cv", "status")
+    db = SessionLocal()
+    try:
+        for start in range(0, len(cv_ids), batch_size):
+            records = db.query(CV).filter(CV.id.in_(cv_ids[start:start + batch_size])).all()
+            if records:
+                _sync_metadata("cv", records)
+    finally:
+        db.close()
+    return len(cv_ids)
+
+@app.post("/embeddings/metadata/sync")
+async def sync_vector_metadata(batch_size: int = 500, db: Session = Depends(get_db)):
+    """Encode lại metadata của tất cả vector (không gọi OpenAI), dùng sau khi đổi MetadataEncoder"""
+    try:
+        synced = {"cv": 0, "jd": 0}
+        for record_type, model in (("cv", CV), ("jd", JobDescription)):
+            last_id = 0
+            while True:
+                records = (
+                    db.query(model)
+                    .filter(model.id > last_id, model.has_embedding == 1)
+                    .order_by(model.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not records:
+                    break
+                _sync_metadata(record_type, records)
+                synced[record_type] += len(records)
+                last_id = records[-1].id
+        vector_service.cv_status_metadata_ready = True
+        return {"synced": synced}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error syncing vector metadata: {str(e)}")
+
+@app.get("/embeddings/stats")
+async def get_embedding_stats():
+    """Số vector, tham số HNSW và dung lượng compact store (nếu bật)"""
+    try:
+        return await asyncio.to_thread(vector_service.get_collection_stats)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting embedding stats: {str(e)}")
+
+@app.post("/embeddings/compact/migrate")
+async def migrate_compact_store(target: str = "all"):
+    """Chép vector + metadata từ collection ChromaDB chính sang compact store (chạy một lần sau khi bật COMPACT_VECTOR_STORE)"""
+    if target not in ("cv", "jd", "all"):
+        raise HTTPException(status_code=400, detail="target must be one of: cv, jd, all")
+    if not vector_service.compact_stores:
+        raise HTTPException(status_code=400, detail="Compact vector store is disabled (set COMPACT_VECTOR_STORE=1)")
+    try:
+        migrated = {}
+        for record_type in (["cv", "jd"] if target == "all" else [target]):
+            migrated[record_type] = await asyncio.to_thread(vector_service.migrate_to_compact_store, record_type)
+        return {"migrated": migrated}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error migrating to compact vector store: {str(e)}")
+
+@app.post("/maintenance/reconcile")
+async def reconcile_stores(dry_run: bool = False):
+    """Đối chiếu id giữa SQLite và ChromaDB, sửa các record/vector bị lệch"""
+    try:
+        return await reconciler.reconcile_async(dry_run=dry_run)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reconciling SQLite and ChromaDB: {str(e)}")
+
+@app.post("/maintenance/previews/backfill")
+async def backfill_previews():
+    """Tạo ảnh trang 1 / text xem trước cho các CV, JD upload trước khi có preview (chạy nền)"""
+    try:
+        counts = preview_service.enqueue_missing()
+        return {**counts, "pending": preview_service.pending()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error scheduling previews: {str(e)}")
+
+@app.post("/maintenance/reprocess")
+async def reprocess_records(request: ReprocessRequest):
+    """Parse lại CV/JD có parser_version cũ từ text đã lưu (hoặc trích xuất lại từ file) và cập nhật tại chỗ"""
+    if request.target not in ("cv", "jd", "all"):
+        raise HTTPException(status_code=400, detail="target must be one of: cv, jd, all")
+    if request.ids and request.target == "all":
+        raise HTTPException(status_code=400, detail="ids requires target cv or jd")
+    try:
+        if request.background:
+            reprocess_service.start(request.target, request.concurrency, request.force, request.limit, request.ids)
+            # Nhường event loop để job kịp tạo report ban đầu
+            await asyncio.sleep(0)
+            return {"status": "started", "report": reprocess_service.last_report}
+        return await reprocess_service.run(request.target, request.concurrency, request.force, request.limit, request.ids)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reprocessing records: {str(e)}")
+
+@app.get("/maintenance/reprocess/last")
+async def last_reprocess_report():
+    if reprocess_service.last_report is None:
+        raise HTTPException(status_code=404, detail="Reprocess has not run yet")
+    return reprocess_service.last_report
+
+@app.get("/maintenance/reconcile/last")
+async def last_reconcile_report():
+    if reconciler.last_report is None:
+        raise HTTPException(status_code=404, detail="Reconcile has not run yet")
+    return reconciler.last_report
+
 @app.delete("/database/clear-all")
 async def clear_all_database(db: Session = Depends(get_db)):
     """Xóa hết tất cả dữ liệu trong database và ChromaDB"""
@@ -798,6 +1513,8 @@ async def clear_all_database(db: Session = Depends(get_db)):
         # Delete all comparison histories first (foreign key references)
         comparison_count = db.query(ComparisonHistory).count()
         db.query(ComparisonHistory).delete()
+        db.query(CVJDMatch).delete()
+        skill_index.clear(db)
         
         # Delete all CVs
         cv_count = db.query(CV).count()
@@ -811,6 +1528,7 @@ async def clear_all_database(db: Session = Depends(get_db)):
         vector_service.clear_all_embeddings()
         
         db.commit()
+        dedup_service.reset()
         
         return {
             "message": "Successfully cleared all data from database and ChromaDB",
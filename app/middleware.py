@@ -0,0 +1,41 @@
+import os
+
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    # Brotli là tùy chọn (pip install brotli-asgi); không có thì dùng GZip
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+# Chỉ nén response từ kích thước này trở lên (byte)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_COMPRESS_LEVEL = int(os.getenv("GZIP_COMPRESS_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Stream tiến độ (NDJSON/SSE) phải tới client ngay, bộ nén sẽ giữ lại dữ liệu trong buffer
+UNCOMPRESSED_PATH_SUFFIXES = ("/stream", "/upload/cvs/zip")
+# File upload (PDF/DOCX) đã được nén sẵn
+UNCOMPRESSED_PATH_PREFIXES = ("/uploads/",)
+
+
+class CompressionMiddleware:
+    """Brotli (if installed) or GZip for responses above COMPRESSION_MIN_SIZE, except progress streams"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        if BrotliMiddleware is not None:
+            # Client không hỗ trợ br vẫn nhận gzip
+            self.compressed_app = BrotliMiddleware(
+                app, quality=BROTLI_QUALITY, minimum_size=minimum_size, gzip_fallback=True
+            )
+        else:
+            self.compressed_app = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=GZIP_COMPRESS_LEVEL)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (scope["type"] == "http" and not path.endswith(UNCOMPRESSED_PATH_SUFFIXES)
+                and not path.startswith(UNCOMPRESSED_PATH_PREFIXES)):
+            await self.compressed_app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any, Literal
 from datetime import datetime
 
 class CVSchema(BaseModel):
@@ -39,14 +39,18 @@ class FileUploadResponse(BaseModel):
     id: int
     filename: str
     file_type: str
-    status: str
+    status: str  # success, duplicate (DEDUP_MODE=merge: trả về CV đã có)
     parsed_data: dict
     created_at: datetime
+    duplicate_of: Optional[int] = None
+    duplicate_similarity: Optional[float] = None
 
 class CVResponse(BaseModel):
     id: int
     filename: str
     file_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None  # Ảnh trang 1 (PNG nhỏ), None khi chưa tạo xong
+    preview_url: Optional[str] = None  # Text xem trước
     name: Optional[str] = None
     email: Optional[str] = None
     phone: Optional[str] = None
@@ -68,6 +72,8 @@ class JDResponse(BaseModel):
     id: int
     filename: str
     file_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
     job_title: str
     company: str
     required_skills: List[str] = []
@@ -82,28 +88,47 @@ class ComparisonRequest(BaseModel):
     cv_id: int
     jd_id: int
 
+class BatchComparisonRequest(BaseModel):
+    cv_id: int
+    jd_ids: List[int]
+
 class ComparisonHistoryResponse(BaseModel):
     id: int
     cv_id: int
     jd_id: int
     match_score: float
     comparison_result: dict
+    model_tier: Optional[str] = None
+    model: Optional[str] = None
     created_at: datetime
 
 class EmbeddingComparisonRequest(BaseModel):
     cv_id: int
     similarity_threshold: Optional[float] = 0.7
     top_k: Optional[int] = 10
+    # Multi-vector: {"skills": 0.5, "role": 0.2, "work_history": 0.2, "domain": 0.1}; {} = trọng số mặc định
+    field_weights: Optional[Dict[str, float]] = None
 
 class EmbeddingComparisonResult(BaseModel):
     cv_id: int
     matched_jds: List[Dict[str, Any]] = []
     total_matches: int = 0
 
+class CVFacetFilters(BaseModel):
+    min_experience: Optional[int] = None
+    max_experience: Optional[int] = None
+    languages: List[str] = []  # CV phải có tất cả các ngôn ngữ này
+    markets: List[str] = []  # CV có ít nhất một thị trường khách hàng (JP, VN, USA, ...)
+    status: Optional[str] = None  # new, awaiting_interview, ...
+
 class JDEmbeddingComparisonRequest(BaseModel):
     jd_id: int
     similarity_threshold: Optional[float] = 0.7
     top_k: Optional[int] = 10
+    filters: Optional[CVFacetFilters] = None  # status mặc định là "new"
+    field_weights: Optional[Dict[str, float]] = None
+    chunk_aggregation: Optional[Literal["max", "mean"]] = None  # xếp hạng theo chunk kinh nghiệm làm việc
+    chunk_top_n: int = Field(3, ge=1)  # số chunk tốt nhất được lấy trung bình khi chunk_aggregation="mean"
 
 class JDEmbeddingComparisonResult(BaseModel):
     jd_id: int
@@ -126,12 +151,31 @@ class CVSearchRequest(BaseModel):
     query: str
     similarity_threshold: Optional[float] = 0.6
     top_k: Optional[int] = 10
+    filters: Optional[CVFacetFilters] = None
+    field_weights: Optional[Dict[str, float]] = None
+    chunk_aggregation: Optional[Literal["max", "mean"]] = None
+    chunk_top_n: int = Field(3, ge=1)
 
 class CVSearchResult(BaseModel):
     query: str
     matched_cvs: List[Dict[str, Any]] = []
     total_matches: int = 0
     
+class CVSkillFilterRequest(BaseModel):
+    all_skills: List[str] = []  # CV phải có tất cả các skill này (AND)
+    any_skills: List[str] = []  # CV có ít nhất một skill (OR)
+    languages: List[str] = []  # CV phải có tất cả các ngôn ngữ này
+    status: Optional[str] = None
+    role_category: Optional[str] = None
+    min_experience: Optional[int] = None
+    max_experience: Optional[int] = None
+    limit: int = 50
+    offset: int = 0
+
+class CVSkillFilterResult(BaseModel):
+    matched_cvs: List[Dict[str, Any]] = []
+    total_matches: int = 0
+
 class JDSearchRequest(BaseModel):
     query: str
     similarity_threshold: Optional[float] = 0.6
@@ -142,5 +186,71 @@ class JDSearchResult(BaseModel):
     matched_jds: List[Dict[str, Any]] = []
     total_matches: int = 0
 
+class BatchCVSearchRequest(BaseModel):
+    queries: List[str]
+    similarity_threshold: Optional[float] = 0.6
+    top_k: Optional[int] = 10
+    filters: Optional[CVFacetFilters] = None
+
+class BatchCVSearchResult(BaseModel):
+    results: List[CVSearchResult] = []
+
+class BatchJDSearchRequest(BaseModel):
+    queries: List[str]
+    similarity_threshold: Optional[float] = 0.6
+    top_k: Optional[int] = 10
+
+class BatchJDSearchResult(BaseModel):
+    results: List[JDSearchResult] = []
+
+class BatchEmbeddingComparisonRequest(BaseModel):
+    cv_ids: List[int]
+    similarity_threshold: Optional[float] = 0.7
+    top_k: Optional[int] = 10
+
+class BatchEmbeddingComparisonResult(BaseModel):
+    results: List[EmbeddingComparisonResult] = []
+
+class BatchJDEmbeddingComparisonRequest(BaseModel):
+    jd_ids: List[int]
+    similarity_threshold: Optional[float] = 0.7
+    top_k: Optional[int] = 10
+    filters: Optional[CVFacetFilters] = None  # status mặc định là "new"
+
+class BatchJDEmbeddingComparisonResult(BaseModel):
+    results: List[JDEmbeddingComparisonResult] = []
+
 class UpdateJDPriorityRequest(BaseModel):
-    priority: str  # high, medium, low
\ No newline at end of file
+    priority: str  # high, medium, low
+
+class ReindexRequest(BaseModel):
+    target: str = "all"  # cv, jd, all
+    batch_size: int = 64
+    concurrency: int = 4
+    force: bool = False  # re-embed tất cả kể cả vector còn mới
+
+class ReprocessRequest(BaseModel):
+    target: str = "all"  # cv, jd, all
+    concurrency: int = 4  # số request parse OpenAI chạy song song
+    force: bool = False  # parse lại cả record đã dùng parser version hiện tại
+    limit: Optional[int] = None  # tối đa bao nhiêu record mỗi loại
+    ids: Optional[List[int]] = None  # chỉ xử lý các id này (áp dụng cho target cv hoặc jd)
+    background: bool = True
+
+class ReindexJobResponse(BaseModel):
+    id: int
+    target: str
+    status: str
+    force: bool = False
+    total: int = 0
+    scanned: int = 0
+    embedded: int = 0
+    failed: int = 0
+    progress: float = 0.0
+    elapsed_seconds: float = 0.0
+    embedded_per_second: float = 0.0
+    checkpoint: Dict[str, int] = {}
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,335 @@
+import asyncio
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .comparison_service import ComparisonService
+from .embedding_service import EmbeddingService
+from .file_processor import FileProcessor
+from .ingestion_service import BULK_UPLOAD_CONCURRENCY, INGEST_BATCH_SIZE, is_supported_file
+from .model_router import ModelRouter
+from .openai_service import OpenAIService, PARSER_VERSION
+
+OUTPUT_COLUMNS = (
+    "cv_file", "cv_name", "cv_role", "jd_file", "jd_title", "jd_company",
+    "rule_score", "embedding_similarity", "llm_score", "llm_tier", "llm_model"
+)
+
+
+def _extract_text(file_path: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """Process-pool worker: (file_path, text, error)"""
+    try:
+        return file_path, FileProcessor().extract_text(file_path), None
+    except Exception as e:
+        return file_path, None, str(e)
+
+
+def _as_float(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def list_documents(folder: str) -> List[str]:
+    """Supported files under folder (recursive), sorted for a stable output order"""
+    paths = []
+    for root, _, filenames in os.walk(folder):
+        for filename in filenames:
+            if is_supported_file(filename) and not filename.startswith("."):
+                paths.append(os.path.join(root, filename))
+    return sorted(paths)
+
+
+def document_key(folder: str, file_path: str) -> str:
+    """Checkpoint key: relative path + size + mtime, so an edited file is processed again"""
+    stat = os.stat(file_path)
+    return f"{os.path.relpath(file_path, folder)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class MatchCheckpoint:
+    """Append-only JSONL checkpoint of parsed documents, embeddings and LLM scores
+
+    Mỗi batch xong được ghi ngay; dòng sau ghi đè dòng trước cùng key khi load lại,
+    nên chạy lại cùng lệnh sẽ bỏ qua phần đã xong.
+    """
+
+    def __init__(self, folder: str):
+        os.makedirs(folder, exist_ok=True)
+        self.documents_path = os.path.join(folder, "documents.jsonl")
+        self.scores_path = os.path.join(folder, "llm_scores.jsonl")
+        self.documents: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.scores: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for record in self._read(self.documents_path):
+            # Bản parse bằng prompt/model cũ không dùng lại
+            if record.get("parser_version") == PARSER_VERSION:
+                self.documents[(record["type"], record["key"])] = record
+        for record in self._read(self.scores_path):
+            self.scores.setdefault(record["cv"], {}).update(record["results"])
+
+    @staticmethod
+    def _read(path: str) -> Iterator[Dict[str, Any]]:
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Dòng cuối bị cắt khi tiến trình bị dừng giữa chừng
+                    continue
+
+    @staticmethod
+    def _append(path: str, records: List[Dict[str, Any]]) -> None:
+        with open(path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def save_documents(self, records: List[Dict[str, Any]]) -> None:
+        self._append(self.documents_path, records)
+        for record in records:
+            self.documents[(record["type"], record["key"])] = record
+
+    def save_scores(self, cv_key: str, results: Dict[str, Dict[str, Any]]) -> None:
+        self._append(self.scores_path, [{"cv": cv_key, "results": results}])
+        self.scores.setdefault(cv_key, {}).update(results)
+
+
+class BatchMatcher:
+    """Score every CV in a folder against every JD in another folder, offline from the API database
+
+    Trích xuất text chạy trong process pool; parse OpenAI chạy song song theo batch, embedding
+    một request cho mỗi batch. Ma trận điểm gồm rule score và cosine embedding (tính local),
+    cộng điểm LLM qua ModelRouter nếu không dùng --no-llm.
+    """
+
+    def __init__(self, checkpoint: MatchCheckpoint, use_llm: bool = True, workers: Optional[int] = None,
+                 batch_size: int = INGEST_BATCH_SIZE, concurrency: int = BULK_UPLOAD_CONCURRENCY):
+        self.checkpoint = checkpoint
+        self.use_llm = use_llm
+        self.workers = workers or os.cpu_count()
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.openai_service = OpenAIService()
+        self.embedding_service = EmbeddingService()
+        self.comparison_service = ComparisonService()
+        self.model_router = ModelRouter(self.openai_service, self.comparison_service)
+        self.failures: List[Dict[str, str]] = []
+
+    async def ingest(self, record_type: str, folder: str) -> List[Dict[str, Any]]:
+        """Extract, parse and embed the documents of a folder that are not in the checkpoint yet"""
+        keys = {path: document_key(folder, path) for path in list_documents(folder)}
+        pending = [path for path, key in keys.items() if (record_type, key) not in self.checkpoint.documents]
+        print(f"{record_type.upper()}: {len(keys)} files, {len(keys) - len(pending)} from checkpoint, {len(pending)} to parse")
+
+        if pending:
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = [loop.run_in_executor(pool, _extract_text, path) for path in pending]
+                batch = []
+                for future in asyncio.as_completed(futures):
+                    file_path, text_content, error = await future
+                    if error:
+                        self._fail(record_type, file_path, f"extract: {error}")
+                        continue
+                    batch.append((file_path, text_content))
+                    if len(batch) >= self.batch_size:
+                        await self._parse_batch(record_type, folder, keys, batch)
+                        batch = []
+                if batch:
+                    await self._parse_batch(record_type, folder, keys, batch)
+
+        await self._embed_missing(record_type, [keys[path] for path in keys])
+        return [
+            self.checkpoint.documents[(record_type, keys[path])]
+            for path in keys if (record_type, keys[path]) in self.checkpoint.documents
+        ]
+
+    async def _parse_batch(self, record_type: str, folder: str, keys: Dict[str, str],
+                           batch: List[Tuple[str, str]]) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def _parse(file_path: str, text_content: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    if record_type == "cv":
+                        parsed = await self.openai_service.parse_cv(text_content, os.path.basename(file_path))
+                    else:
+                        parsed = await self.openai_service.parse_jd(text_content)
+                except Exception as e:
+                    self._fail(record_type, file_path, f"parse: {str(e)}")
+                    return None
+                return {
+                    "type": record_type,
+                    "key": keys[file_path],
+                    "file": os.path.relpath(file_path, folder),
+                    "parser_version": PARSER_VERSION,
+                    "parsed": parsed,
+                    "embedding": None
+                }
+
+        records = [record for record in await asyncio.gather(*(_parse(*item) for item in batch)) if record]
+        if records:
+            self.checkpoint.save_documents(records)
+            print(f"{record_type.upper()}: parsed {len(records)}/{len(batch)} in batch")
+
+    async def _embed_missing(self, record_type: str, keys: List[str]) -> None:
+        """One embedding request per batch for the documents that do not have a vector yet"""
+        missing = [
+            self.checkpoint.documents[(record_type, key)] for key in keys
+            if (record_type, key) in self.checkpoint.documents
+            and self.checkpoint.documents[(record_type, key)]["embedding"] is None
+        ]
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            texts = [self.embedding_service.create_text_for_embedding(record["parsed"], record_type) for record in batch]
+            try:
+                embeddings = await asyncio.to_thread(self.embedding_service.generate_embeddings, texts)
+            except Exception as e:
+                # Không dừng cả lần chạy: embedding_similarity để trống, lần chạy sau sẽ thử lại
+                print(f"Warning: Could not embed {len(batch)} {record_type} documents: {str(e)}")
+                continue
+            self.checkpoint.save_documents([
+                {**record, "embedding": embedding.tolist()} for record, embedding in zip(batch, embeddings)
+            ])
+
+    async def score_llm(self, cvs: List[Dict[str, Any]], jds: List[Dict[str, Any]]) -> None:
+        """LLM scores per CV (one batched call per tier via ModelRouter); only missing pairs are sent
+
+        compare_cv_jd_batch chạy request OpenAI trong thread, nên tối đa `concurrency` CV được chấm song song.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        done = 0
+
+        async def _score(cv: Dict[str, Any]) -> None:
+            nonlocal done
+            existing = self.checkpoint.scores.get(cv["key"], {})
+            todo = [(index, jd) for index, jd in enumerate(jds) if jd["key"] not in existing]
+            if not todo:
+                return
+            async with semaphore:
+                try:
+                    results = await self.model_router.compare_batch(cv["parsed"], [(index, jd["parsed"]) for index, jd in todo])
+                except Exception as e:
+                    self._fail("cv", cv["file"], f"llm: {str(e)}")
+                    return
+            self.checkpoint.save_scores(cv["key"], {
+                jds[index]["key"]: {
+                    "match_score": result.get("match_score"),
+                    "tier": result.get("tier"),
+                    "model": result.get("model")
+                }
+                for index, result in results.items()
+            })
+            done += 1
+            if done % 10 == 0:
+                print(f"LLM: scored {done} CVs")
+
+        await asyncio.gather(*(_score(cv) for cv in cvs))
+
+    def rows(self, cvs: List[Dict[str, Any]], jds: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Full CV×JD matrix, one row per pair (CV-major order)"""
+        similarities = self._similarity_matrix(cvs, jds)
+        for i, cv in enumerate(cvs):
+            cv_data = cv["parsed"] or {}
+            llm_scores = self.checkpoint.scores.get(cv["key"], {})
+            for j, jd in enumerate(jds):
+                jd_data = jd["parsed"] or {}
+                llm = llm_scores.get(jd["key"], {}) if self.use_llm else {}
+                similarity = similarities[i, j] if similarities is not None else np.nan
+                yield {
+                    "cv_file": cv["file"],
+                    "cv_name": cv_data.get("name"),
+                    "cv_role": cv_data.get("role"),
+                    "jd_file": jd["file"],
+                    "jd_title": jd_data.get("job_title"),
+                    "jd_company": jd_data.get("company"),
+                    "rule_score": round(self.comparison_service.compare(cv_data, jd_data).match_score, 4),
+                    "embedding_similarity": None if np.isnan(similarity) else round(float(similarity), 4),
+                    "llm_score": _as_float(llm.get("match_score")),
+                    "llm_tier": llm.get("tier"),
+                    "llm_model": llm.get("model")
+                }
+
+    @staticmethod
+    def _similarity_matrix(cvs: List[Dict[str, Any]], jds: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Cosine similarity of all pairs in one matrix product; NaN where a vector is missing"""
+        if not cvs or not jds:
+            return None
+        dim = next((len(doc["embedding"]) for doc in cvs + jds if doc["embedding"] is not None), None)
+        if dim is None:
+            return None
+
+        def _normalized(docs: List[Dict[str, Any]]) -> np.ndarray:
+            matrix = np.full((len(docs), dim), np.nan, dtype=np.float32)
+            for index, doc in enumerate(docs):
+                if doc["embedding"] is not None:
+                    matrix[index] = doc["embedding"]
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            return matrix / np.where(norms == 0, 1, norms)
+
+        return _normalized(cvs) @ _normalized(jds).T
+
+    def _fail(self, record_type: str, file_path: str, error: str) -> None:
+        print(f"Warning: {record_type.upper()} {file_path} failed ({error})")
+        self.failures.append({"type": record_type, "file": file_path, "error": error})
+
+    async def run(self, cv_folder: str, jd_folder: str, output: str, output_format: str = "csv") -> Dict[str, Any]:
+        started = time.perf_counter()
+        cvs = await self.ingest("cv", cv_folder)
+        jds = await self.ingest("jd", jd_folder)
+        if self.use_llm:
+            await self.score_llm(cvs, jds)
+        rows = write_rows(self.rows(cvs, jds), output, output_format)
+        return {
+            "cvs": len(cvs),
+            "jds": len(jds),
+            "rows": rows,
+            "failed": len(self.failures),
+            "failures": self.failures,
+            "token_usage": self.openai_service.token_usage,
+            "seconds": round(time.perf_counter() - started, 2)
+        }
+
+
+def write_rows(rows: Iterator[Dict[str, Any]], output: str, output_format: str = "csv",
+               row_group_size: int = 10000) -> int:
+    """Stream rows to CSV, or to Parquet in row groups (requires pyarrow)"""
+    count = 0
+    if output_format == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+        schema = pa.schema([
+            (column, pa.float64() if column in ("rule_score", "embedding_similarity", "llm_score") else pa.string())
+            for column in OUTPUT_COLUMNS
+        ])
+        with pq.ParquetWriter(output, schema) as writer:
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= row_group_size:
+                    writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                    count += len(chunk)
+                    chunk = []
+            if chunk or count == 0:
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                count += len(chunk)
+        return count
+
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
@@ -0,0 +1,371 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Bật bằng COMPACT_VECTOR_STORE=1: compact store thay cho collection cv/jd chính của ChromaDB
+COMPACT_VECTOR_STORE = os.getenv("COMPACT_VECTOR_STORE", "0") == "1"
+COMPACT_VECTOR_DIR = os.getenv("COMPACT_VECTOR_DIR", "./compact_vectors")
+# Shortlist = n_results * factor ứng viên được rescore bằng float32
+COMPACT_RESCORE_FACTOR = int(os.getenv("COMPACT_RESCORE_FACTOR", "4"))
+
+# Số hàng quét mỗi lần khi search (giới hạn bộ nhớ tạm float32)
+SCAN_CHUNK_ROWS = 8192
+INITIAL_CAPACITY = 1024
+EMPTY_ID = -1
+# Giới hạn số biến trong một câu lệnh IN (...) của SQLite
+SQL_IN_BATCH = 500
+# Số mask `where` được cache (bị xóa mỗi lần ghi)
+WHERE_MASK_CACHE_SIZE = 64
+
+WHERE_OPERATORS = {
+    "$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<=",
+}
+
+# Phần lưu trong file .npy: (dtype, giá trị của hàng trống, có chiều vector không)
+ARRAY_PARTS = {
+    "codes": (np.int8, 0, True),
+    "scales": (np.float32, 0, False),
+    "ids": (np.int64, EMPTY_ID, False),
+    "vectors": (np.float32, 0, True),
+}
+
+
+class CompactVectorStore:
+    """Brute-force int8 index of one collection with float32 rescoring and a metadata sidecar
+
+    Mỗi vector được chuẩn hóa L2 rồi lưu thành:
+    - codes int8 + scale float32 + id int64: phần được quét ở mỗi query, nằm trong page cache
+      (dim + 12 byte/vector, 1548 byte với 1536 chiều).
+    - vectors float32: memmap trên đĩa, chỉ các hàng trong shortlist được đọc khi rescore.
+    - SQLite sidecar (id → row, metadata JSON): tra id và prefilter theo `where` kiểu Chroma
+      ($and/$or/$eq/$ne/$gt/$gte/$lt/$lte/$in/$nin) trước khi quét codes.
+    Hàng của vector đã xóa được dùng lại cho vector mới.
+    """
+
+    def __init__(self, directory: str, name: str):
+        self.directory = directory
+        self.name = name
+        self._lock = threading.Lock()
+        self._codes: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._ids: Optional[np.memmap] = None
+        self._vectors: Optional[np.memmap] = None
+        self._size = 0
+        self._free_rows: List[int] = []
+        self._where_masks: Dict[str, np.ndarray] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, f"{name}_metadata.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (id INTEGER PRIMARY KEY, row INTEGER NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._db.commit()
+        self._load()
+
+    def _path(self, part: str) -> str:
+        return os.path.join(self.directory, f"{self.name}_{part}.npy")
+
+    def _open_arrays(self) -> None:
+        for part in ARRAY_PARTS:
+            setattr(self, f"_{part}", np.load(self._path(part), mmap_mode="r+"))
+
+    def _load(self) -> None:
+        if not os.path.exists(self._path("ids")):
+            return
+        self._open_arrays()
+        # Hàng đã ghi vào .npy nhưng chưa kịp commit vào SQLite (crash giữa chừng) được coi là trống
+        live_rows = np.fromiter((row for (row,) in self._db.execute("SELECT row FROM vectors")), dtype=np.int64)
+        stale = np.ones(self._ids.shape[0], dtype=bool)
+        stale[live_rows] = False
+        stale &= np.asarray(self._ids) != EMPTY_ID
+        if stale.any():
+            self._ids[stale] = EMPTY_ID
+            self._ids.flush()
+        self._size = int(live_rows.max()) + 1 if len(live_rows) else 0
+        self._free_rows = np.flatnonzero(np.asarray(self._ids[:self._size]) == EMPTY_ID).tolist()
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._codes.shape[1] if self._codes is not None else None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def _ensure_capacity(self, rows_needed: int, dim: int) -> None:
+        """Grow the backing files (capacity doubling) so that rows_needed rows fit"""
+        capacity = self._ids.shape[0] if self._ids is not None else 0
+        if rows_needed <= capacity:
+            return
+        new_capacity = max(INITIAL_CAPACITY, capacity * 2, rows_needed)
+        tmp_paths = {}
+        for part, (dtype, fill, has_dim) in ARRAY_PARTS.items():
+            tmp_path = self._path(part) + ".tmp"
+            shape = (new_capacity, dim) if has_dim else (new_capacity,)
+            array = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+            array[...] = fill
+            old = getattr(self, f"_{part}")
+            if old is not None:
+                array[:capacity] = old
+            array.flush()
+            del array
+            tmp_paths[part] = tmp_path
+
+        self._codes = self._scales = self._ids = self._vectors = None
+        for part, tmp_path in tmp_paths.items():
+            os.replace(tmp_path, self._path(part))
+        self._open_arrays()
+
+    @staticmethod
+    def normalize(embeddings: np.ndarray) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    @staticmethod
+    def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Quantize L2-normalized rows to int8 codes + one float32 scale per row"""
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _rows_of(self, ids: List[int]) -> Dict[int, int]:
+        rows = {}
+        for start in range(0, len(ids), SQL_IN_BATCH):
+            batch = ids[start:start + SQL_IN_BATCH]
+            placeholders = ", ".join("?" * len(batch))
+            rows.update(self._db.execute(f"SELECT id, row FROM vectors WHERE id IN ({placeholders})", batch))
+        return rows
+
+    def upsert(self, ids: List[int], embeddings: List[np.ndarray],
+               metadatas: Optional[List[Dict[str, Any]]] = None) -> None:
+        """Insert or replace vectors; metadatas=None keeps the metadata of existing ids"""
+        if not ids:
+            return
+        ids = [int(item_id) for item_id in ids]
+        vectors = self.normalize(np.stack([np.asarray(embedding) for embedding in embeddings]))
+        codes, scales = self.quantize(vectors)
+        with self._lock:
+            if self.dim is not None and codes.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {codes.shape[1]} does not match store dimension {self.dim}")
+            rows = self._rows_of(ids)
+            new_ids = [item_id for item_id in dict.fromkeys(ids) if item_id not in rows]
+            reused = min(len(new_ids), len(self._free_rows))
+            self._ensure_capacity(self._size + len(new_ids) - reused, codes.shape[1])
+            for item_id in new_ids:
+                if self._free_rows:
+                    rows[item_id] = self._free_rows.pop()
+                else:
+                    rows[item_id] = self._size
+                    self._size += 1
+            # Nếu một id xuất hiện nhiều lần, giá trị cuối cùng được ghi
+            row_array = np.array([rows[item_id] for item_id in ids], dtype=np.int64)
+            self._codes[row_array] = codes
+            self._scales[row_array] = scales
+            self._vectors[row_array] = vectors
+            self._ids[row_array] = np.asarray(ids, dtype=np.int64)
+            self._flush()
+
+            if metadatas is None:
+                self._db.executemany(
+                    "INSERT INTO vectors (id, row, metadata) VALUES (?, ?, '{}') "
+                    "ON CONFLICT(id) DO UPDATE SET row = excluded.row",
+                    [(item_id, rows[item_id]) for item_id in ids]
+                )
+            else:
+                self._db.executemany(
+                    "INSERT INTO vectors (id, row, metadata) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET row = excluded.row, metadata = excluded.metadata",
+                    [(item_id, rows[item_id], json.dumps(metadata or {})) for item_id, metadata in zip(ids, metadatas)]
+                )
+            self._db.commit()
+            self._where_masks.clear()
+
+    def update_metadatas(self, ids: List[int], metadatas: List[Dict[str, Any]]) -> None:
+        """Replace metadata of existing ids; unknown ids are ignored"""
+        with self._lock:
+            self._db.executemany(
+                "UPDATE vectors SET metadata = ? WHERE id = ?",
+                [(json.dumps(metadata or {}), int(item_id)) for item_id, metadata in zip(ids, metadatas)]
+            )
+            self._db.commit()
+            self._where_masks.clear()
+
+    def get(self, ids: List[int], include_vectors: bool = True) -> Dict[int, Tuple[Optional[List[float]], Dict[str, Any]]]:
+        """Stored (normalized float32 vector, metadata) per existing id"""
+        ids = [int(item_id) for item_id in ids]
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), SQL_IN_BATCH):
+                batch = ids[start:start + SQL_IN_BATCH]
+                placeholders = ", ".join("?" * len(batch))
+                for item_id, row, metadata in self._db.execute(
+                    f"SELECT id, row, metadata FROM vectors WHERE id IN ({placeholders})", batch
+                ):
+                    vector = self._vectors[row].tolist() if include_vectors else None
+                    found[item_id] = (vector, json.loads(metadata))
+        return found
+
+    def ids(self) -> List[int]:
+        with self._lock:
+            return [item_id for (item_id,) in self._db.execute("SELECT id FROM vectors ORDER BY id")]
+
+    def ids_missing_metadata(self, key: str) -> List[int]:
+        with self._lock:
+            return [
+                item_id for (item_id,) in self._db.execute(
+                    "SELECT id FROM vectors WHERE json_type(metadata, ?) IS NULL ORDER BY id", (self._json_path(key),)
+                )
+            ]
+
+    def delete(self, ids: List[int]) -> None:
+        with self._lock:
+            rows = self._rows_of([int(item_id) for item_id in ids])
+            if not rows:
+                return
+            # SQLite trước: nếu crash trước khi ghi .npy, _load coi các hàng này là trống
+            self._db.executemany("DELETE FROM vectors WHERE id = ?", [(item_id,) for item_id in rows])
+            self._db.commit()
+            row_array = np.array(list(rows.values()), dtype=np.int64)
+            self._ids[row_array] = EMPTY_ID
+            self._scales[row_array] = 0
+            self._flush()
+            self._free_rows.extend(rows.values())
+            self._where_masks.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._codes = self._scales = self._ids = self._vectors = None
+            for part in ARRAY_PARTS:
+                if os.path.exists(self._path(part)):
+                    os.remove(self._path(part))
+            self._db.execute("DELETE FROM vectors")
+            self._db.commit()
+            self._size = 0
+            self._free_rows = []
+            self._where_masks.clear()
+
+    @staticmethod
+    def _json_path(key: str) -> str:
+        return f'$."{key}"'
+
+    @classmethod
+    def _where_sql(cls, where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        """Translate a Chroma `where` clause into a SQL condition on the metadata JSON"""
+        clauses, params = [], []
+        for key, value in where.items():
+            if key in ("$and", "$or"):
+                parts = [cls._where_sql(clause) for clause in value]
+                joiner = " AND " if key == "$and" else " OR "
+                clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+                params.extend(param for _, part_params in parts for param in part_params)
+                continue
+            conditions = value.items() if isinstance(value, dict) else [("$eq", value)]
+            for operator, operand in conditions:
+                if operator in ("$in", "$nin"):
+                    placeholders = ", ".join("?" * len(operand))
+                    negation = "NOT " if operator == "$nin" else ""
+                    clauses.append(f"json_extract(metadata, ?) {negation}IN ({placeholders})")
+                    params.extend([cls._json_path(key), *operand])
+                elif operator in WHERE_OPERATORS:
+                    clauses.append(f"json_extract(metadata, ?) {WHERE_OPERATORS[operator]} ?")
+                    params.extend([cls._json_path(key), operand])
+                else:
+                    raise ValueError(f"Unsupported where operator: {operator}")
+        return " AND ".join(clauses) or "1", params
+
+    def _where_mask(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Boolean mask over rows allowed by the where clause (None = every live row)"""
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True)
+        mask = self._where_masks.get(key)
+        if mask is None:
+            sql, params = self._where_sql(where)
+            rows = np.fromiter((row for (row,) in self._db.execute(f"SELECT row FROM vectors WHERE {sql}", params)),
+                               dtype=np.int64)
+            mask = np.zeros(self._size, dtype=bool)
+            mask[rows] = True
+            if len(self._where_masks) >= WHERE_MASK_CACHE_SIZE:
+                self._where_masks.clear()
+            self._where_masks[key] = mask
+        return mask
+
+    def _shortlist(self, queries: np.ndarray, n_results: int,
+                   where: Optional[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-n rows and approximate cosine per query from the int8 codes (unsorted)"""
+        mask = self._where_mask(where)
+        if mask is None:
+            candidate_rows = np.flatnonzero(np.asarray(self._ids[:self._size]) != EMPTY_ID)
+        else:
+            candidate_rows = np.flatnonzero(mask)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(candidate_rows), SCAN_CHUNK_ROWS):
+            rows = candidate_rows[start:start + SCAN_CHUNK_ROWS]
+            scores = (queries @ self._codes[rows].T.astype(np.float32)) * self._scales[rows]
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, np.broadcast_to(rows, scores.shape)], axis=1)
+            if best_scores.shape[1] > n_results:
+                top = np.argpartition(-best_scores, n_results - 1, axis=1)[:, :n_results]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+        return best_rows, best_scores
+
+    def approximate_search(self, query_embeddings: np.ndarray, n_results: int,
+                           where: Optional[Dict[str, Any]] = None) -> List[List[Tuple[int, float]]]:
+        """Top-n (id, approximate cosine) per query from the int8 codes only, best first"""
+        queries = self.normalize(query_embeddings)
+        with self._lock:
+            if not self._size or n_results <= 0:
+                return [[] for _ in range(len(queries))]
+            best_rows, best_scores = self._shortlist(queries, n_results, where)
+            ids = np.asarray(self._ids[best_rows.ravel()]).reshape(best_rows.shape)
+        return [
+            [(int(query_ids[i]), float(query_scores[i])) for i in np.argsort(-query_scores)]
+            for query_ids, query_scores in zip(ids, best_scores)
+        ]
+
+    def search(self, query_embeddings: np.ndarray, n_results: int, where: Optional[Dict[str, Any]] = None,
+               rescore_factor: int = COMPACT_RESCORE_FACTOR) -> List[List[Tuple[int, float]]]:
+        """Top-n (id, exact cosine) per query: int8 shortlist of n * rescore_factor, rescored with float32"""
+        queries = self.normalize(query_embeddings)
+        with self._lock:
+            if not self._size or n_results <= 0:
+                return [[] for _ in range(len(queries))]
+            best_rows, _ = self._shortlist(queries, n_results * max(rescore_factor, 1), where)
+            # Đọc mỗi hàng float32 của shortlist một lần cho mọi query
+            unique_rows, positions = np.unique(best_rows, return_inverse=True)
+            vectors = np.asarray(self._vectors[unique_rows])
+            ids = np.asarray(self._ids[unique_rows])
+
+        results = []
+        for query, query_positions in zip(queries, positions.reshape(best_rows.shape)):
+            exact = vectors[query_positions] @ query
+            order = np.argsort(-exact)[:n_results]
+            results.append([(int(ids[query_positions[i]]), float(exact[i])) for i in order])
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        """Footprint per vector: what each query scans vs what stays on disk until rescoring"""
+        dim = self.dim or 0
+        return {
+            "count": self.count(),
+            "dim": dim,
+            "scanned_bytes_per_vector": dim + 4 + 8,
+            "rescore_bytes_per_vector": dim * 4,
+            "disk_bytes": sum(
+                os.path.getsize(path) for path in
+                [self._path(part) for part in ARRAY_PARTS] + [os.path.join(self.directory, f"{self.name}_metadata.sqlite")]
+                if os.path.exists(path)
+            )
+        }
+
+    def _flush(self) -> None:
+        for part in ARRAY_PARTS:
+            getattr(self, f"_{part}").flush()
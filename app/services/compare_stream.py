@@ -0,0 +1,168 @@
+import asyncio
+import json
+import re
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+# Số lần stream gần nhất giữ lại để tính percentile
+STREAM_METRICS_WINDOW = 1000
+
+_SCORE_RE = re.compile(r'"match_score"\s*:\s*"?(-?\d+(?:\.\d+)?)\s*"?\s*[,}\n\r]')
+_REASON_START_RE = re.compile(r'"reason"\s*:\s*"')
+_HEX = set("0123456789abcdefABCDEF")
+
+_SENTINEL = object()
+
+
+class ComparisonStreamParser:
+    """Incrementally pull match_score and the reason string out of a streamed comparison JSON
+
+    feed() nhận từng đoạn text của model và trả về các event ("score", số) / ("reason", đoạn HTML đã
+    decode). Escape JSON bị cắt giữa hai chunk (\\n, \\", \\uXXXX) được giữ lại tới chunk sau.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.score = None
+        self._reason_pos: Optional[int] = None
+        self.reason_done = False
+
+    def feed(self, delta: str) -> List[Tuple[str, Any]]:
+        self.text += delta
+        events = []
+        if self.score is None:
+            match = _SCORE_RE.search(self.text)
+            if match:
+                score = float(match.group(1))
+                self.score = int(score) if score.is_integer() else score
+                events.append(("score", self.score))
+        if self._reason_pos is None:
+            match = _REASON_START_RE.search(self.text)
+            if match:
+                self._reason_pos = match.end()
+        if self._reason_pos is not None and not self.reason_done:
+            decoded = self._decode_reason()
+            if decoded:
+                events.append(("reason", decoded))
+        return events
+
+    def _decode_reason(self) -> str:
+        """Decode the reason string from the last position up to the last complete character"""
+        text = self.text
+        pos = self._reason_pos
+        parts = []
+        while pos < len(text):
+            char = text[pos]
+            if char == '"':
+                self.reason_done = True
+                pos += 1
+                break
+            if char != "\\":
+                parts.append(char)
+                pos += 1
+                continue
+            escape_length = self._escape_length(text, pos)
+            if escape_length is None:
+                # Escape chưa đủ ký tự, chờ chunk sau
+                break
+            escaped = text[pos:pos + escape_length]
+            try:
+                parts.append(json.loads('"' + escaped + '"'))
+            except ValueError:
+                parts.append(escaped)
+            pos += escape_length
+        self._reason_pos = pos
+        return "".join(parts)
+
+    @staticmethod
+    def _escape_length(text: str, pos: int) -> Optional[int]:
+        if pos + 1 >= len(text):
+            return None
+        if text[pos + 1] != "u":
+            return 2
+        hex_digits = text[pos + 2:pos + 6]
+        if len(hex_digits) < 4:
+            return None
+        if not set(hex_digits) <= _HEX:
+            return 6
+        # High surrogate: cần cả \uXXXX thứ hai để decode thành một ký tự
+        if 0xD800 <= int(hex_digits, 16) <= 0xDBFF:
+            low = text[pos + 6:pos + 12]
+            if len(low) < 6:
+                return None
+            return 12 if low.startswith("\\u") else 6
+        return 6
+
+
+async def iterate_in_thread(iterator_factory) -> AsyncIterator[Any]:
+    """Consume a blocking iterator in a worker thread and yield its items on the event loop"""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def _produce():
+        try:
+            for item in iterator_factory():
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _SENTINEL)
+
+    producer = loop.run_in_executor(None, _produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _SENTINEL:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Client ngắt kết nối: dừng đọc stream của OpenAI
+        stop.set()
+        await asyncio.shield(producer)
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class StreamMetrics:
+    """Rolling time-to-first-byte / total duration of streamed comparisons"""
+
+    def __init__(self, window: int = STREAM_METRICS_WINDOW):
+        self._samples: deque = deque(maxlen=window)
+        self.total_streams = 0
+        self.failed_streams = 0
+
+    def record(self, ttfb_ms: Optional[float], score_ms: Optional[float], total_ms: float,
+               tier: str, ok: bool = True) -> None:
+        self.total_streams += 1
+        if not ok:
+            self.failed_streams += 1
+            return
+        self._samples.append({"ttfb_ms": ttfb_ms, "score_ms": score_ms, "total_ms": total_ms, "tier": tier})
+
+    @staticmethod
+    def _percentile(values: List[float], percentile: float) -> Optional[float]:
+        if not values:
+            return None
+        values = sorted(values)
+        index = min(len(values) - 1, int(round(percentile / 100 * (len(values) - 1))))
+        return round(values[index], 1)
+
+    def summary(self) -> Dict[str, Any]:
+        samples = list(self._samples)
+        summary = {
+            "total_streams": self.total_streams,
+            "failed_streams": self.failed_streams,
+            "window": len(samples)
+        }
+        for key in ("ttfb_ms", "score_ms", "total_ms"):
+            values = [sample[key] for sample in samples if sample[key] is not None]
+            summary[key] = {"p50": self._percentile(values, 50), "p95": self._percentile(values, 95)}
+        return summary
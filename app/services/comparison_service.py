@@ -15,7 +15,7 @@ class ComparisonService:
         if role_match_score < 0.3:
             return ComparisonResult(
                 match_score=0.2,
-                skill_match={'score': 0.0, 'required_matches': [], 'required_missing': jd_data.get('required_skills', [])},
+                skill_match={'score': 0.0, 'required_matches': [], 'required_missing': jd_data.get('required_skills') or []},
                 experience_match=False,
                 education_match=False,
                 recommendations=[f"CV role '{cv_data.get('role', 'không xác định')}' không phù hợp với vị trí '{jd_data.get('job_title', '')}'"]
@@ -23,21 +23,21 @@ class ComparisonService:
         
         # Calculate skill match
         skill_match = self._calculate_skill_match(
-            cv_data.get('skills', []), 
-            jd_data.get('required_skills', []),
-            jd_data.get('preferred_skills', [])
+            cv_data.get('skills') or [], 
+            jd_data.get('required_skills') or [],
+            jd_data.get('preferred_skills') or []
         )
         
         # Calculate experience match
         experience_match = self._calculate_experience_match(
-            cv_data.get('experience_years', 0),
-            jd_data.get('experience_required', 0)
+            cv_data.get('experience_years') or 0,
+            jd_data.get('experience_required') or 0
         )
         
         # Calculate education match
         education_match = self._calculate_education_match(
-            cv_data.get('education', []),
-            jd_data.get('education_required', [])
+            cv_data.get('education') or [],
+            jd_data.get('education_required') or []
         )
         
         # Calculate overall match score (now includes role match)
@@ -112,8 +112,8 @@ class ComparisonService:
         if not required_education:
             return True
         
-        cv_education_lower = [edu.lower() for edu in cv_education]
-        required_education_lower = [edu.lower() for edu in required_education]
+        cv_education_lower = [str(edu).lower() for edu in cv_education]
+        required_education_lower = [str(edu).lower() for edu in required_education]
         
         # Check if any required education is found in CV
         for req_edu in required_education_lower:
@@ -198,8 +198,8 @@ class ComparisonService:
         
         # Experience recommendations
         if not experience_match:
-            cv_exp = cv_data.get('experience_years', 0)
-            required_exp = jd_data.get('experience_required', 0)
+            cv_exp = cv_data.get('experience_years') or 0
+            required_exp = jd_data.get('experience_required') or 0
             recommendations.append(f"Cần thêm {required_exp - cv_exp} năm kinh nghiệm để đáp ứng yêu cầu")
         
         # Education recommendations
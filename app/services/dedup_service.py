@@ -0,0 +1,272 @@
+import os
+import re
+import threading
+import zlib
+from typing import Callable, Dict, Any, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.database import SessionLocal, CV
+
+# off: tắt; flag: vẫn parse nhưng đánh dấu duplicate_of; merge: bỏ qua file trùng, trả về CV đã có
+DEDUP_MODE = os.getenv("DEDUP_MODE", "merge")
+# Jaccard ước lượng tối thiểu để coi hai CV là trùng
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+DEDUP_SHINGLE_SIZE = int(os.getenv("DEDUP_SHINGLE_SIZE", "5"))
+# bands * rows = số hàm hash; 16 x 8 cho ngưỡng LSH ~0.7, thấp hơn DEDUP_THRESHOLD để ít bỏ sót
+DEDUP_LSH_BANDS = int(os.getenv("DEDUP_LSH_BANDS", "16"))
+DEDUP_LSH_ROWS = int(os.getenv("DEDUP_LSH_ROWS", "8"))
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class DedupService:
+    """Near-duplicate CV detection with MinHash signatures and an in-memory LSH index
+
+    Chữ ký MinHash được tính trên text trích xuất (shingle theo từ), lưu vào cột cvs.minhash_signature
+    và được nạp lại vào LSH index khi dùng lần đầu. Tra cứu một CV mới chỉ chạm tới các bucket
+    của nó nên mất vài millisecond, trước khi gọi OpenAI.
+    """
+
+    def __init__(self, num_bands: int = DEDUP_LSH_BANDS, rows_per_band: int = DEDUP_LSH_ROWS,
+                 threshold: float = DEDUP_THRESHOLD, shingle_size: int = DEDUP_SHINGLE_SIZE, seed: int = 1):
+        self.num_bands = num_bands
+        self.rows_per_band = rows_per_band
+        self.num_perm = num_bands * rows_per_band
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # a, b < 2^31 để a * hash(32 bit) + b không tràn uint64
+        self._a = rng.randint(1, 1 << 31, size=self.num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=self.num_perm).astype(np.uint64)
+        self._lock = threading.Lock()
+        self._buckets: List[Dict[bytes, Set[int]]] = [{} for _ in range(num_bands)]
+        self._signatures: Dict[int, np.ndarray] = {}
+        # Chữ ký của file đang xử lý (chưa có CV id) được giữ chỗ bằng id âm
+        self._next_reservation = -1
+        self._loaded = False
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature (uint32[num_perm]) of the word shingles of a text; None for empty text"""
+        tokens = _TOKEN_RE.findall((text or "").lower())
+        if not tokens:
+            return None
+        size = min(self.shingle_size, len(tokens))
+        shingles = {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def similarity(self, sig1: np.ndarray, sig2: np.ndarray) -> float:
+        """Estimated Jaccard similarity"""
+        return float(np.mean(sig1 == sig2))
+
+    def to_bytes(self, signature: np.ndarray) -> bytes:
+        return signature.astype(np.uint32).tobytes()
+
+    def from_bytes(self, data: bytes) -> Optional[np.ndarray]:
+        signature = np.frombuffer(data, dtype=np.uint32)
+        # Chữ ký tạo với cấu hình khác (số hàm hash) không dùng được
+        return signature if len(signature) == self.num_perm else None
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes()
+            for band in range(self.num_bands)
+        ]
+
+    def ensure_loaded(self) -> None:
+        """Load stored signatures into the LSH index once"""
+        if self._loaded:
+            return
+        db = SessionLocal()
+        try:
+            rows = db.query(CV.id, CV.minhash_signature).filter(CV.minhash_signature.isnot(None)).all()
+        finally:
+            db.close()
+        with self._lock:
+            if self._loaded:
+                return
+            for row in rows:
+                signature = self.from_bytes(row.minhash_signature)
+                if signature is not None:
+                    self._add_locked(row.id, signature)
+            self._loaded = True
+
+    def add(self, cv_id: int, signature: np.ndarray) -> None:
+        self.ensure_loaded()
+        with self._lock:
+            self._add_locked(cv_id, signature)
+
+    def _add_locked(self, cv_id: int, signature: np.ndarray) -> None:
+        self._remove_locked(cv_id)
+        self._signatures[cv_id] = signature
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            buckets.setdefault(key, set()).add(cv_id)
+
+    def remove(self, cv_id: int) -> None:
+        with self._lock:
+            self._remove_locked(cv_id)
+
+    def _remove_locked(self, cv_id: int) -> None:
+        signature = self._signatures.pop(cv_id, None)
+        if signature is None:
+            return
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            bucket = buckets.get(key)
+            if bucket is not None:
+                bucket.discard(cv_id)
+                if not bucket:
+                    del buckets[key]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets = [{} for _ in range(self.num_bands)]
+            self._signatures = {}
+
+    def query(self, signature: np.ndarray, exclude_id: Optional[int] = None,
+              include_reserved: bool = False) -> List[Tuple[int, float]]:
+        """CVs whose estimated similarity is above the threshold, best first"""
+        self.ensure_loaded()
+        with self._lock:
+            return self._query_locked(signature, exclude_id, include_reserved)
+
+    def _query_locked(self, signature: np.ndarray, exclude_id: Optional[int] = None,
+                      include_reserved: bool = False) -> List[Tuple[int, float]]:
+        candidates = set()
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(buckets.get(key, ()))
+        candidates.discard(exclude_id)
+        scored = [
+            (cv_id, self.similarity(signature, self._signatures[cv_id]))
+            for cv_id in candidates if include_reserved or cv_id >= 0
+        ]
+        matches = [(cv_id, score) for cv_id, score in scored if score >= self.threshold]
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches
+
+    def find_or_reserve(self, signature: np.ndarray) -> Tuple[Optional[Tuple[int, float]], Optional[int]]:
+        """Best duplicate (cv_id, similarity), or reserve the signature and return its reservation id
+
+        Tra cứu và giữ chỗ trong cùng một lần khóa, nên hai bản của cùng một CV trong một lượt upload
+        không cùng lọt qua. Duplicate có id âm là file khác đang được xử lý (chưa lưu).
+        """
+        self.ensure_loaded()
+        with self._lock:
+            matches = self._query_locked(signature, include_reserved=True)
+            if matches:
+                return matches[0], None
+            reservation = self._next_reservation
+            self._next_reservation -= 1
+            self._add_locked(reservation, signature)
+            return None, reservation
+
+    def commit_reservation(self, reservation: int, cv_id: int) -> None:
+        """Replace a reservation with the id of the stored CV"""
+        with self._lock:
+            signature = self._signatures.get(reservation)
+            self._remove_locked(reservation)
+            if signature is not None:
+                self._add_locked(cv_id, signature)
+
+    def release(self, reservation: int) -> None:
+        """Drop the reservation of a file that failed before being stored"""
+        self.remove(reservation)
+
+    def clusters(self) -> List[Dict[str, Any]]:
+        """Group all indexed CVs into duplicate clusters (union-find over verified LSH pairs)"""
+        self.ensure_loaded()
+        with self._lock:
+            signatures = dict(self._signatures)
+            candidate_pairs = set()
+            for buckets in self._buckets:
+                for bucket in buckets.values():
+                    members = sorted(cv_id for cv_id in bucket if cv_id >= 0)
+                    if len(members) < 2:
+                        continue
+                    for i, first in enumerate(members):
+                        for second in members[i + 1:]:
+                            candidate_pairs.add((first, second))
+
+        parent = {}
+
+        def find(item: int) -> int:
+            parent.setdefault(item, item)
+            while parent[item] != item:
+                parent[item] = parent[parent[item]]
+                item = parent[item]
+            return item
+
+        pair_scores = {}
+        for first, second in candidate_pairs:
+            score = self.similarity(signatures[first], signatures[second])
+            if score >= self.threshold:
+                pair_scores[(first, second)] = score
+                parent[find(second)] = find(first)
+
+        groups: Dict[int, Dict[str, Any]] = {}
+        for (first, second), score in pair_scores.items():
+            group = groups.setdefault(find(first), {"cv_ids": set(), "max_similarity": 0.0, "min_similarity": 1.0})
+            group["cv_ids"].update((first, second))
+            group["max_similarity"] = max(group["max_similarity"], score)
+            group["min_similarity"] = min(group["min_similarity"], score)
+        clusters = [
+            {
+                "cv_ids": sorted(group["cv_ids"]),
+                "size": len(group["cv_ids"]),
+                "max_similarity": round(group["max_similarity"], 4),
+                "min_similarity": round(group["min_similarity"], 4)
+            }
+            for group in groups.values()
+        ]
+        clusters.sort(key=lambda cluster: (-cluster["size"], cluster["cv_ids"][0]))
+        return clusters
+
+    def backfill_signatures(self, extract_text: Callable[[str], str], batch_size: int = 100) -> Dict[str, int]:
+        """Compute missing signatures of existing CVs from their stored files"""
+        self.ensure_loaded()
+        db = SessionLocal()
+        computed = failed = 0
+        try:
+            last_id = 0
+            while True:
+                records = (
+                    db.query(CV)
+                    .filter(CV.id > last_id, CV.minhash_signature.is_(None), CV.file_path.isnot(None))
+                    .order_by(CV.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not records:
+                    break
+                for record in records:
+                    try:
+                        signature = self.signature(extract_text(record.file_path))
+                    except Exception as e:
+                        print(f"Warning: Could not compute MinHash for CV {record.id}: {str(e)}")
+                        failed += 1
+                        continue
+                    if signature is None:
+                        continue
+                    record.minhash_signature = self.to_bytes(signature)
+                    self.add(record.id, signature)
+                    computed += 1
+                db.commit()
+                last_id = records[-1].id
+            return {"computed": computed, "failed": failed}
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": DEDUP_MODE,
+            "threshold": self.threshold,
+            "num_perm": self.num_perm,
+            "bands": self.num_bands,
+            "rows_per_band": self.rows_per_band,
+            "indexed_cvs": sum(1 for cv_id in self._signatures if cv_id >= 0)
+        }
@@ -1,11 +1,29 @@
+import hashlib
 import json
 import numpy as np
 import pickle
 from openai import OpenAI
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 from sklearn.metrics.pairwise import cosine_similarity
 import os
 
+# Model embedding hiện tại; đổi model sẽ khiến các vector cũ bị coi là stale
+EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+
+# Các field được embed riêng (multi-vector); CV và JD dùng cùng tên field để so khớp với nhau
+EMBEDDING_FIELDS = ("skills", "role", "work_history", "domain")
+DEFAULT_FIELD_WEIGHTS = {"skills": 0.4, "role": 0.25, "work_history": 0.25, "domain": 0.1}
+
+# Chunk kinh nghiệm làm việc: mỗi mục work_experience là một chunk, mục dài được cắt theo CHUNK_MAX_CHARS
+MAX_CHUNKS_PER_DOCUMENT = int(os.getenv("CV_MAX_CHUNKS", "20"))
+CHUNK_MAX_CHARS = int(os.getenv("CV_CHUNK_MAX_CHARS", "1500"))
+
+# Giới hạn mỗi request embedding của OpenAI (2048 input, ~300k token); token ước lượng theo số ký tự,
+# để dư cho text tiếng Việt/Nhật tốn nhiều token hơn tiếng Anh
+EMBEDDING_MAX_BATCH_INPUTS = int(os.getenv("EMBEDDING_MAX_BATCH_INPUTS", "2048"))
+EMBEDDING_MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "200000"))
+EMBEDDING_CHARS_PER_TOKEN = 2
+
 class EmbeddingService:
     def __init__(self):
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -65,11 +83,98 @@ class EmbeddingService:
         
         return " | ".join(text_parts)
     
+    def create_field_texts(self, data: Dict[str, Any], data_type: str) -> Dict[str, str]:
+        """Tạo text riêng cho từng field (bỏ tên, liên hệ...); field không có dữ liệu sẽ bị bỏ qua"""
+        def join(values) -> str:
+            return ", ".join(str(value) for value in values or [] if value)
+        
+        if data_type == "cv":
+            work_history = []
+            for exp in data.get('work_experience') or []:
+                if isinstance(exp, dict):
+                    work_history.append(" ".join([str(v) for v in exp.values() if v]))
+                else:
+                    work_history.append(str(exp))
+            role_parts = [data.get('role') or "", data.get('role_category') or ""]
+            if data.get('experience_years'):
+                role_parts.append(f"{data['experience_years']} years experience")
+            texts = {
+                "skills": join((data.get('skills') or []) + (data.get('certifications') or [])),
+                "role": " | ".join(part for part in role_parts if part),
+                "work_history": " | ".join(work_history),
+                "domain": join((data.get('project_scope') or []) + (data.get('customer') or [])),
+            }
+        elif data_type == "jd":
+            role_parts = [data.get('job_title') or "", data.get('job_category') or ""]
+            if data.get('experience_required'):
+                role_parts.append(f"{data['experience_required']} years experience")
+            texts = {
+                "skills": join((data.get('required_skills') or []) + (data.get('preferred_skills') or [])),
+                "role": " | ".join(part for part in role_parts if part),
+                "work_history": " | ".join(str(item) for item in data.get('responsibilities') or [] if item),
+                "domain": join([data.get('company')] + list(data.get('project_scope') or []) + list(data.get('customer') or [])),
+            }
+        else:
+            texts = {}
+        return {field: text for field, text in texts.items() if text.strip()}
+    
+    def create_chunk_texts(self, data: Dict[str, Any], data_type: str) -> List[str]:
+        """Chia work_experience của CV thành các chunk độc lập (JD không có chunk)"""
+        if data_type != "cv":
+            return []
+        prefix = f"Role: {data['role']} | " if data.get('role') else ""
+        chunks = []
+        for exp in data.get('work_experience') or []:
+            if isinstance(exp, dict):
+                exp_text = " ".join([str(v) for v in exp.values() if v])
+            else:
+                exp_text = str(exp)
+            exp_text = exp_text.strip()
+            while exp_text:
+                if len(exp_text) <= CHUNK_MAX_CHARS:
+                    piece, exp_text = exp_text, ""
+                else:
+                    # Cắt tại ranh giới câu/từ gần nhất trước CHUNK_MAX_CHARS
+                    cut = max(exp_text.rfind(". ", 0, CHUNK_MAX_CHARS), exp_text.rfind(" ", 0, CHUNK_MAX_CHARS))
+                    cut = cut + 1 if cut > CHUNK_MAX_CHARS // 2 else CHUNK_MAX_CHARS
+                    piece, exp_text = exp_text[:cut], exp_text[cut:].strip()
+                chunks.append(f"{prefix}Work Experience: {piece.strip()}")
+        return chunks[:MAX_CHUNKS_PER_DOCUMENT]
+    
+    def generate_document_embeddings(self, data: Dict[str, Any], data_type: str) -> Tuple[str, np.ndarray, Dict[str, np.ndarray], List[Tuple[str, np.ndarray]]]:
+        """Embed the full text, every field text and every chunk of one document in a single OpenAI request
+        
+        Returns (full_text, full_embedding, {field: embedding}, [(chunk_text, embedding)]).
+        """
+        return self.generate_documents_embeddings([data], data_type)[0]
+    
+    def generate_documents_embeddings(self, datas: List[Dict[str, Any]], data_type: str) -> List[Tuple[str, np.ndarray, Dict[str, np.ndarray], List[Tuple[str, np.ndarray]]]]:
+        """Batch version of generate_document_embeddings: all texts of all documents, as few OpenAI requests as the limits allow"""
+        documents = []
+        texts = []
+        for data in datas:
+            text = self.create_text_for_embedding(data, data_type)
+            field_texts = self.create_field_texts(data, data_type)
+            chunk_texts = self.create_chunk_texts(data, data_type)
+            documents.append((text, field_texts, chunk_texts))
+            texts.extend([text] + list(field_texts.values()) + chunk_texts)
+        embeddings = self.generate_embeddings(texts)
+        
+        results = []
+        offset = 0
+        for text, field_texts, chunk_texts in documents:
+            field_embeddings = dict(zip(field_texts, embeddings[offset + 1:offset + 1 + len(field_texts)]))
+            chunk_start = offset + 1 + len(field_texts)
+            chunks = list(zip(chunk_texts, embeddings[chunk_start:chunk_start + len(chunk_texts)]))
+            results.append((text, embeddings[offset], field_embeddings, chunks))
+            offset = chunk_start + len(chunk_texts)
+        return results
+    
     def generate_embedding(self, text: str) -> np.ndarray:
         """Tạo embedding vector từ text sử dụng OpenAI API"""
         try:
             response = self.client.embeddings.create(
-                model="text-embedding-ada-002",
+                model=EMBEDDING_MODEL,
                 input=text
             )
             embedding = np.array(response.data[0].embedding, dtype=np.float32)
@@ -77,6 +182,44 @@ class EmbeddingService:
         except Exception as e:
             raise Exception(f"Error generating embedding: {str(e)}")
     
+    def generate_embeddings(self, texts: List[str]) -> List[np.ndarray]:
+        """Tạo embedding cho nhiều text, ít request OpenAI nhất có thể trong giới hạn input/token"""
+        embeddings = []
+        for start, end in self._request_ranges(texts):
+            try:
+                response = self.client.embeddings.create(
+                    model=EMBEDDING_MODEL,
+                    input=texts[start:end]
+                )
+            except Exception as e:
+                raise Exception(f"Error generating embeddings: {str(e)}")
+            # OpenAI trả về kèm index, sắp xếp lại cho chắc chắn đúng thứ tự input
+            data = sorted(response.data, key=lambda item: item.index)
+            embeddings.extend(np.array(item.embedding, dtype=np.float32) for item in data)
+        return embeddings
+
+    @staticmethod
+    def _request_ranges(texts: List[str]) -> List[Tuple[int, int]]:
+        """Split texts into [start, end) ranges under EMBEDDING_MAX_BATCH_INPUTS and EMBEDDING_MAX_BATCH_TOKENS"""
+        ranges = []
+        start = 0
+        tokens = 0
+        for index, text in enumerate(texts):
+            text_tokens = len(text) // EMBEDDING_CHARS_PER_TOKEN + 1
+            if index > start and (index - start >= EMBEDDING_MAX_BATCH_INPUTS
+                                  or tokens + text_tokens > EMBEDDING_MAX_BATCH_TOKENS):
+                ranges.append((start, index))
+                start = index
+                tokens = 0
+            tokens += text_tokens
+        if start < len(texts):
+            ranges.append((start, len(texts)))
+        return ranges
+    
+    def text_hash(self, text: str) -> str:
+        """Hash của embedding text, dùng để phát hiện vector cần tạo lại"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
     async def get_embedding(self, text: str) -> np.ndarray:
         """Async version of generate_embedding"""
         return self.generate_embedding(text)
@@ -0,0 +1,130 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import select
+
+from app.database import SessionLocal, CV, JobDescription, ComparisonHistory
+
+# Số row lấy từ cursor mỗi lần và cũng là số row ghi thành một chunk của response
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# target -> (model, cột mặc định, cột chỉ xuất khi được chọn)
+EXPORT_TARGETS = {
+    "cvs": (CV, (
+        "id", "filename", "name", "email", "phone", "role", "role_category", "experience_years",
+        "birth_year", "location", "languages", "skills", "certifications", "education",
+        "work_experience", "project_scope", "customer", "status", "duplicate_of",
+        "has_embedding", "parser_version", "created_at"
+    ), ("file_path", "raw_data", "extracted_text", "embedding_model", "embedding_text_hash")),
+    "jds": (JobDescription, (
+        "id", "filename", "job_title", "job_category", "company", "required_skills",
+        "preferred_skills", "experience_required", "education_required", "responsibilities",
+        "priority", "has_embedding", "parser_version", "created_at"
+    ), ("file_path", "raw_data", "extracted_text", "embedding_model", "embedding_text_hash")),
+    "comparisons": (ComparisonHistory, (
+        "id", "cv_id", "jd_id", "match_score", "model_tier", "model", "created_at", "comparison_result"
+    ), ()),
+}
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+class ExportService:
+    """Stream CVs, JDs and comparison history as NDJSON or CSV without loading whole tables
+
+    Query chỉ chọn các cột cần xuất (không dựng ORM object) và đọc theo batch bằng yield_per,
+    mỗi batch được ghi thành một chunk nên bộ nhớ không tăng theo số row.
+    """
+
+    def resolve_columns(self, target: str, columns: Optional[str] = None) -> List[str]:
+        """Comma-separated column list -> validated list; raises ValueError on unknown columns"""
+        if target not in EXPORT_TARGETS:
+            raise ValueError(f"target must be one of: {', '.join(EXPORT_TARGETS)}")
+        _, default_columns, extra_columns = EXPORT_TARGETS[target]
+        if not columns:
+            return list(default_columns)
+        selected = list(dict.fromkeys(column.strip() for column in columns.split(",") if column.strip()))
+        unknown = [column for column in selected if column not in default_columns + extra_columns]
+        if unknown:
+            raise ValueError(
+                f"Unknown columns: {unknown}. Allowed: {list(default_columns + extra_columns)}"
+            )
+        return selected
+
+    def build_query(self, target: str, columns: List[str], filters: Dict[str, Any]):
+        model = EXPORT_TARGETS[target][0]
+        query = select(*(getattr(model, column) for column in columns))
+        for column, value in filters.items():
+            if value is not None:
+                query = query.where(getattr(model, column) == value)
+        # Sắp theo khóa chính để đọc theo index, thứ tự ổn định giữa các lần export
+        return query.order_by(model.id)
+
+    def iter_batches(self, target: str, columns: List[str], filters: Dict[str, Any],
+                     batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[tuple]]:
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                self.build_query(target, columns, filters).execution_options(yield_per=batch_size)
+            )
+            for rows in result.partitions():
+                yield rows
+        finally:
+            db.close()
+
+    @staticmethod
+    def _json_value(column: str, value: Any) -> Any:
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if column == "match_score" and value is not None:
+            # match_score được lưu dạng text
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return value
+        return value
+
+    @classmethod
+    def _csv_value(cls, column: str, value: Any) -> Any:
+        value = cls._json_value(column, value)
+        if isinstance(value, list) and all(not isinstance(item, (dict, list)) for item in value):
+            return "; ".join("" if item is None else str(item) for item in value)
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False)
+        return value
+
+    def stream(self, target: str, export_format: str, columns: List[str],
+               filters: Dict[str, Any], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+        """Yield one text chunk per batch (CSV starts with the header row)
+
+        Generator đồng bộ: StreamingResponse chạy nó trong threadpool nên đọc SQLite không chặn event loop.
+        """
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue()
+            for rows in self.iter_batches(target, columns, filters, batch_size):
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(
+                    [self._csv_value(column, value) for column, value in zip(columns, row)] for row in rows
+                )
+                yield buffer.getvalue()
+            return
+
+        for rows in self.iter_batches(target, columns, filters, batch_size):
+            yield "".join(
+                json.dumps(
+                    {column: self._json_value(column, value) for column, value in zip(columns, row)},
+                    ensure_ascii=False, default=str
+                ) + "\n"
+                for row in rows
+            )
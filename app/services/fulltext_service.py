@@ -0,0 +1,117 @@
+import re
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.database import SessionLocal, CV, JobDescription, FULLTEXT_TABLES
+
+# Trọng số BM25 theo cột (extracted_text, name/job_title, role/company)
+FULLTEXT_COLUMN_WEIGHTS = (1.0, 2.0, 2.0)
+SNIPPET_TOKENS = 16
+
+_TERM_RE = re.compile(r"\w[\w.+#/-]*", re.UNICODE)
+
+
+class FullTextService:
+    """BM25 search over the extracted CV/JD text stored in the cv_fts / jd_fts FTS5 tables
+
+    Tra cứu từ khóa, số chứng chỉ hay tên công ty chạy hoàn toàn trong SQLite, không gọi OpenAI.
+    """
+
+    TARGETS = {"cv": "cv_fts", "jd": "jd_fts"}
+
+    @staticmethod
+    def _quote(term: str) -> str:
+        return '"' + term.replace('"', '""') + '"'
+
+    def build_match_query(self, query: str, mode: str = "all") -> Optional[str]:
+        """Turn user input into an FTS5 MATCH expression
+
+        all: mọi từ (AND), any: một trong các từ (OR), phrase: cụm từ chính xác,
+        raw: cú pháp FTS5 nguyên bản (NEAR, prefix*, column:...).
+        """
+        query = (query or "").strip()
+        if not query:
+            return None
+        if mode == "raw":
+            return query
+        if mode == "phrase":
+            return self._quote(query)
+        terms = _TERM_RE.findall(query)
+        if not terms:
+            return None
+        # Mỗi từ được quote để ký tự như "-", "." (SAA-C03, node.js) không bị hiểu là toán tử
+        return (" OR " if mode == "any" else " ").join(self._quote(term) for term in terms)
+
+    def search(self, db, target: str, query: str, mode: str = "all",
+               limit: int = 20, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """Hits {id, score, snippet} best first, plus the total number of matches"""
+        fts_table = self.TARGETS[target]
+        match_query = self.build_match_query(query, mode)
+        if match_query is None:
+            return [], 0
+        weights = ", ".join(str(weight) for weight in FULLTEXT_COLUMN_WEIGHTS)
+        try:
+            return self._search(db, fts_table, match_query, weights, limit, offset)
+        except OperationalError as e:
+            if mode == "raw":
+                raise ValueError(f"Invalid full-text query: {e.orig}")
+            raise
+
+    def _search(self, db, fts_table: str, match_query: str, weights: str,
+                limit: int, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        rows = db.execute(
+            text(
+                f"SELECT rowid AS id, bm25({fts_table}, {weights}) AS rank, "
+                f"snippet({fts_table}, 0, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) AS snippet "
+                f"FROM {fts_table} WHERE {fts_table} MATCH :query ORDER BY rank LIMIT :limit OFFSET :offset"
+            ),
+            {"query": match_query, "limit": limit, "offset": offset}
+        ).all()
+        total = db.execute(
+            text(f"SELECT count(*) FROM {fts_table} WHERE {fts_table} MATCH :query"), {"query": match_query}
+        ).scalar()
+        # bm25() trả về số âm (càng nhỏ càng khớp); đổi dấu để điểm cao = khớp hơn
+        return [
+            {"id": row.id, "score": round(-row.rank, 6), "snippet": row.snippet} for row in rows
+        ], total
+
+    def rebuild(self) -> None:
+        db = SessionLocal()
+        try:
+            for fts_table in FULLTEXT_TABLES:
+                db.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+            db.commit()
+        finally:
+            db.close()
+
+    def backfill_text(self, extract_text: Callable[[str], str], batch_size: int = 100) -> Dict[str, int]:
+        """Extract and store the text of records uploaded before it was persisted (trigger updates the index)"""
+        counts = {"cvs": 0, "jds": 0, "failed": 0}
+        db = SessionLocal()
+        try:
+            for model, key in ((CV, "cvs"), (JobDescription, "jds")):
+                last_id = 0
+                while True:
+                    records = (
+                        db.query(model)
+                        .filter(model.id > last_id, model.extracted_text.is_(None), model.file_path.isnot(None))
+                        .order_by(model.id)
+                        .limit(batch_size)
+                        .all()
+                    )
+                    if not records:
+                        break
+                    for record in records:
+                        try:
+                            record.extracted_text = extract_text(record.file_path)
+                            counts[key] += 1
+                        except Exception as e:
+                            print(f"Warning: Could not extract text for {key[:-1].upper()} {record.id}: {str(e)}")
+                            counts["failed"] += 1
+                    db.commit()
+                    last_id = records[-1].id
+            return counts
+        finally:
+            db.close()
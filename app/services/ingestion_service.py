@@ -0,0 +1,488 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+from app.database import SessionLocal, CV, JobDescription
+from app.models.schemas import FileUploadResponse
+from .dedup_service import DedupService, DEDUP_MODE
+from .embedding_service import EmbeddingService, EMBEDDING_MODEL
+from .file_processor import FileProcessor
+from .match_service import MatchService
+from .openai_service import OpenAIService, PARSER_VERSION
+from .preview_service import PreviewService
+from .skill_index import SkillIndex
+from .vector_service import VectorService
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx')
+# Số file xử lý song song trong một lần upload nhiều file (mỗi file gọi OpenAI parse + embedding)
+BULK_UPLOAD_CONCURRENCY = int(os.getenv("BULK_UPLOAD_CONCURRENCY", "4"))
+
+# Số record ghi chung một transaction SQLite / một request embedding / một lần upsert ChromaDB
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "16"))
+# Thời gian tối đa chờ gom đủ batch sau khi file đầu tiên của batch đã parse xong
+INGEST_BATCH_LINGER_SECONDS = float(os.getenv("INGEST_BATCH_LINGER_SECONDS", "0.5"))
+
+# Stage kết thúc của một file trong progress stream
+TERMINAL_STAGES = ("completed", "duplicate", "failed")
+
+# record_type -> (model, file_type trong FileUploadResponse, thư mục trong uploads/)
+RECORD_TYPES = {
+    "cv": (CV, "CV", "cvs"),
+    "jd": (JobDescription, "JD", "jds"),
+}
+
+IngestItems = Union[Iterable[Tuple[int, str, str]], AsyncIterable[Tuple[int, str, str]]]
+
+_DONE = object()
+
+
+def apply_parsed_cv(record: CV, parsed_cv: Dict[str, Any]) -> None:
+    """Copy parse_cv output onto a CV row"""
+    record.name = parsed_cv.get('name')
+    record.email = parsed_cv.get('email')
+    record.phone = parsed_cv.get('phone')
+    record.role = parsed_cv.get('role')
+    record.role_category = parsed_cv.get('role_category')
+    record.experience_years = parsed_cv.get('experience_years')
+    record.birth_year = parsed_cv.get('birth_year')
+    record.languages = parsed_cv.get('languages', [])
+    record.project_scope = parsed_cv.get('project_scope', [])
+    record.customer = parsed_cv.get('customer', [])
+    record.location = parsed_cv.get('location')
+    record.skills = parsed_cv.get('skills', [])
+    record.education = parsed_cv.get('education', [])
+    record.work_experience = parsed_cv.get('work_experience', [])
+    record.certifications = parsed_cv.get('certifications', [])
+    record.raw_data = parsed_cv
+
+
+def apply_parsed_jd(record: JobDescription, parsed_jd: Dict[str, Any]) -> None:
+    """Copy parse_jd output onto a JobDescription row"""
+    record.job_title = parsed_jd.get('job_title') or ''
+    record.job_category = parsed_jd.get('job_category')
+    record.company = parsed_jd.get('company') or ''
+    record.required_skills = parsed_jd.get('required_skills', [])
+    record.preferred_skills = parsed_jd.get('preferred_skills', [])
+    record.experience_required = parsed_jd.get('experience_required')
+    record.education_required = parsed_jd.get('education_required', [])
+    record.responsibilities = parsed_jd.get('responsibilities', [])
+    record.raw_data = parsed_jd
+
+
+def is_supported_file(filename: str) -> bool:
+    return bool(filename) and filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def upload_path(filename: str, folder: str) -> str:
+    """Unique path under uploads/<folder> for a new file"""
+    os.makedirs(f"uploads/{folder}", exist_ok=True)
+    # Create unique filename to avoid conflicts
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    unique_id = str(uuid.uuid4())[:8]
+    return f"uploads/{folder}/{timestamp}_{unique_id}_{os.path.basename(filename)}"
+
+
+def save_upload(content: bytes, filename: str, folder: str) -> str:
+    """Write an uploaded file under uploads/<folder> with a unique name and return its path"""
+    file_path = upload_path(filename, folder)
+    with open(file_path, "wb") as buffer:
+        buffer.write(content)
+    return file_path
+
+
+class IngestItem:
+    """State of one file moving through the pipeline"""
+
+    def __init__(self, index: int, file_path: str, filename: str):
+        self.index = index
+        self.file_path = file_path
+        self.filename = filename
+        self.started = time.perf_counter()
+        self.stage_started = self.started
+        self.text_content: Optional[str] = None
+        self.parsed: Optional[Dict[str, Any]] = None
+        self.signature = None
+        self.reservation: Optional[int] = None
+        self.duplicate: Optional[CV] = None
+        self.duplicate_similarity: Optional[float] = None
+        self.record = None
+        self.record_id: Optional[int] = None
+        self.finished = False
+
+    def timings(self) -> Dict[str, float]:
+        """Duration of the current stage and since the file entered the pipeline (ms)"""
+        now = time.perf_counter()
+        timings = {
+            "elapsed_ms": round((now - self.stage_started) * 1000, 1),
+            "total_ms": round((now - self.started) * 1000, 1)
+        }
+        self.stage_started = now
+        return timings
+
+
+class IngestionService:
+    """Shared extract → dedup → parse → store → embed pipeline for uploaded CV and JD files
+
+    Trích xuất text và parse OpenAI chạy song song cho từng file (giới hạn bởi concurrency).
+    File đã parse được gom thành batch (INGEST_BATCH_SIZE): một transaction SQLite cho cả batch,
+    một request embedding và một lần upsert ChromaDB cho mỗi collection.
+    Mỗi stage sinh một event kèm thời gian để client theo dõi tiến độ.
+    """
+
+    def __init__(self, file_processor: FileProcessor, openai_service: OpenAIService,
+                 embedding_service: EmbeddingService, vector_service: VectorService,
+                 dedup_service: DedupService, skill_index: SkillIndex, match_service: MatchService,
+                 batch_size: int = INGEST_BATCH_SIZE, batch_linger_seconds: float = INGEST_BATCH_LINGER_SECONDS,
+                 preview_service: Optional[PreviewService] = None):
+        self.file_processor = file_processor
+        self.openai_service = openai_service
+        self.embedding_service = embedding_service
+        self.vector_service = vector_service
+        self.dedup_service = dedup_service
+        self.skill_index = skill_index
+        self.match_service = match_service
+        self.batch_size = max(1, batch_size)
+        self.batch_linger_seconds = batch_linger_seconds
+        self.preview_service = preview_service
+        # Reservation MinHash của file đang xử lý -> future nhận CV id khi lưu xong (None nếu lỗi)
+        self._reservations: Dict[int, asyncio.Future] = {}
+
+    async def find_duplicate_cv(self, item: IngestItem) -> None:
+        """MinHash/LSH lookup on the extracted text; sets the signature and duplicate of the item
+
+        Không có bản trùng thì chữ ký được giữ chỗ trong LSH index ngay, để bản sao khác trong cùng
+        lượt upload (đang parse song song) nhận ra nó. Trùng với file đang xử lý thì chờ file đó
+        được lưu (hoặc lỗi) rồi tra lại.
+        """
+        if DEDUP_MODE == "off":
+            return
+        item.signature = self.dedup_service.signature(item.text_content)
+        if item.signature is None:
+            return
+        while True:
+            duplicate, item.reservation = self.dedup_service.find_or_reserve(item.signature)
+            if item.reservation is not None:
+                self._reservations[item.reservation] = asyncio.get_running_loop().create_future()
+                return
+            if duplicate[0] >= 0:
+                break
+            pending = self._reservations.get(duplicate[0])
+            if pending is not None:
+                await asyncio.shield(pending)
+        db = SessionLocal()
+        try:
+            item.duplicate = db.query(CV).filter(CV.id == duplicate[0]).first()
+        finally:
+            db.close()
+        item.duplicate_similarity = duplicate[1] if item.duplicate else None
+
+    def _resolve_reservation(self, item: IngestItem, cv_id: Optional[int] = None) -> None:
+        """Turn the item's reservation into its stored CV id, or drop it if the file failed"""
+        if item.reservation is None:
+            return
+        if cv_id is None:
+            self.dedup_service.release(item.reservation)
+        else:
+            self.dedup_service.commit_reservation(item.reservation, cv_id)
+        pending = self._reservations.pop(item.reservation, None)
+        if pending is not None and not pending.done():
+            pending.set_result(cv_id)
+        item.reservation = None
+
+    @staticmethod
+    def duplicate_response(existing: CV, filename: str, similarity: float) -> FileUploadResponse:
+        """DEDUP_MODE=merge: file trùng không được parse/lưu, trả về CV đã có"""
+        return FileUploadResponse(
+            id=existing.id,
+            filename=filename,
+            file_type="CV",
+            status="duplicate",
+            parsed_data=existing.raw_data or {},
+            created_at=existing.created_at,
+            duplicate_of=existing.id,
+            duplicate_similarity=similarity
+        )
+
+    async def ingest_one(self, record_type: str, file_path: str, filename: str) -> Dict[str, Any]:
+        """Run a single saved file through the pipeline and return its terminal event"""
+        async for event in self.stream(record_type, [(0, file_path, filename)], concurrency=1):
+            if event["stage"] in TERMINAL_STAGES:
+                return event
+
+    async def ingest_many(self, record_type: str, items: IngestItems,
+                          concurrency: int = BULK_UPLOAD_CONCURRENCY) -> Dict[int, Dict[str, Any]]:
+        """Non-streaming variant: terminal event of every file keyed by index"""
+        results = {}
+        async for event in self.stream(record_type, items, concurrency):
+            if event["stage"] in TERMINAL_STAGES:
+                results[event["index"]] = event
+        return results
+
+    async def stream(self, record_type: str, items: IngestItems,
+                     concurrency: int = BULK_UPLOAD_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+        """Ingest saved files [(index, file_path, filename)] and yield stage events as they happen
+
+        items có thể là list hoặc async iterator (file được đọc dần, ví dụ từ ZIP): file tiếp theo
+        chỉ được lấy khi còn slot. Event kết thúc của từng file (completed, duplicate, failed) tới theo
+        thứ tự xử lý xong. Nếu client ngắt kết nối, các file đang xử lý vẫn chạy tới cuối.
+        """
+        if record_type not in RECORD_TYPES:
+            raise ValueError("record_type must be one of: cv, jd")
+        events: asyncio.Queue = asyncio.Queue()
+        parsed: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        def _emit(item: IngestItem, stage: str, **data) -> None:
+            if stage in TERMINAL_STAGES:
+                item.finished = True
+            events.put_nowait({"index": item.index, "filename": item.filename, "stage": stage, **item.timings(), **data})
+
+        async def _prepare(item: IngestItem) -> None:
+            try:
+                if await self._extract_and_parse(record_type, item, _emit):
+                    parsed.put_nowait(item)
+            except Exception as e:
+                self._resolve_reservation(item)
+                _emit(item, "failed", error=f"Error processing file: {str(e)}")
+            finally:
+                semaphore.release()
+
+        async def _feed() -> None:
+            tasks = []
+            try:
+                if hasattr(items, "__aiter__"):
+                    async for index, file_path, filename in items:
+                        await semaphore.acquire()
+                        tasks.append(asyncio.create_task(_prepare(IngestItem(index, file_path, filename))))
+                else:
+                    for index, file_path, filename in items:
+                        await semaphore.acquire()
+                        tasks.append(asyncio.create_task(_prepare(IngestItem(index, file_path, filename))))
+                await asyncio.gather(*tasks)
+            finally:
+                events.put_nowait({"_total": len(tasks)})
+                parsed.put_nowait(_DONE)
+
+        async def _write() -> None:
+            while True:
+                batch = await self._next_batch(parsed)
+                if batch is None:
+                    return
+                try:
+                    await self._store_batch(record_type, batch, _emit)
+                except Exception as e:
+                    # Mọi file của batch phải có event kết thúc, nếu không vòng đọc event sẽ chờ mãi
+                    print(f"Warning: Storing a batch of {len(batch)} {record_type} files failed: {str(e)}")
+                    for item in batch:
+                        if item.finished:
+                            continue
+                        try:
+                            self._resolve_reservation(item, item.record_id)
+                        except Exception as reservation_error:
+                            print(f"Warning: Could not resolve dedup reservation of {item.filename}: {str(reservation_error)}")
+                        _emit(item, "failed", error=f"Error processing file: {str(e)}", id=item.record_id)
+
+        feeder = asyncio.create_task(_feed())
+        writer = asyncio.create_task(_write())
+        total = None
+        finished = 0
+        while total is None or finished < total:
+            event = await events.get()
+            if "_total" in event:
+                total = event["_total"]
+                continue
+            if event["stage"] in TERMINAL_STAGES:
+                finished += 1
+            yield event
+        # Lỗi của chính feeder (ví dụ ZIP hỏng) được đưa ra cho caller
+        await feeder
+        await writer
+
+    async def _extract_and_parse(self, record_type: str, item: IngestItem, emit) -> bool:
+        """Extract text and parse one file; returns False if it ended early (merged duplicate)"""
+        item.text_content = await asyncio.to_thread(self.file_processor.extract_text, item.file_path)
+        emit(item, "extracted", chars=len(item.text_content))
+
+        if record_type == "cv":
+            # Kiểm tra CV gần trùng (MinHash/LSH) trước khi gọi OpenAI
+            await self.find_duplicate_cv(item)
+            if item.duplicate and DEDUP_MODE == "merge":
+                os.remove(item.file_path)
+                emit(item, "duplicate", result=self.duplicate_response(
+                    item.duplicate, item.filename, item.duplicate_similarity
+                ))
+                return False
+            item.parsed = await self.openai_service.parse_cv(item.text_content, item.filename)
+            emit(item, "parsed", name=item.parsed.get('name'))
+        else:
+            item.parsed = await self.openai_service.parse_jd(item.text_content)
+            emit(item, "parsed", job_title=item.parsed.get('job_title'))
+        return True
+
+    async def _next_batch(self, queue: asyncio.Queue) -> Optional[List[IngestItem]]:
+        """Wait for one parsed item, then gather more until the batch is full or the linger time is over"""
+        first = await queue.get()
+        if first is _DONE:
+            return None
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_linger_seconds
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is _DONE:
+                # Để lần gọi sau kết thúc vòng ghi
+                queue.put_nowait(_DONE)
+                break
+            batch.append(item)
+        return batch
+
+    def _build_record(self, record_type: str, item: IngestItem):
+        if record_type == "cv":
+            record = CV(
+                filename=item.filename,
+                file_path=item.file_path,
+                extracted_text=item.text_content,
+                parser_version=PARSER_VERSION,
+                has_embedding=0,
+                minhash_signature=self.dedup_service.to_bytes(item.signature) if item.signature is not None else None,
+                duplicate_of=item.duplicate.id if item.duplicate else None
+            )
+            apply_parsed_cv(record, item.parsed)
+        else:
+            record = JobDescription(
+                filename=item.filename,
+                file_path=item.file_path,
+                extracted_text=item.text_content,
+                parser_version=PARSER_VERSION,
+                has_embedding=0
+            )
+            apply_parsed_jd(record, item.parsed)
+        return record
+
+    def _insert_batch(self, db, record_type: str, batch: List[IngestItem]) -> None:
+        """Insert the rows and their skill rows of a batch in one transaction"""
+        for item in batch:
+            item.record = self._build_record(record_type, item)
+            db.add(item.record)
+        db.flush()
+        for item in batch:
+            # Bảng skill/language chuẩn hóa cho bộ lọc có cấu trúc (cùng transaction)
+            if record_type == "cv":
+                self.skill_index.sync_cv(db, item.record.id, item.parsed)
+            else:
+                self.skill_index.sync_jd(db, item.record.id, item.parsed)
+        db.commit()
+
+    async def _store_batch(self, record_type: str, batch: List[IngestItem], emit) -> None:
+        db = SessionLocal()
+        try:
+            try:
+                self._insert_batch(db, record_type, batch)
+                stored = batch
+            except Exception as e:
+                db.rollback()
+                # Một record lỗi không làm hỏng cả batch: ghi lại từng record
+                print(f"Warning: Batch insert of {len(batch)} {record_type} records failed, retrying one by one: {str(e)}")
+                stored = []
+                for item in batch:
+                    try:
+                        self._insert_batch(db, record_type, [item])
+                        stored.append(item)
+                    except Exception as item_error:
+                        db.rollback()
+                        self._resolve_reservation(item)
+                        emit(item, "failed", error=f"Error processing file: {str(item_error)}")
+
+            for item in stored:
+                item.record_id = item.record.id
+                if item.reservation is not None:
+                    self._resolve_reservation(item, item.record.id)
+                elif record_type == "cv" and item.signature is not None:
+                    # DEDUP_MODE=flag: bản trùng vẫn được lưu và index
+                    self.dedup_service.add(item.record.id, item.signature)
+                emit(item, "stored", id=item.record.id)
+                if self.preview_service:
+                    # Ảnh trang 1 và text xem trước được tạo nền, không chặn upload
+                    self.preview_service.enqueue(record_type, item.record.id)
+            if not stored:
+                return
+
+            # Generate and store embeddings in ChromaDB
+            try:
+                await self._embed_batch(record_type, stored)
+                db.commit()
+                for item in stored:
+                    # Cập nhật bảng match (chạy nền theo priority của JD)
+                    if record_type == "cv":
+                        self.match_service.enqueue_cv(item.record.id)
+                    else:
+                        self.match_service.enqueue_jd(item.record.id, item.record.priority)
+                    emit(item, "embedded", id=item.record.id, ok=True)
+            except Exception as e:
+                # Continue without embedding - not critical, /embeddings/reindex sẽ tạo lại sau
+                print(f"Warning: Could not create embeddings for {record_type} {[item.record.id for item in stored]}: {str(e)}")
+                db.rollback()
+                for item in stored:
+                    emit(item, "embedded", id=item.record.id, ok=False, error=str(e))
+
+            for item in stored:
+                emit(item, "completed", result=self._upload_response(record_type, item))
+        finally:
+            db.close()
+
+    async def _embed_batch(self, record_type: str, batch: List[IngestItem]) -> None:
+        """One embedding request and one upsert per collection for the whole batch"""
+        # Vector tổng, vector từng field (skills, role, ...) và chunk kinh nghiệm của cả batch trong một request
+        documents = await asyncio.to_thread(
+            self.embedding_service.generate_documents_embeddings, [item.parsed for item in batch], record_type
+        )
+        ids = [item.record.id for item in batch]
+        embeddings = [embedding for _, embedding, _, _ in documents]
+        if record_type == "cv":
+            metadatas = [self.vector_service.build_cv_metadata(item.parsed) for item in batch]
+        else:
+            metadatas = [self.vector_service.build_jd_metadata(item.parsed) for item in batch]
+
+        def _store():
+            if record_type == "cv":
+                self.vector_service.upsert_cv_embeddings(ids, embeddings, metadatas)
+            else:
+                self.vector_service.upsert_jd_embeddings(ids, embeddings, metadatas)
+            self.vector_service.upsert_field_embeddings(
+                record_type, [(item_id, fields, metadata) for item_id, (_, _, fields, _), metadata in zip(ids, documents, metadatas)]
+            )
+            if record_type == "cv":
+                self.vector_service.upsert_cv_chunk_embeddings(
+                    [(item_id, chunks, metadata) for item_id, (_, _, _, chunks), metadata in zip(ids, documents, metadatas)]
+                )
+
+        await asyncio.to_thread(_store)
+        for item, (text, _, _, _) in zip(batch, documents):
+            item.record.has_embedding = 1
+            item.record.has_field_embeddings = 1
+            if record_type == "cv":
+                item.record.has_chunk_embeddings = 1
+            item.record.embedding_text_hash = self.embedding_service.text_hash(text)
+            item.record.embedding_model = EMBEDDING_MODEL
+
+    @staticmethod
+    def _upload_response(record_type: str, item: IngestItem) -> FileUploadResponse:
+        return FileUploadResponse(
+            id=item.record.id,
+            filename=item.filename,
+            file_type=RECORD_TYPES[record_type][1],
+            status="success",
+            parsed_data=item.parsed,
+            created_at=item.record.created_at,
+            duplicate_of=item.duplicate.id if item.duplicate else None,
+            duplicate_similarity=item.duplicate_similarity
+        )
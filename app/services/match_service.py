@@ -0,0 +1,254 @@
+import asyncio
+import itertools
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from app.database import SessionLocal, CV, JobDescription, CVJDMatch
+from .comparison_service import ComparisonService
+from .vector_service import VectorService
+
+# Số CV tối đa giữ lại cho mỗi JD trong bảng cv_jd_matches
+MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", "50"))
+
+# Khi vector CV cũ chưa có metadata status: lấy dư ứng viên rồi lọc status bằng SQL
+MATCH_STATUS_OVERFETCH = int(os.getenv("MATCH_STATUS_OVERFETCH", "4"))
+
+# JD priority quyết định thứ tự xử lý trong hàng đợi (số nhỏ chạy trước)
+PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+
+class MatchService:
+    """Maintain the materialized (jd_id, cv_id, similarity, rule_score) table incrementally
+
+    - CV mới: chấm điểm với tất cả JD (cùng category) — mỗi nhóm priority của JD là một task riêng.
+    - JD mới: chấm điểm với các CV status 'new' qua ChromaDB query, giữ top-k.
+    Các task chạy tuần tự trong một worker nền theo thứ tự priority của JD.
+    """
+
+    def __init__(self, vector_service: VectorService, comparison_service: ComparisonService, top_k: int = MATCH_TOP_K):
+        self.vector_service = vector_service
+        self.comparison_service = comparison_service
+        self.top_k = top_k
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the background worker on the running event loop"""
+        if self._worker and not self._worker.done():
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._worker = asyncio.create_task(self._run())
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def enqueue_cv(self, cv_id: int) -> None:
+        """Schedule scoring of a new CV, one task per JD priority group"""
+        for priority, rank in PRIORITY_ORDER.items():
+            self._enqueue(rank, "cv", cv_id, priority)
+
+    def enqueue_jd(self, jd_id: int, priority: str = "medium") -> None:
+        self._enqueue(PRIORITY_ORDER.get(priority or "medium", 1), "jd", jd_id, None)
+
+    def enqueue_jds(self, jd_ids: List[int]) -> None:
+        """Re-score some JDs (e.g. after a CV left their top-k)"""
+        if not jd_ids:
+            return
+        db = SessionLocal()
+        try:
+            jds = db.query(JobDescription.id, JobDescription.priority).filter(JobDescription.id.in_(jd_ids)).all()
+        finally:
+            db.close()
+        for jd in jds:
+            self.enqueue_jd(jd.id, jd.priority)
+
+    def enqueue_all_jds(self) -> int:
+        """Rebuild the table for every JD, high priority first"""
+        db = SessionLocal()
+        try:
+            jds = db.query(JobDescription.id, JobDescription.priority).filter(JobDescription.has_embedding == 1).all()
+        finally:
+            db.close()
+        for jd in jds:
+            self.enqueue_jd(jd.id, jd.priority)
+        return len(jds)
+
+    def _enqueue(self, rank: int, kind: str, item_id: int, priority: Optional[str]) -> None:
+        if self._queue is None:
+            print(f"Warning: Match worker not started, skipping {kind} {item_id}")
+            return
+        self._queue.put_nowait((rank, next(self._sequence), kind, item_id, priority))
+
+    async def _run(self) -> None:
+        while True:
+            _, _, kind, item_id, priority = await self._queue.get()
+            try:
+                if kind == "cv":
+                    await asyncio.to_thread(self.score_cv, item_id, priority)
+                else:
+                    await asyncio.to_thread(self.score_jd, item_id)
+            except Exception as e:
+                print(f"Warning: Could not update matches for {kind} {item_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def score_cv(self, cv_id: int, priority: Optional[str] = None) -> int:
+        """Score one CV against all JDs (optionally only JDs of one priority); returns rows written"""
+        db = SessionLocal()
+        try:
+            cv_record = db.query(CV).filter(CV.id == cv_id).first()
+            if not cv_record or not cv_record.has_embedding or (cv_record.status or "new") != "new":
+                return 0
+            stored_cv = self.vector_service.get_embeddings_with_metadata("cv", [cv_id]).get(cv_id)
+            if not stored_cv:
+                return 0
+
+            query = db.query(JobDescription).filter(JobDescription.has_embedding == 1)
+            if priority:
+                query = query.filter(JobDescription.priority == priority)
+            if cv_record.role_category:
+                query = query.filter(JobDescription.job_category == cv_record.role_category)
+            jd_records = {jd.id: jd for jd in query.all()}
+            if not jd_records:
+                return 0
+
+            stored_jds = self.vector_service.get_embeddings_with_metadata("jd", list(jd_records))
+            if not stored_jds:
+                return 0
+
+            jd_ids = list(stored_jds)
+            similarities = self._cosine(stored_cv[0], [stored_jds[jd_id][0] for jd_id in jd_ids])
+            rows = [
+                (jd_id, cv_id, float(similarity), self._rule_score(cv_record.raw_data, jd_records[jd_id].raw_data))
+                for jd_id, similarity in zip(jd_ids, similarities)
+            ]
+            self._write(db, rows)
+            for jd_id in jd_ids:
+                self._prune(db, jd_id)
+            db.commit()
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def score_jd(self, jd_id: int) -> int:
+        """Score one JD against the top-k 'new' CVs via an ANN query; returns rows written"""
+        db = SessionLocal()
+        try:
+            jd_record = db.query(JobDescription).filter(JobDescription.id == jd_id).first()
+            if not jd_record or not jd_record.has_embedding:
+                return 0
+
+            if self.vector_service.cv_status_metadata_ready:
+                similar = self.vector_service.find_similar_cvs_for_jd(
+                    jd_id, n_results=self.top_k, similarity_threshold=-1.0, where={"status": "new"}
+                )
+            else:
+                similar = self.vector_service.find_similar_cvs_for_jd(
+                    jd_id, n_results=self.top_k * MATCH_STATUS_OVERFETCH, similarity_threshold=-1.0
+                )
+            cv_records = {
+                cv.id: cv for cv in db.query(CV).filter(CV.id.in_([cv_id for cv_id, _ in similar])).all()
+            } if similar else {}
+            similar = [
+                (cv_id, similarity) for cv_id, similarity in similar
+                if cv_id in cv_records and (cv_records[cv_id].status or "new") == "new"
+            ][:self.top_k]
+            rows = [
+                (jd_id, cv_id, float(similarity), self._rule_score(cv_records[cv_id].raw_data, jd_record.raw_data))
+                for cv_id, similarity in similar
+            ]
+
+            # JD được chấm lại từ đầu: thay toàn bộ match cũ của JD
+            db.query(CVJDMatch).filter(CVJDMatch.jd_id == jd_id).delete(synchronize_session=False)
+            self._write(db, rows)
+            db.commit()
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def get_matches(self, db, jd_id: int, limit: int = None) -> List[Dict[str, Any]]:
+        """Match view: one indexed read on (jd_id, similarity) joined with the CV rows"""
+        rows = (
+            db.query(CVJDMatch, CV)
+            .join(CV, CV.id == CVJDMatch.cv_id)
+            .filter(CVJDMatch.jd_id == jd_id)
+            .order_by(CVJDMatch.similarity.desc())
+            .limit(limit or self.top_k)
+            .all()
+        )
+        return [
+            {
+                "cv_id": cv.id,
+                "similarity_score": match.similarity,
+                "rule_score": match.rule_score,
+                "name": cv.name,
+                "email": cv.email,
+                "role": cv.role,
+                "skills": cv.skills or [],
+                "experience_years": cv.experience_years,
+                "status": cv.status,
+                "created_at": cv.created_at.isoformat(),
+                "matched_at": match.updated_at.isoformat() if match.updated_at else None
+            }
+            for match, cv in rows
+        ]
+
+    def remove_cv(self, db, cv_id: int) -> List[int]:
+        """CV leaves the 'new' pool (e.g. approved): drop it from every JD's matches; returns those JD ids"""
+        jd_ids = [row.jd_id for row in db.query(CVJDMatch.jd_id).filter(CVJDMatch.cv_id == cv_id).all()]
+        db.query(CVJDMatch).filter(CVJDMatch.cv_id == cv_id).delete(synchronize_session=False)
+        return jd_ids
+
+    def _write(self, db, rows: List[tuple]) -> None:
+        if not rows:
+            return
+        now = datetime.utcnow()
+        cv_ids = {cv_id for _, cv_id, _, _ in rows}
+        jd_ids = {jd_id for jd_id, _, _, _ in rows}
+        # Xóa các cặp sẽ được ghi lại (unique jd_id, cv_id) rồi insert hàng loạt
+        db.query(CVJDMatch).filter(
+            CVJDMatch.cv_id.in_(cv_ids), CVJDMatch.jd_id.in_(jd_ids)
+        ).delete(synchronize_session=False)
+        db.bulk_insert_mappings(CVJDMatch, [
+            {"jd_id": jd_id, "cv_id": cv_id, "similarity": similarity, "rule_score": rule_score, "updated_at": now}
+            for jd_id, cv_id, similarity, rule_score in rows
+        ])
+
+    def _prune(self, db, jd_id: int) -> None:
+        """Keep only the top-k rows of a JD"""
+        keep = (
+            db.query(CVJDMatch.id)
+            .filter(CVJDMatch.jd_id == jd_id)
+            .order_by(CVJDMatch.similarity.desc())
+            .limit(self.top_k)
+            .subquery()
+        )
+        db.query(CVJDMatch).filter(
+            CVJDMatch.jd_id == jd_id, CVJDMatch.id.notin_(select(keep.c.id))
+        ).delete(synchronize_session=False)
+
+    def _rule_score(self, cv_data: Dict[str, Any], jd_data: Dict[str, Any]) -> Optional[float]:
+        try:
+            return self.comparison_service.compare(cv_data or {}, jd_data or {}).match_score
+        except Exception as e:
+            print(f"Warning: Could not compute rule score: {str(e)}")
+            return None
+
+    @staticmethod
+    def _cosine(vector: List[float], matrix: List[List[float]]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        matrix = np.asarray(matrix, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector)
+        norms[norms == 0] = 1.0
+        return matrix @ vector / norms
@@ -0,0 +1,144 @@
+import re
+from typing import Dict, Any, List, Optional
+
+# Chuẩn hóa tên ngôn ngữ/thị trường để key metadata ổn định (lang_japanese, market_jp, ...)
+LANGUAGE_ALIASES = {
+    "english": "english", "tiếng anh": "english",
+    "japanese": "japanese", "tiếng nhật": "japanese", "日本語": "japanese",
+    "vietnamese": "vietnamese", "tiếng việt": "vietnamese",
+    "chinese": "chinese", "mandarin": "chinese", "tiếng trung": "chinese", "中文": "chinese",
+    "korean": "korean", "tiếng hàn": "korean", "한국어": "korean",
+    "french": "french", "tiếng pháp": "french",
+    "german": "german", "tiếng đức": "german",
+    "spanish": "spanish", "russian": "russian", "thai": "thai",
+}
+MARKET_ALIASES = {
+    "japan": "jp", "jp": "jp", "nhật": "jp",
+    "vietnam": "vn", "viet nam": "vn", "vn": "vn",
+    "usa": "us", "us": "us", "united states": "us", "america": "us",
+    "europe": "eu", "eu": "eu",
+    "singapore": "sg", "sg": "sg",
+    "korea": "kr", "kr": "kr",
+    "australia": "au", "au": "au",
+    "uk": "uk", "united kingdom": "uk",
+}
+
+LANGUAGE_PREFIX = "lang_"
+MARKET_PREFIX = "market_"
+SCOPE_PREFIX = "scope_"
+
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+
+
+class MetadataEncoder:
+    """Encode CV/JD data into Chroma's scalar-only metadata and build `where` filters on it
+
+    List fields được flatten thành các key boolean (vd. languages=["Japanese (N2)"] → lang_japanese=True)
+    để filter có thể push xuống ANN query thay vì lọc lại bằng Python.
+    """
+
+    def encode_cv(self, cv_data: Dict[str, Any], status: str = "new") -> Dict[str, Any]:
+        metadata = {
+            "name": cv_data.get("name"),
+            "role": cv_data.get("role"),
+            "role_category": cv_data.get("role_category"),
+            "skills_count": len(cv_data.get("skills") or []),
+            "experience_years": self._to_int(cv_data.get("experience_years")),
+            "birth_year": self._to_int(cv_data.get("birth_year")),
+            "location": cv_data.get("location"),
+            "status": status or "new",
+        }
+        for language in cv_data.get("languages") or []:
+            token = self.normalize_language(language)
+            if token:
+                metadata[LANGUAGE_PREFIX + token] = True
+        for market in cv_data.get("customer") or []:
+            token = self.normalize_market(market)
+            if token:
+                metadata[MARKET_PREFIX + token] = True
+        for scope in cv_data.get("project_scope") or []:
+            token = self._slug(scope)
+            if token:
+                metadata[SCOPE_PREFIX + token] = True
+        return self._scalars_only(metadata)
+
+    def encode_jd(self, jd_data: Dict[str, Any]) -> Dict[str, Any]:
+        metadata = {
+            "job_title": jd_data.get("job_title"),
+            "job_category": jd_data.get("job_category"),
+            "company": jd_data.get("company"),
+            "required_skills_count": len(jd_data.get("required_skills") or []),
+            "experience_required": self._to_int(jd_data.get("experience_required")),
+        }
+        return self._scalars_only(metadata)
+
+    def cv_facet_where(self, min_experience: Optional[int] = None, max_experience: Optional[int] = None,
+                       languages: Optional[List[str]] = None, markets: Optional[List[str]] = None,
+                       status: Optional[str] = None, role_category: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Build a Chroma `where` clause: all languages required, any of the markets"""
+        clauses = []
+        if min_experience is not None:
+            clauses.append({"experience_years": {"$gte": min_experience}})
+        if max_experience is not None:
+            clauses.append({"experience_years": {"$lte": max_experience}})
+        for language in languages or []:
+            token = self.normalize_language(language)
+            if token:
+                clauses.append({LANGUAGE_PREFIX + token: True})
+        market_clauses = [
+            {MARKET_PREFIX + token: True}
+            for token in (self.normalize_market(market) for market in markets or [])
+            if token
+        ]
+        if len(market_clauses) == 1:
+            clauses.append(market_clauses[0])
+        elif market_clauses:
+            clauses.append({"$or": market_clauses})
+        if status:
+            clauses.append({"status": status})
+        if role_category:
+            clauses.append({"role_category": role_category})
+        return self.combine(*clauses)
+
+    @staticmethod
+    def combine(*clauses: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """AND together non-empty where clauses (Chroma requires $and for more than one)"""
+        clauses = [clause for clause in clauses if clause]
+        if not clauses:
+            return None
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$and": clauses}
+
+    def normalize_language(self, value: Any) -> Optional[str]:
+        text = str(value or "").lower()
+        for alias, token in LANGUAGE_ALIASES.items():
+            if alias in text:
+                return token
+        # "Thai (native)" → "thai": bỏ trình độ/chứng chỉ phía sau
+        return self._slug(re.split(r"[(\-,:/]", text)[0])
+
+    def normalize_market(self, value: Any) -> Optional[str]:
+        text = str(value or "").lower().strip()
+        if text in MARKET_ALIASES:
+            return MARKET_ALIASES[text]
+        for alias, token in MARKET_ALIASES.items():
+            if len(alias) > 2 and alias in text:
+                return token
+        return self._slug(text)
+
+    @staticmethod
+    def _slug(value: Any) -> Optional[str]:
+        slug = _SLUG_RE.sub("_", str(value or "").lower()).strip("_")
+        return slug or None
+
+    @staticmethod
+    def _to_int(value: Any) -> Optional[int]:
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _scalars_only(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in metadata.items() if isinstance(value, (str, int, float, bool))}
@@ -0,0 +1,141 @@
+import os
+from html import escape
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from .comparison_service import ComparisonService
+from .compare_stream import ComparisonStreamParser, iterate_in_thread
+from .openai_service import OpenAIService, COMPARE_MODEL
+
+# Ngưỡng rule-based score (0-1) để quyết định tier cho mỗi cặp CV-JD
+REJECT_THRESHOLD = float(os.getenv("TIER_REJECT_THRESHOLD", "0.35"))
+ACCEPT_THRESHOLD = float(os.getenv("TIER_ACCEPT_THRESHOLD", "0.85"))
+# "template": trả lời bằng template không gọi LLM; "fast": dùng FAST_MODEL
+REJECT_MODE = os.getenv("TIER_REJECT_MODE", "template")
+FAST_MODEL = os.getenv("TIER_FAST_MODEL", "gpt-3.5-turbo")
+EXPENSIVE_MODEL = os.getenv("TIER_EXPENSIVE_MODEL", COMPARE_MODEL)
+
+TIER_TEMPLATE = "template"
+TIER_FAST = "fast"
+TIER_EXPENSIVE = "expensive"
+
+
+class ModelRouter:
+    """Route CV-JD comparisons to a template, a fast model or the expensive model based on the rule score"""
+
+    def __init__(self, openai_service: OpenAIService, comparison_service: ComparisonService):
+        self.openai_service = openai_service
+        self.comparison_service = comparison_service
+
+    def choose_tier(self, rule_score: float) -> str:
+        """Only borderline pairs are escalated to the expensive model"""
+        if rule_score <= REJECT_THRESHOLD:
+            return TIER_TEMPLATE if REJECT_MODE == TIER_TEMPLATE else TIER_FAST
+        if rule_score >= ACCEPT_THRESHOLD:
+            return TIER_FAST
+        return TIER_EXPENSIVE
+
+    def model_for_tier(self, tier: str) -> str:
+        if tier == TIER_EXPENSIVE:
+            return EXPENSIVE_MODEL
+        if tier == TIER_FAST:
+            return FAST_MODEL
+        return None
+
+    async def compare(self, cv_data: Dict[str, Any], jd_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Compare one pair; result has the same shape as OpenAIService.compare_cv_jd plus tier info"""
+        rule_result = self.comparison_service.compare(cv_data or {}, jd_data or {})
+        tier = self.choose_tier(rule_result.match_score)
+
+        if tier == TIER_TEMPLATE:
+            result = self._templated_result(rule_result)
+        else:
+            result = await self.openai_service.compare_cv_jd(cv_data, jd_data, model=self.model_for_tier(tier))
+
+        return self._annotate(result, tier, rule_result.match_score)
+
+    async def compare_stream(self, cv_data: Dict[str, Any], jd_data: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream one comparison as events: ("tier", info), ("score", n), ("reason", html delta)..., ("result", dict)
+
+        Kết quả cuối được parse lại từ toàn bộ output và validate như bản không stream.
+        """
+        rule_result = self.comparison_service.compare(cv_data or {}, jd_data or {})
+        tier = self.choose_tier(rule_result.match_score)
+        model = self.model_for_tier(tier)
+        yield "tier", {"tier": tier, "model": model, "rule_score": rule_result.match_score}
+
+        if tier == TIER_TEMPLATE:
+            result = self._templated_result(rule_result)
+            yield "score", result["match_score"]
+            yield "reason", result["reason"]
+        else:
+            parser = ComparisonStreamParser()
+            async for delta in iterate_in_thread(
+                lambda: self.openai_service.stream_compare_cv_jd(cv_data, jd_data, model=model)
+            ):
+                for event in parser.feed(delta):
+                    yield event
+            result = self.openai_service.validate_comparison_result(parser.text)
+
+        yield "result", self._annotate(result, tier, rule_result.match_score)
+
+    async def compare_batch(self, cv_data: Dict[str, Any], jds: List[Tuple[int, Dict[str, Any]]]) -> Dict[int, Dict[str, Any]]:
+        """Compare one CV against several JDs, batching the LLM calls per tier"""
+        rule_scores = {}
+        tiered = {TIER_TEMPLATE: [], TIER_FAST: [], TIER_EXPENSIVE: []}
+        templated = {}
+
+        for jd_id, jd_data in jds:
+            rule_result = self.comparison_service.compare(cv_data or {}, jd_data or {})
+            rule_scores[jd_id] = rule_result.match_score
+            tier = self.choose_tier(rule_result.match_score)
+            tiered[tier].append((jd_id, jd_data))
+            if tier == TIER_TEMPLATE:
+                templated[jd_id] = self._templated_result(rule_result)
+
+        results = {}
+        for jd_id, result in templated.items():
+            results[jd_id] = self._annotate(result, TIER_TEMPLATE, rule_scores[jd_id])
+
+        for tier in (TIER_FAST, TIER_EXPENSIVE):
+            if not tiered[tier]:
+                continue
+            llm_results = await self.openai_service.compare_cv_jd_batch(
+                cv_data, tiered[tier], model=self.model_for_tier(tier)
+            )
+            for jd_id, result in llm_results.items():
+                results[jd_id] = self._annotate(result, tier, rule_scores[jd_id])
+
+        return results
+
+    def _annotate(self, result: Dict[str, Any], tier: str, rule_score: float) -> Dict[str, Any]:
+        return {
+            **result,
+            "tier": tier,
+            "model": self.model_for_tier(tier),
+            "rule_score": rule_score
+        }
+
+    def _templated_result(self, rule_result) -> Dict[str, Any]:
+        """Build an LLM-shaped answer from the rule-based comparison (clear rejects)"""
+        skill_match = rule_result.skill_match or {}
+        matched = skill_match.get("required_matches", []) + skill_match.get("preferred_matches", [])
+        missing = skill_match.get("required_missing", [])
+
+        def _items(skills: List[str]) -> str:
+            if not skills:
+                return "<li>Không có</li>"
+            return "".join(f"<li>{escape(str(skill))}</li>" for skill in skills)
+
+        recommendations = " ".join(escape(text) for text in rule_result.recommendations)
+        reason = (
+            "<div>"
+            f"<p>Hồ sơ có mức độ phù hợp thấp với vị trí này (điểm đánh giá tự động: {rule_result.match_score:.2f}).</p>"
+            f"<h4>Kỹ năng khớp:</h4><ul style=\"margin-left: 20px;\">{_items(matched)}</ul>"
+            f"<h4>Kỹ năng thiếu:</h4><ul style=\"margin-left: 20px;\">{_items(missing)}</ul>"
+            f"<p>{recommendations}</p>"
+            "</div>"
+        )
+        return {
+            "match_score": round(rule_result.match_score * 100),
+            "reason": reason
+        }
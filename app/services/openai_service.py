@@ -1,15 +1,87 @@
 from openai import OpenAI
+import asyncio
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Tuple
 from .embedding_service import EmbeddingService
 from .vector_service import VectorService
+from .payload_compactor import PayloadCompactor
+
+# Model dùng cho parse (model rẻ trước, escalate sang fallback khi output không hợp lệ) và so sánh
+PARSE_MODEL = os.getenv("OPENAI_PARSE_MODEL", "gpt-3.5-turbo")
+PARSE_FALLBACK_MODEL = os.getenv("OPENAI_PARSE_FALLBACK_MODEL", "gpt-4")
+# Tăng khi sửa prompt parse_cv/parse_jd; record có parser_version khác sẽ được /maintenance/reprocess parse lại
+PARSE_PROMPT_VERSION = "1"
+PARSER_VERSION = f"{PARSE_PROMPT_VERSION}:{PARSE_MODEL}"
+COMPARE_MODEL = os.getenv("OPENAI_COMPARE_MODEL", "gpt-4")
+
+# Số JD tối đa gửi trong một request so sánh batch (giới hạn độ dài output của GPT-4)
+BATCH_COMPARE_SIZE = int(os.getenv("OPENAI_BATCH_COMPARE_SIZE", "5"))
+
+REASON_HTML_FORMAT = """Format the "reason" field as HTML with the following structure:
+<div>
+  <p>[Phần giải thích tổng quan về mức độ phù hợp]</p>
+  <h4>Kỹ năng khớp:</h4>
+  <ul style="margin-left: 20px;">
+    <li>[Kỹ năng 1]</li>
+    <li>[Kỹ năng 2]</li>
+    ...
+  </ul>
+  <h4>Kỹ năng thiếu:</h4>
+  <ul style="margin-left: 20px;">
+    <li>[Kỹ năng 1]</li>
+    <li>[Kỹ năng 2]</li>
+    ...
+  </ul>
+  <p>[Phần kết luận và đề xuất]</p>
+</div>"""
+
+# Phần instructions tĩnh đặt ở system message (đầu prompt) để provider-side prompt caching
+# áp dụng; dữ liệu CV/JD thay đổi theo từng request luôn đặt ở cuối (user message).
+COMPARISON_SYSTEM_PROMPT = f"""You are an expert HR recruiter with deep experience in CV analysis and job matching. Provide detailed, accurate, and constructive feedback.
+
+The user sends a CV and a Job Description as compact JSON. Only scoring-relevant fields are included; long lists may have been shortened to the items most relevant to the job.
+
+Return a JSON object with the following structure:
+{{
+    "match_score": "Overall matching percentage (0-100 as number)",
+    "reason": "Detailed explanation of why this score was given, including strengths, weaknesses, and specific reasons for the match percentage"
+}}
+
+{REASON_HTML_FORMAT}
+
+Provide detailed, constructive analysis in Vietnamese. Return only valid JSON with HTML content in the reason field."""
+
+BATCH_COMPARISON_SYSTEM_PROMPT = f"""You are an expert HR recruiter with deep experience in CV analysis and job matching. Provide detailed, accurate, and constructive feedback.
+
+The user sends one CV and a JSON array of Job Descriptions, each with a "jd_id". Only scoring-relevant fields are included; long lists may have been shortened to the items most relevant to the jobs. Evaluate the CV against EACH Job Description independently, as if it were the only one.
+
+Return a JSON object with the following structure:
+{{
+    "results": [
+        {{
+            "jd_id": "The jd_id of the Job Description (as integer, copied from the input)",
+            "match_score": "Overall matching percentage (0-100 as number)",
+            "reason": "Detailed explanation of why this score was given, including strengths, weaknesses, and specific reasons for the match percentage"
+        }}
+    ]
+}}
+
+The "results" array MUST contain exactly one item per Job Description, in the same order as the input.
+
+{REASON_HTML_FORMAT}
+
+Provide detailed, constructive analysis in Vietnamese. Return only valid JSON with HTML content in the reason fields."""
 
 class OpenAIService:
     def __init__(self):
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.embedding_service = EmbeddingService()
-        self.vector_service = VectorService()
+        # Instance phụ: không mở compact store (memmap chỉ do vector_service của app quản lý)
+        self.vector_service = VectorService(compact=False)
+        self.payload_compactor = PayloadCompactor()
+        # Tổng token đã dùng cho chat completions (phục vụ benchmark/đo lường)
+        self.token_usage = {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "requests": 0}
     
     async def parse_cv(self, cv_text: str, filename: str = None) -> Dict[str, Any]:
         """Parse CV text and extract structured information"""
@@ -80,18 +152,17 @@ class OpenAIService:
         """
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            # Chạy trong thread để nhiều request parse có thể chạy song song
+            parsed_data = await asyncio.to_thread(
+                self._parse_with_escalation,
                 messages=[
                     {"role": "system", "content": "You are an expert CV parser. Extract information accurately and return only valid JSON."},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.1
+                required_field="name",
+                purpose="parse_cv"
             )
             
-            result = response.choices[0].message.content.strip()
-            parsed_data = json.loads(result)
-            
             return parsed_data
         except Exception as e:
             raise Exception(f"Error parsing CV with OpenAI: {str(e)}")
@@ -194,78 +265,44 @@ class OpenAIService:
         """
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            # Chạy trong thread để nhiều request parse có thể chạy song song
+            parsed_data = await asyncio.to_thread(
+                self._parse_with_escalation,
                 messages=[
                     {"role": "system", "content": "You are an expert Job Description parser. Extract information accurately and return only valid JSON."},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.1
+                required_field="job_title",
+                purpose="parse_jd"
             )
             
-            result = response.choices[0].message.content.strip()
-            parsed_data = json.loads(result)
-            
             # Embedding will be handled separately in VectorService
             
             return parsed_data
         except Exception as e:
             raise Exception(f"Error parsing JD with OpenAI: {str(e)}")
     
-    async def compare_cv_jd(self, cv_data: Dict[str, Any], jd_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _comparison_messages(self, cv_data: Dict[str, Any], jd_data: Dict[str, Any]) -> List[Dict[str, str]]:
+        compact_cv = self.payload_compactor.compact_cv(cv_data, jd_data)
+        compact_jd = self.payload_compactor.compact_jd(jd_data)
+        prompt = (
+            f"CV Data:\n{self.payload_compactor.dumps(compact_cv)}\n\n"
+            f"Job Description Data:\n{self.payload_compactor.dumps(compact_jd)}"
+        )
+        return [
+            {"role": "system", "content": COMPARISON_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    
+    async def compare_cv_jd(self, cv_data: Dict[str, Any], jd_data: Dict[str, Any], model: str = COMPARE_MODEL) -> Dict[str, Any]:
         """Compare CV and JD using OpenAI and return detailed analysis"""
-        prompt = f"""
-        You are an expert HR recruiter. Please analyze and compare the following CV and Job Description.
-        
-        CV Data:
-        {json.dumps(cv_data, indent=2, ensure_ascii=False)}
-        
-        Job Description Data:
-        {json.dumps(jd_data, indent=2, ensure_ascii=False)}
-        
-        Please provide a simple comparison analysis in JSON format with the following structure:
-        {{
-            "match_score": "Overall matching percentage (0-100 as number)",
-            "reason": "Detailed explanation of why this score was given, including strengths, weaknesses, and specific reasons for the match percentage"
-        }}
-        
-        Format the "reason" field as HTML with the following structure:
-        ```
-        <div>
-          <p>[Phần giải thích tổng quan về mức độ phù hợp]</p>
-          
-          <h4>Kỹ năng khớp:</h4>
-          <ul style="margin-left: 20px;">
-            <li>[Kỹ năng 1]</li>
-            <li>[Kỹ năng 2]</li>
-            ...
-          </ul>
-          
-          <h4>Kỹ năng thiếu:</h4>
-          <ul style="margin-left: 20px;">
-            <li>[Kỹ năng 1]</li>
-            <li>[Kỹ năng 2]</li>
-            ...
-          </ul>
-          
-          <p>[Phần kết luận và đề xuất]</p>
-        </div>
-        ```
-        
-        Provide detailed, constructive analysis in Vietnamese. Return only valid JSON with HTML content in the reason field.
-        """
-        
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are an expert HR recruiter with deep experience in CV analysis and job matching. Provide detailed, accurate, and constructive feedback."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3
+            result = self._chat_completion(
+                model=model,
+                messages=self._comparison_messages(cv_data, jd_data),
+                temperature=0.3,
+                purpose="compare"
             )
-            
-            result = response.choices[0].message.content.strip()
             parsed_result = json.loads(result)
             
             # Đảm bảo reason không bị escape HTML
@@ -278,3 +315,186 @@ class OpenAIService:
             return parsed_result
         except Exception as e:
             raise Exception(f"Error comparing CV and JD with OpenAI: {str(e)}")
+    
+    def stream_compare_cv_jd(self, cv_data: Dict[str, Any], jd_data: Dict[str, Any],
+                             model: str = COMPARE_MODEL) -> Iterator[str]:
+        """Stream the raw JSON text of a comparison as it is generated (blocking iterator)"""
+        return self._stream_chat_completion(
+            model=model,
+            messages=self._comparison_messages(cv_data, jd_data),
+            temperature=0.3,
+            purpose="compare_stream"
+        )
+    
+    @staticmethod
+    def validate_comparison_result(text: str) -> Dict[str, Any]:
+        """Parse and validate a comparison JSON: numeric match_score in 0-100 and a string reason"""
+        try:
+            result = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"comparison output is not valid JSON: {str(e)}")
+        return OpenAIService.validate_comparison_item(result)
+    
+    @staticmethod
+    def validate_comparison_item(result: Any) -> Dict[str, Any]:
+        """Validate one parsed comparison object (also each item of a batched comparison)"""
+        if not isinstance(result, dict):
+            raise ValueError("comparison output must be a JSON object")
+        try:
+            score = float(result.get("match_score"))
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid match_score: {result.get('match_score')!r}")
+        if not 0 <= score <= 100:
+            raise ValueError(f"match_score out of range: {score}")
+        if not isinstance(result.get("reason"), str):
+            raise ValueError("missing reason")
+        result["match_score"] = int(score) if score.is_integer() else score
+        return result
+    
+    async def compare_cv_jd_batch(self, cv_data: Dict[str, Any], jds: List[Tuple[int, Dict[str, Any]]],
+                                  batch_size: int = BATCH_COMPARE_SIZE, model: str = COMPARE_MODEL) -> Dict[int, Dict[str, Any]]:
+        """Compare one CV against several JDs, sending the CV once per request
+        
+        Args:
+            cv_data: raw_data của CV
+            jds: list các tuple (jd_id, jd raw_data)
+            batch_size: số JD tối đa trong một request (giới hạn độ dài output)
+            model: model dùng để so sánh (xem ModelRouter cho việc chọn tier)
+        
+        Returns:
+            Dict mapping jd_id -> {"match_score", "reason"} giống compare_cv_jd
+        """
+        # Client OpenAI là sync: mỗi chunk chạy trong thread để không chặn event loop, các chunk song song
+        chunk_results = await asyncio.gather(*(
+            asyncio.to_thread(self._compare_cv_jd_chunk, cv_data, jds[start:start + batch_size], model)
+            for start in range(0, len(jds), batch_size)
+        ))
+        results = {}
+        for chunk_result in chunk_results:
+            results.update(chunk_result)
+        return results
+    
+    def _compare_cv_jd_chunk(self, cv_data: Dict[str, Any], jds: List[Tuple[int, Dict[str, Any]]],
+                             model: str = COMPARE_MODEL) -> Dict[int, Dict[str, Any]]:
+        """Run a single batched comparison request for a chunk of JDs"""
+        compact_cv = self.payload_compactor.compact_cv(cv_data, [jd_data for _, jd_data in jds])
+        compact_jds = [
+            {"jd_id": jd_id, **self.payload_compactor.compact_jd(jd_data)}
+            for jd_id, jd_data in jds
+        ]
+        prompt = (
+            f"CV Data:\n{self.payload_compactor.dumps(compact_cv)}\n\n"
+            f"Job Descriptions:\n{self.payload_compactor.dumps(compact_jds)}"
+        )
+        
+        try:
+            result = self._chat_completion(
+                model=model,
+                messages=[
+                    {"role": "system", "content": BATCH_COMPARISON_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                purpose="compare_batch"
+            )
+            parsed_result = json.loads(result)
+        except Exception as e:
+            raise Exception(f"Error comparing CV and JDs with OpenAI: {str(e)}")
+        
+        expected_ids = [jd_id for jd_id, _ in jds]
+        items = parsed_result.get("results", []) if isinstance(parsed_result, dict) else []
+        results = {}
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            try:
+                jd_id = int(item.get("jd_id"))
+            except (TypeError, ValueError):
+                # Fallback theo thứ tự nếu model không trả lại jd_id hợp lệ
+                jd_id = expected_ids[position] if position < len(expected_ids) else None
+            if jd_id not in expected_ids:
+                continue
+            try:
+                validated = self.validate_comparison_item(item)
+            except ValueError as e:
+                # Item không hợp lệ được coi như thiếu
+                print(f"Warning: Invalid batched comparison result for JD {jd_id}: {str(e)}")
+                continue
+            results[jd_id] = {
+                "match_score": validated["match_score"],
+                "reason": validated["reason"]
+            }
+        
+        missing = [jd_id for jd_id in expected_ids if jd_id not in results]
+        if missing:
+            raise Exception(f"Error comparing CV and JDs with OpenAI: missing results for JDs {missing}")
+        
+        return results
+    
+    def _parse_with_escalation(self, messages: List[Dict[str, str]], required_field: str, purpose: str) -> Dict[str, Any]:
+        """Parse with the cheap model first and escalate to the fallback model on invalid output
+
+        Chỉ escalate khi JSON không hợp lệ hoặc thiếu key trong schema; key có giá trị null (CV scan,
+        CV không ghi tên) là kết quả hợp lệ, model đắt hơn cũng không trích xuất được.
+        """
+        models = [PARSE_MODEL]
+        if PARSE_FALLBACK_MODEL and PARSE_FALLBACK_MODEL != PARSE_MODEL:
+            models.append(PARSE_FALLBACK_MODEL)
+        
+        last_error = None
+        for model in models:
+            try:
+                result = self._chat_completion(model=model, messages=messages, temperature=0.1, purpose=purpose)
+                parsed_data = json.loads(result)
+                if not isinstance(parsed_data, dict) or required_field not in parsed_data:
+                    raise ValueError(f"missing required field '{required_field}'")
+                return parsed_data
+            except Exception as e:
+                last_error = e
+                print(f"Warning: {purpose} with {model} failed: {str(e)}")
+        
+        raise last_error
+    
+    def _chat_completion(self, model: str, messages: List[Dict[str, str]], temperature: float,
+                         purpose: str = "chat") -> str:
+        """Call chat completions, log token usage and accumulate it"""
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature
+        )
+        self._record_usage(getattr(response, "usage", None), model, purpose)
+        return response.choices[0].message.content.strip()
+    
+    def _stream_chat_completion(self, model: str, messages: List[Dict[str, str]], temperature: float,
+                                purpose: str = "chat") -> Iterator[str]:
+        """Stream chat completion content deltas (blocking iterator, run it in a worker thread)"""
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        usage = None
+        for chunk in stream:
+            # Chunk cuối (include_usage) không có choices, chỉ có usage
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        self._record_usage(usage, model, purpose)
+    
+    def _record_usage(self, usage, model: str, purpose: str) -> None:
+        """Log token usage of one request and accumulate it"""
+        if usage is not None:
+            prompt_tokens = usage.prompt_tokens or 0
+            completion_tokens = usage.completion_tokens or 0
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+            self.token_usage["prompt_tokens"] += prompt_tokens
+            self.token_usage["cached_tokens"] += cached_tokens
+            self.token_usage["completion_tokens"] += completion_tokens
+            print(f"OpenAI usage [{purpose}] model={model} prompt_tokens={prompt_tokens} "
+                  f"cached_tokens={cached_tokens} completion_tokens={completion_tokens}")
+        self.token_usage["requests"] += 1
@@ -0,0 +1,111 @@
+import json
+import os
+import re
+from typing import Dict, Any, List, Set, Union
+
+# Giới hạn độ dài danh sách/chuỗi gửi lên LLM khi so sánh CV-JD
+MAX_WORK_EXPERIENCE_ITEMS = int(os.getenv("COMPACT_MAX_WORK_EXPERIENCE", "4"))
+MAX_LIST_ITEMS = int(os.getenv("COMPACT_MAX_LIST_ITEMS", "12"))
+MAX_SKILLS = int(os.getenv("COMPACT_MAX_SKILLS", "30"))
+MAX_ITEM_CHARS = int(os.getenv("COMPACT_MAX_ITEM_CHARS", "400"))
+
+# Chỉ các field ảnh hưởng tới việc chấm điểm; bỏ name, email, phone, birth_year...
+CV_SCORING_FIELDS = [
+    "role", "role_category", "experience_years", "skills", "languages", "project_scope",
+    "customer", "location", "certifications", "education", "work_experience"
+]
+JD_SCORING_FIELDS = [
+    "job_title", "job_category", "experience_required", "required_skills", "preferred_skills",
+    "education_required", "responsibilities"
+]
+
+_TOKEN_RE = re.compile(r"[a-z0-9+#.]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class PayloadCompactor:
+    """Project CV/JD data to scoring-relevant fields before sending it to the LLM"""
+
+    def compact_cv(self, cv_data: Dict[str, Any], jd_data: Union[Dict[str, Any], List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Compact CV data; long lists are ranked by relevance to the JD (or JDs) when given"""
+        cv_data = cv_data or {}
+        jd_keywords = self._keywords(jd_data) if jd_data else set()
+        compact = {}
+
+        for field in CV_SCORING_FIELDS:
+            value = self._clean(cv_data.get(field))
+            if value in (None, "", []):
+                continue
+            if field == "skills":
+                value = self._rank_by_relevance(value, jd_keywords, MAX_SKILLS)
+            elif field == "work_experience":
+                value = self._rank_by_relevance(value, jd_keywords, MAX_WORK_EXPERIENCE_ITEMS)
+            elif isinstance(value, list):
+                value = value[:MAX_LIST_ITEMS]
+            compact[field] = value
+
+        return compact
+
+    def compact_jd(self, jd_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Compact JD data to the fields used for scoring"""
+        jd_data = jd_data or {}
+        compact = {}
+
+        for field in JD_SCORING_FIELDS:
+            value = self._clean(jd_data.get(field))
+            if value in (None, "", []):
+                continue
+            if isinstance(value, list):
+                value = value[:MAX_SKILLS if field.endswith("_skills") else MAX_LIST_ITEMS]
+            compact[field] = value
+
+        return compact
+
+    @staticmethod
+    def dumps(data: Any) -> str:
+        """Serialize without indentation/whitespace"""
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    def _clean(self, value: Any) -> Any:
+        """Strip nulls, empty items and redundant whitespace recursively"""
+        if value is None:
+            return None
+        if isinstance(value, str):
+            text = _WHITESPACE_RE.sub(" ", value).strip()
+            if len(text) > MAX_ITEM_CHARS:
+                text = text[:MAX_ITEM_CHARS].rstrip() + "…"
+            return text
+        if isinstance(value, list):
+            items = [self._clean(item) for item in value]
+            return [item for item in items if item not in (None, "", [], {})]
+        if isinstance(value, dict):
+            # Một số CV cũ lưu education/work_experience dạng object
+            items = {key: self._clean(item) for key, item in value.items()}
+            return {key: item for key, item in items.items() if item not in (None, "", [], {})}
+        return value
+
+    def _keywords(self, jd_data: Union[Dict[str, Any], List[Dict[str, Any]]]) -> Set[str]:
+        jd_data_list = jd_data if isinstance(jd_data, list) else [jd_data]
+        parts = []
+        for jd in jd_data_list:
+            jd = jd or {}
+            parts.append(jd.get("job_title") or "")
+            for field in ("required_skills", "preferred_skills", "responsibilities"):
+                parts.extend(str(item) for item in (jd.get(field) or []))
+        return set(_TOKEN_RE.findall(" ".join(parts).lower()))
+
+    def _rank_by_relevance(self, items: List[Any], keywords: Set[str], limit: int) -> List[Any]:
+        """Keep the `limit` items sharing the most tokens with the JD, in original order"""
+        if len(items) <= limit:
+            return items
+        if not keywords:
+            return items[:limit]
+
+        scored = []
+        for position, item in enumerate(items):
+            text = " ".join(str(v) for v in item.values()) if isinstance(item, dict) else str(item)
+            overlap = len(keywords & set(_TOKEN_RE.findall(text.lower())))
+            scored.append((overlap, -position, position))
+
+        keep = sorted(position for _, _, position in sorted(scored, reverse=True)[:limit])
+        return [items[position] for position in keep]
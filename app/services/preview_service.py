@@ -0,0 +1,146 @@
+import asyncio
+import os
+import re
+from typing import Dict, Optional
+
+from app.database import SessionLocal, CV, JobDescription
+from .file_processor import FileProcessor
+
+try:
+    # PyMuPDF là tùy chọn (pip install pymupdf); không có thì chỉ tạo text preview
+    import fitz
+except ImportError:
+    fitz = None
+
+PREVIEW_FOLDER = "uploads/previews"
+# Chiều rộng ảnh trang 1 (px) và số ký tự của text xem trước
+PREVIEW_THUMBNAIL_WIDTH = int(os.getenv("PREVIEW_THUMBNAIL_WIDTH", "240"))
+PREVIEW_TEXT_CHARS = int(os.getenv("PREVIEW_TEXT_CHARS", "1500"))
+
+RECORD_MODELS = {
+    "cv": CV,
+    "jd": JobDescription,
+}
+
+_BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+
+
+class PreviewService:
+    """Generate page-1 thumbnails and short text previews of uploaded files in a background worker
+
+    File preview nằm trong uploads/previews/<cvs|jds>/ với tên suy ra từ file gốc (đã duy nhất),
+    nên được phục vụ với cache immutable như file upload. Danh sách CV/JD chỉ tải vài KB mỗi thẻ
+    thay vì cả file PDF.
+    """
+
+    def __init__(self, file_processor: FileProcessor):
+        self.file_processor = file_processor
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the background worker on the running event loop"""
+        if self._worker and not self._worker.done():
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def enqueue(self, record_type: str, record_id: int) -> None:
+        if self._queue is None:
+            print(f"Warning: Preview worker not started, skipping {record_type} {record_id}")
+            return
+        self._queue.put_nowait((record_type, record_id))
+
+    def enqueue_missing(self) -> Dict[str, int]:
+        """Schedule previews for records that do not have one yet"""
+        counts = {}
+        db = SessionLocal()
+        try:
+            for record_type, model in RECORD_MODELS.items():
+                ids = [row.id for row in db.query(model.id).filter(model.preview_path.is_(None), model.file_path.isnot(None))]
+                for record_id in ids:
+                    self.enqueue(record_type, record_id)
+                counts[f"{record_type}s"] = len(ids)
+        finally:
+            db.close()
+        return counts
+
+    async def _run(self) -> None:
+        while True:
+            record_type, record_id = await self._queue.get()
+            try:
+                await asyncio.to_thread(self.generate, record_type, record_id)
+            except Exception as e:
+                print(f"Warning: Could not generate preview for {record_type} {record_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def preview_paths(file_path: str) -> Dict[str, str]:
+        """uploads/cvs/x.pdf -> uploads/previews/cvs/x.pdf.png / .txt"""
+        folder = os.path.basename(os.path.dirname(file_path))
+        base = os.path.join(PREVIEW_FOLDER, folder, os.path.basename(file_path))
+        return {"thumbnail": f"{base}.png", "text": f"{base}.txt"}
+
+    @staticmethod
+    def _write_atomic(path: str, content: bytes) -> None:
+        # Ghi ra file tạm rồi đổi tên: file preview được cache immutable nên không được phục vụ khi ghi dở
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def render_thumbnail(self, file_path: str) -> Optional[bytes]:
+        """PNG of page 1 scaled to PREVIEW_THUMBNAIL_WIDTH, or None (not a PDF / PyMuPDF missing)"""
+        if fitz is None or not file_path.lower().endswith(".pdf"):
+            return None
+        with fitz.open(file_path) as document:
+            if document.page_count == 0:
+                return None
+            page = document.load_page(0)
+            zoom = PREVIEW_THUMBNAIL_WIDTH / page.rect.width
+            return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False).tobytes("png")
+
+    @staticmethod
+    def preview_text(text_content: str) -> str:
+        text_content = _BLANK_LINES_RE.sub("\n\n", (text_content or "").strip())
+        if len(text_content) <= PREVIEW_TEXT_CHARS:
+            return text_content
+        return text_content[:PREVIEW_TEXT_CHARS].rsplit(" ", 1)[0] + " …"
+
+    def generate(self, record_type: str, record_id: int) -> bool:
+        """Write the thumbnail and text preview of one record and store their paths"""
+        model = RECORD_MODELS[record_type]
+        db = SessionLocal()
+        try:
+            record = db.query(model).filter(model.id == record_id).first()
+            if record is None or not record.file_path or not os.path.exists(record.file_path):
+                return False
+            paths = self.preview_paths(record.file_path)
+
+            text_content = record.extracted_text
+            if text_content is None:
+                text_content = self.file_processor.extract_text(record.file_path)
+            self._write_atomic(paths["text"], self.preview_text(text_content).encode("utf-8"))
+            record.preview_path = paths["text"]
+
+            try:
+                thumbnail = self.render_thumbnail(record.file_path)
+            except Exception as e:
+                # Vẫn giữ text preview nếu không render được PDF
+                print(f"Warning: Could not render thumbnail for {record_type} {record_id}: {str(e)}")
+                thumbnail = None
+            if thumbnail:
+                self._write_atomic(paths["thumbnail"], thumbnail)
+                record.thumbnail_path = paths["thumbnail"]
+            db.commit()
+            return True
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
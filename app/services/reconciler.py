@@ -0,0 +1,186 @@
+import asyncio
+import os
+import time
+from typing import Dict, Any, List
+
+from app.database import SessionLocal, CV, JobDescription
+from .vector_service import VectorService
+
+# Chạy reconcile khi khởi động và/hoặc định kỳ (giây, 0 = tắt)
+RECONCILE_ON_STARTUP = os.getenv("RECONCILE_ON_STARTUP", "0") == "1"
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("RECONCILE_INTERVAL_SECONDS", "0"))
+
+# Giới hạn số biến trong một câu lệnh IN (...) của SQLite
+SQL_IN_BATCH = 500
+
+RECORD_TYPES = {
+    "cv": CV,
+    "jd": JobDescription,
+}
+
+# Cờ SQL của từng loại vector phụ (field/chunk, id dạng "<id>:<field>" / "<id>#<n>")
+DERIVED_FLAGS = {
+    "fields": "has_field_embeddings",
+    "chunks": "has_chunk_embeddings",
+}
+
+
+class ConsistencyReconciler:
+    """Diff SQLite ids against Chroma ids in bulk and repair drift on both sides
+
+    - Vector trong Chroma nhưng không còn row SQL: xóa vector (orphan).
+    - Row có has_embedding=1 nhưng không có vector: đặt has_embedding=0 để /embeddings/reindex tạo lại.
+    - Row có vector nhưng has_embedding=0: đặt has_embedding=1.
+    - Vector field/chunk của row không còn trong SQL: xóa; row có cờ has_field_embeddings /
+      has_chunk_embeddings nhưng thiếu vector phụ (và có text để embed): đặt cờ về 0 để reindex tạo lại.
+    """
+
+    def __init__(self, vector_service: VectorService):
+        self.vector_service = vector_service
+        self._lock = asyncio.Lock()
+        self.last_report: Dict[str, Any] = None
+
+    def reconcile(self, dry_run: bool = False) -> Dict[str, Any]:
+        started = time.perf_counter()
+        report = {"dry_run": dry_run, "collections": {}}
+        db = SessionLocal()
+        try:
+            for record_type, model in RECORD_TYPES.items():
+                report["collections"][record_type] = self._reconcile_type(db, record_type, model, dry_run)
+            if not dry_run:
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        report["total_seconds"] = round(time.perf_counter() - started, 3)
+        self.last_report = report
+        return report
+
+    async def reconcile_async(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Run in a worker thread; concurrent runs are serialized"""
+        async with self._lock:
+            return await asyncio.to_thread(self.reconcile, dry_run)
+
+    async def run_periodically(self, interval_seconds: int) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                report = await self.reconcile_async()
+                self._log(report)
+            except Exception as e:
+                print(f"Warning: Scheduled reconcile failed: {str(e)}")
+
+    def _reconcile_type(self, db, record_type: str, model, dry_run: bool) -> Dict[str, Any]:
+        timings = {}
+
+        started = time.perf_counter()
+        rows = db.query(model.id, model.has_embedding).all()
+        sql_ids = {row.id for row in rows}
+        flagged_ids = {row.id for row in rows if row.has_embedding}
+        timings["sql_seconds"] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        vector_ids = set()
+        invalid_vector_ids = []
+        for vector_id in self.vector_service.get_all_ids(record_type):
+            try:
+                vector_ids.add(int(vector_id))
+            except ValueError:
+                invalid_vector_ids.append(vector_id)
+        timings["vector_seconds"] = round(time.perf_counter() - started, 3)
+
+        orphan_vectors = sorted(vector_ids - sql_ids)
+        missing_vectors = sorted(flagged_ids - vector_ids)
+        unflagged_vectors = sorted((vector_ids & sql_ids) - flagged_ids)
+
+        started = time.perf_counter()
+        if not dry_run:
+            orphan_keys = [str(vector_id) for vector_id in orphan_vectors] + invalid_vector_ids
+            if orphan_keys:
+                self.vector_service.delete_embeddings(record_type, orphan_keys)
+            self._set_flag(db, model, missing_vectors, 0)
+            self._set_flag(db, model, unflagged_vectors, 1)
+        timings["repair_seconds"] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        derived = {
+            kind: self._reconcile_derived(db, record_type, model, kind, collection, sql_ids, dry_run)
+            for kind, collection in self.vector_service.derived_collections(record_type).items()
+        }
+        timings["derived_seconds"] = round(time.perf_counter() - started, 3)
+
+        return {
+            "sql_count": len(sql_ids),
+            "vector_count": len(vector_ids) + len(invalid_vector_ids),
+            "orphan_vectors": len(orphan_vectors) + len(invalid_vector_ids),
+            "missing_vectors": len(missing_vectors),
+            "unflagged_vectors": len(unflagged_vectors),
+            "derived": derived,
+            "timings": timings
+        }
+
+    def _reconcile_derived(self, db, record_type: str, model, kind: str, collection, sql_ids: set,
+                           dry_run: bool) -> Dict[str, int]:
+        """Diff one field/chunk collection against SQL by the parent id encoded in each vector id"""
+        vector_ids = self.vector_service.get_collection_ids(collection)
+        parent_ids = set()
+        orphan_keys = []
+        for vector_id in vector_ids:
+            try:
+                parent_id = self.vector_service.derived_parent_id(vector_id)
+            except ValueError:
+                orphan_keys.append(vector_id)
+                continue
+            if parent_id in sql_ids:
+                parent_ids.add(parent_id)
+            else:
+                orphan_keys.append(vector_id)
+
+        flag = getattr(model, DERIVED_FLAGS[kind])
+        flagged_ids = {row.id for row in db.query(model.id).filter(flag == 1).all()}
+        candidates = sorted(flagged_ids - parent_ids)
+        # CV không có kinh nghiệm / field rỗng hợp lệ không có vector phụ nào
+        missing = []
+        embedding_service = self.vector_service.embedding_service
+        for start in range(0, len(candidates), SQL_IN_BATCH):
+            rows = db.query(model.id, model.raw_data).filter(model.id.in_(candidates[start:start + SQL_IN_BATCH])).all()
+            for row in rows:
+                if kind == "fields":
+                    expected = embedding_service.create_field_texts(row.raw_data or {}, record_type)
+                else:
+                    expected = embedding_service.create_chunk_texts(row.raw_data or {}, record_type)
+                if expected:
+                    missing.append(row.id)
+
+        if not dry_run:
+            for start in range(0, len(orphan_keys), 5000):
+                collection.delete(ids=orphan_keys[start:start + 5000])
+            self._set_flag(db, model, missing, 0, flag)
+
+        return {
+            "vector_count": len(vector_ids),
+            "orphan_vectors": len(orphan_keys),
+            "missing_vectors": len(missing)
+        }
+
+    @staticmethod
+    def _set_flag(db, model, ids: List[int], value: int, column=None) -> None:
+        column = column if column is not None else model.has_embedding
+        for start in range(0, len(ids), SQL_IN_BATCH):
+            db.query(model).filter(model.id.in_(ids[start:start + SQL_IN_BATCH])).update(
+                {column: value}, synchronize_session=False
+            )
+
+    @staticmethod
+    def _log(report: Dict[str, Any]) -> None:
+        for record_type, stats in report["collections"].items():
+            print(f"Reconcile {record_type}: sql={stats['sql_count']} vectors={stats['vector_count']} "
+                  f"orphan_vectors={stats['orphan_vectors']} missing_vectors={stats['missing_vectors']} "
+                  f"unflagged_vectors={stats['unflagged_vectors']}")
+            for kind, derived in stats.get("derived", {}).items():
+                print(f"Reconcile {record_type} {kind}: vectors={derived['vector_count']} "
+                      f"orphan_vectors={derived['orphan_vectors']} missing_vectors={derived['missing_vectors']}")
+        print(f"Reconcile finished in {report['total_seconds']}s (dry_run={report['dry_run']})")
@@ -0,0 +1,251 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from app.database import SessionLocal, CV, JobDescription, ReindexJob
+from .embedding_service import EmbeddingService, EMBEDDING_MODEL
+from .vector_service import VectorService
+
+RECORD_TYPES = {
+    "cv": (CV, "last_cv_id"),
+    "jd": (JobDescription, "last_jd_id"),
+}
+
+
+class ReindexService:
+    """Resumable background job that (re-)embeds records with missing or stale vectors
+
+    Một record bị coi là stale khi has_embedding=0, embedding_model khác model hiện tại,
+    embedding_text_hash khác hash của text tạo bởi create_text_for_embedding, hoặc chưa có
+    vector từng field / chunk kinh nghiệm (record tạo trước multi-vector hoặc chunking).
+    Checkpoint (id lớn nhất đã xử lý) được lưu vào bảng reindex_jobs sau mỗi page,
+    nên job bị gián đoạn có thể resume mà không làm lại từ đầu.
+    """
+
+    def __init__(self, embedding_service: EmbeddingService, vector_service: VectorService):
+        self.embedding_service = embedding_service
+        self.vector_service = vector_service
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def create_job(self, target: str = "all", batch_size: int = 64, concurrency: int = 4, force: bool = False) -> ReindexJob:
+        if target not in ("cv", "jd", "all"):
+            raise ValueError("target must be one of: cv, jd, all")
+        db = SessionLocal()
+        try:
+            job = ReindexJob(
+                target=target,
+                status="pending",
+                force=1 if force else 0,
+                batch_size=max(1, batch_size),
+                concurrency=max(1, concurrency)
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            return job
+        finally:
+            db.close()
+
+    def start(self, job_id: int) -> None:
+        """Schedule the job on the running event loop (no-op if it is already running)"""
+        task = self._tasks.get(job_id)
+        if task and not task.done():
+            return
+        self._tasks[job_id] = asyncio.create_task(self.run(job_id))
+
+    def is_running(self, job_id: int) -> bool:
+        task = self._tasks.get(job_id)
+        return bool(task and not task.done())
+
+    def mark_interrupted_jobs(self) -> List[int]:
+        """Jobs left 'running' by a previous process can be resumed later"""
+        db = SessionLocal()
+        try:
+            jobs = db.query(ReindexJob).filter(ReindexJob.status.in_(["running", "pending"])).all()
+            for job in jobs:
+                job.status = "interrupted"
+            db.commit()
+            return [job.id for job in jobs]
+        finally:
+            db.close()
+
+    def get_job(self, job_id: int) -> Optional[ReindexJob]:
+        db = SessionLocal()
+        try:
+            return db.query(ReindexJob).filter(ReindexJob.id == job_id).first()
+        finally:
+            db.close()
+
+    def job_progress(self, job: ReindexJob) -> Dict[str, Any]:
+        """Progress and throughput of a job"""
+        elapsed = job.elapsed_seconds or 0.0
+        return {
+            "id": job.id,
+            "target": job.target,
+            "status": job.status,
+            "force": bool(job.force),
+            "total": job.total or 0,
+            "scanned": job.scanned or 0,
+            "embedded": job.embedded or 0,
+            "failed": job.failed or 0,
+            "progress": round((job.scanned or 0) / job.total, 4) if job.total else 0.0,
+            "elapsed_seconds": round(elapsed, 2),
+            "embedded_per_second": round((job.embedded or 0) / elapsed, 2) if elapsed else 0.0,
+            "checkpoint": {"last_cv_id": job.last_cv_id or 0, "last_jd_id": job.last_jd_id or 0},
+            "error": job.error,
+            "created_at": job.created_at,
+            "updated_at": job.updated_at,
+            "finished_at": job.finished_at
+        }
+
+    async def run(self, job_id: int) -> None:
+        db = SessionLocal()
+        try:
+            job = db.query(ReindexJob).filter(ReindexJob.id == job_id).first()
+            if not job or job.status == "completed":
+                return
+
+            targets = ["cv", "jd"] if job.target == "all" else [job.target]
+            job.status = "running"
+            job.error = None
+            # total = số record còn phải quét tính từ checkpoint + số đã quét trước đó
+            job.total = (job.scanned or 0) + sum(
+                db.query(RECORD_TYPES[record_type][0])
+                .filter(RECORD_TYPES[record_type][0].id > (getattr(job, RECORD_TYPES[record_type][1]) or 0))
+                .count()
+                for record_type in targets
+            )
+            job.updated_at = datetime.utcnow()
+            db.commit()
+
+            semaphore = asyncio.Semaphore(job.concurrency or 1)
+            for record_type in targets:
+                await self._reindex_type(db, job, record_type, semaphore)
+
+            job.status = "completed"
+            job.finished_at = datetime.utcnow()
+            job.updated_at = job.finished_at
+            db.commit()
+            print(f"Reindex job {job_id} completed: {job.embedded} embedded, {job.failed} failed, "
+                  f"{job.scanned} scanned in {job.elapsed_seconds:.1f}s")
+        except Exception as e:
+            db.rollback()
+            job = db.query(ReindexJob).filter(ReindexJob.id == job_id).first()
+            if job:
+                job.status = "failed"
+                job.error = str(e)
+                job.updated_at = datetime.utcnow()
+                db.commit()
+            print(f"Reindex job {job_id} failed: {str(e)}")
+        finally:
+            db.close()
+
+    async def _reindex_type(self, db, job: ReindexJob, record_type: str, semaphore: asyncio.Semaphore) -> None:
+        model, checkpoint_field = RECORD_TYPES[record_type]
+        page_size = (job.batch_size or 64) * (job.concurrency or 1)
+
+        while True:
+            started = time.perf_counter()
+            last_id = getattr(job, checkpoint_field) or 0
+            records = (
+                db.query(model)
+                .filter(model.id > last_id)
+                .order_by(model.id)
+                .limit(page_size)
+                .all()
+            )
+            if not records:
+                return
+
+            stale = []
+            for record in records:
+                text = self.embedding_service.create_text_for_embedding(record.raw_data or {}, record_type)
+                text_hash = self.embedding_service.text_hash(text)
+                if job.force or self._is_stale(record_type, record, text_hash):
+                    stale.append((record, text, text_hash))
+
+            batch_size = job.batch_size or 64
+            batches = [stale[i:i + batch_size] for i in range(0, len(stale), batch_size)]
+            results = await asyncio.gather(
+                *(self._embed_batch(record_type, batch, semaphore) for batch in batches)
+            )
+
+            embedded = sum(ok for ok, _ in results)
+            failed = sum(failed_count for _, failed_count in results)
+
+            setattr(job, checkpoint_field, records[-1].id)
+            job.scanned = (job.scanned or 0) + len(records)
+            job.embedded = (job.embedded or 0) + embedded
+            job.failed = (job.failed or 0) + failed
+            job.elapsed_seconds = (job.elapsed_seconds or 0.0) + (time.perf_counter() - started)
+            job.updated_at = datetime.utcnow()
+            # Commit cả cờ has_embedding/hash của record và checkpoint của job cùng lúc
+            db.commit()
+
+    async def _embed_batch(self, record_type: str, batch: List[tuple], semaphore: asyncio.Semaphore) -> tuple:
+        """Embed one batch in a worker thread and upsert it; returns (embedded, failed)"""
+        # Text tổng, text từng field và chunk của cả batch đi chung một request embedding
+        field_texts = [
+            self.embedding_service.create_field_texts(record.raw_data or {}, record_type) for record, _, _ in batch
+        ]
+        chunk_texts = [
+            self.embedding_service.create_chunk_texts(record.raw_data or {}, record_type) for record, _, _ in batch
+        ]
+        texts = (
+            [text for _, text, _ in batch]
+            + [text for fields in field_texts for text in fields.values()]
+            + [text for chunks in chunk_texts for text in chunks]
+        )
+        async with semaphore:
+            try:
+                embeddings = await asyncio.to_thread(self.embedding_service.generate_embeddings, texts)
+                ids = [record.id for record, _, _ in batch]
+                field_embeddings = []
+                offset = len(batch)
+                for fields in field_texts:
+                    field_embeddings.append(dict(zip(fields, embeddings[offset:offset + len(fields)])))
+                    offset += len(fields)
+                chunk_embeddings = []
+                for chunks in chunk_texts:
+                    chunk_embeddings.append(list(zip(chunks, embeddings[offset:offset + len(chunks)])))
+                    offset += len(chunks)
+                embeddings = embeddings[:len(batch)]
+                if record_type == "cv":
+                    metadatas = [
+                        self.vector_service.build_cv_metadata(record.raw_data or {}, record.status)
+                        for record, _, _ in batch
+                    ]
+                    await asyncio.to_thread(self.vector_service.upsert_cv_embeddings, ids, embeddings, metadatas)
+                else:
+                    metadatas = [self.vector_service.build_jd_metadata(record.raw_data or {}) for record, _, _ in batch]
+                    await asyncio.to_thread(self.vector_service.upsert_jd_embeddings, ids, embeddings, metadatas)
+                await asyncio.to_thread(
+                    self.vector_service.upsert_field_embeddings, record_type, list(zip(ids, field_embeddings, metadatas))
+                )
+                if record_type == "cv":
+                    await asyncio.to_thread(
+                        self.vector_service.upsert_cv_chunk_embeddings, list(zip(ids, chunk_embeddings, metadatas))
+                    )
+            except Exception as e:
+                print(f"Warning: Could not embed {record_type} batch {[record.id for record, _, _ in batch]}: {str(e)}")
+                return 0, len(batch)
+
+        for record, _, text_hash in batch:
+            record.has_embedding = 1
+            record.has_field_embeddings = 1
+            if record_type == "cv":
+                record.has_chunk_embeddings = 1
+            record.embedding_text_hash = text_hash
+            record.embedding_model = EMBEDDING_MODEL
+        return len(batch), 0
+
+    @staticmethod
+    def _is_stale(record_type: str, record, text_hash: str) -> bool:
+        return (
+            not record.has_embedding
+            or not record.has_field_embeddings
+            or (record_type == "cv" and not record.has_chunk_embeddings)
+            or record.embedding_model != EMBEDDING_MODEL
+            or record.embedding_text_hash != text_hash
+        )
@@ -0,0 +1,189 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import or_
+
+from app.database import SessionLocal, CV, JobDescription
+from .embedding_service import EmbeddingService, EMBEDDING_MODEL
+from .file_processor import FileProcessor
+from .ingestion_service import apply_parsed_cv, apply_parsed_jd
+from .match_service import MatchService
+from .openai_service import OpenAIService, PARSER_VERSION
+from .skill_index import SkillIndex
+from .vector_service import VectorService
+
+RECORD_MODELS = {
+    "cv": CV,
+    "jd": JobDescription,
+}
+
+
+class ReprocessService:
+    """Re-run LLM parsing for records parsed with an older prompt/model and refresh them in place
+
+    Dùng text đã lưu (cột extracted_text); chỉ trích xuất lại từ file_path khi chưa có.
+    Row SQLite, bảng skill, vector ChromaDB (tổng, field, chunk) được cập nhật theo id cũ,
+    nên không tạo bản ghi trùng như khi upload lại.
+    """
+
+    def __init__(self, file_processor: FileProcessor, openai_service: OpenAIService,
+                 embedding_service: EmbeddingService, vector_service: VectorService,
+                 skill_index: SkillIndex, match_service: MatchService):
+        self.file_processor = file_processor
+        self.openai_service = openai_service
+        self.embedding_service = embedding_service
+        self.vector_service = vector_service
+        self.skill_index = skill_index
+        self.match_service = match_service
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.last_report: Dict[str, Any] = None
+
+    def is_running(self) -> bool:
+        return bool(self._task and not self._task.done())
+
+    def start(self, target: str = "all", concurrency: int = 4, force: bool = False,
+              limit: Optional[int] = None, ids: Optional[List[int]] = None) -> None:
+        """Run in the background; progress is visible in last_report"""
+        if target not in ("cv", "jd", "all"):
+            raise ValueError("target must be one of: cv, jd, all")
+        if self.is_running():
+            raise RuntimeError("A reprocess run is already in progress")
+        self._task = asyncio.create_task(self.run(target, concurrency, force, limit, ids))
+
+    def stale_query(self, db, record_type: str, force: bool = False, ids: Optional[List[int]] = None):
+        model = RECORD_MODELS[record_type]
+        query = db.query(model.id)
+        if ids:
+            query = query.filter(model.id.in_(ids))
+        if not force:
+            query = query.filter(or_(model.parser_version.is_(None), model.parser_version != PARSER_VERSION))
+        return query
+
+    async def run(self, target: str = "all", concurrency: int = 4, force: bool = False,
+                  limit: Optional[int] = None, ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        async with self._lock:
+            targets = ["cv", "jd"] if target == "all" else [target]
+            db = SessionLocal()
+            try:
+                pending = {
+                    record_type: [row.id for row in self.stale_query(db, record_type, force, ids).order_by(RECORD_MODELS[record_type].id)]
+                    for record_type in targets
+                }
+            finally:
+                db.close()
+            if limit is not None:
+                for record_type in targets:
+                    pending[record_type] = pending[record_type][:limit]
+
+            report = {
+                "status": "running",
+                "target": target,
+                "parser_version": PARSER_VERSION,
+                "total": sum(len(record_ids) for record_ids in pending.values()),
+                "processed": 0,
+                "reextracted": 0,
+                "failed": 0,
+                "failures": [],
+                "started_at": datetime.utcnow().isoformat(),
+                "elapsed_seconds": 0.0
+            }
+            self.last_report = report
+            started = time.perf_counter()
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+
+            async def _bounded(record_type: str, record_id: int):
+                async with semaphore:
+                    try:
+                        reextracted = await self.reprocess_record(record_type, record_id)
+                        report["processed"] += 1
+                        report["reextracted"] += int(reextracted)
+                    except Exception as e:
+                        report["failed"] += 1
+                        report["failures"].append({"type": record_type, "id": record_id, "error": str(e)})
+                        print(f"Warning: Could not reprocess {record_type} {record_id}: {str(e)}")
+                    report["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+
+            await asyncio.gather(*(
+                _bounded(record_type, record_id)
+                for record_type in targets for record_id in pending[record_type]
+            ))
+
+            report["status"] = "completed"
+            report["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+            report["finished_at"] = datetime.utcnow().isoformat()
+            print(f"Reprocess completed: {report['processed']} processed, {report['failed']} failed "
+                  f"in {report['elapsed_seconds']:.1f}s")
+            return report
+
+    async def reprocess_record(self, record_type: str, record_id: int) -> bool:
+        """Reparse one record and refresh its row, skill rows and vectors; returns True if the file was re-extracted"""
+        model = RECORD_MODELS[record_type]
+        db = SessionLocal()
+        try:
+            record = db.query(model).filter(model.id == record_id).first()
+            if record is None:
+                raise ValueError("record no longer exists")
+
+            text_content = record.extracted_text
+            reextracted = not text_content
+            if reextracted:
+                if not record.file_path:
+                    raise ValueError("no stored text and no file_path to re-extract from")
+                text_content = await asyncio.to_thread(self.file_processor.extract_text, record.file_path)
+                record.extracted_text = text_content
+
+            if record_type == "cv":
+                parsed = await self.openai_service.parse_cv(text_content, record.filename)
+                apply_parsed_cv(record, parsed)
+                self.skill_index.sync_cv(db, record.id, parsed)
+            else:
+                parsed = await self.openai_service.parse_jd(text_content)
+                apply_parsed_jd(record, parsed)
+                self.skill_index.sync_jd(db, record.id, parsed)
+            record.parser_version = PARSER_VERSION
+            db.commit()
+
+            await self._refresh_vectors(db, record_type, record, parsed)
+            return reextracted
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _refresh_vectors(self, db, record_type: str, record, parsed: Dict[str, Any]) -> None:
+        try:
+            embedding_text, embedding, field_embeddings, chunks = await asyncio.to_thread(
+                self.embedding_service.generate_document_embeddings, parsed, record_type
+            )
+            if record_type == "cv":
+                metadata = self.vector_service.build_cv_metadata(parsed, record.status)
+                await asyncio.to_thread(self.vector_service.upsert_cv_embeddings, [record.id], [embedding], [metadata])
+            else:
+                metadata = self.vector_service.build_jd_metadata(parsed)
+                await asyncio.to_thread(self.vector_service.upsert_jd_embeddings, [record.id], [embedding], [metadata])
+            # Hai hàm upsert dưới đây tự xóa field/chunk không còn sau khi parse lại
+            await asyncio.to_thread(
+                self.vector_service.upsert_field_embeddings, record_type, [(record.id, field_embeddings, metadata)]
+            )
+            if record_type == "cv":
+                await asyncio.to_thread(self.vector_service.upsert_cv_chunk_embeddings, [(record.id, chunks, metadata)])
+                record.has_chunk_embeddings = 1
+
+            record.has_embedding = 1
+            record.has_field_embeddings = 1
+            record.embedding_text_hash = self.embedding_service.text_hash(embedding_text)
+            record.embedding_model = EMBEDDING_MODEL
+            db.commit()
+        except Exception as e:
+            # Row đã được cập nhật; vector cũ sẽ bị /embeddings/reindex phát hiện qua embedding_text_hash
+            print(f"Warning: Could not refresh embedding for {record_type} {record.id}: {str(e)}")
+            return
+
+        if record_type == "cv":
+            self.match_service.enqueue_cv(record.id)
+        else:
+            self.match_service.enqueue_jd(record.id, record.priority)
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, text
+
+# Số response giữ trong bộ nhớ (LRU), 0 = chỉ dùng ETag/304, không cache body
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "64"))
+
+Versions = Tuple[Tuple[str, int], ...]
+
+
+class ResponseCache:
+    """ETags from per-table change versions plus an in-process LRU of rendered list responses
+
+    Version của bảng (table_versions) được trigger tăng ở mỗi lần ghi, nên chỉ cần một query theo
+    khóa chính để biết response còn mới hay không. Body được cache kèm version lúc render;
+    khi có ghi, version đổi và entry cũ bị bỏ qua rồi xóa.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Versions, str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def versions(self, db, tables: Tuple[str, ...]) -> Optional[Versions]:
+        """Current versions of the given tables, or None when version tracking is unavailable"""
+        try:
+            rows = db.execute(
+                text("SELECT table_name, version FROM table_versions WHERE table_name IN ("
+                     + ", ".join(f":t{index}" for index in range(len(tables))) + ")"),
+                {f"t{index}": table for index, table in enumerate(tables)}
+            ).all()
+        except Exception as e:
+            print(f"Warning: Could not read table versions: {str(e)}")
+            return None
+        found = dict(rows)
+        if any(table not in found for table in tables):
+            return None
+        return tuple((table, found[table]) for table in tables)
+
+    @staticmethod
+    def etag(key: str, versions: Versions) -> str:
+        # Weak ETag: nội dung giống nhau nhưng byte có thể khác sau khi nén
+        digest = hashlib.sha1(f"{key}|{versions}".encode("utf-8")).hexdigest()[:20]
+        return f'W/"{digest}"'
+
+    @staticmethod
+    def matches(if_none_match: Optional[str], etag: str) -> bool:
+        if not if_none_match:
+            return False
+        candidates = [value.strip() for value in if_none_match.split(",")]
+        # So sánh yếu: W/"x" khớp với "x"
+        return "*" in candidates or etag.removeprefix("W/") in (value.removeprefix("W/") for value in candidates)
+
+    def get(self, key: str, versions: Versions) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != versions:
+                # Bảng đã thay đổi sau khi render
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: str, versions: Versions, etag: str, body: bytes) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (versions, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table: Optional[str] = None) -> None:
+        """Drop cached bodies that depend on table (all of them if None)"""
+        with self._lock:
+            if table is None:
+                self._entries.clear()
+                return
+            for key in [key for key, (versions, _, _) in self._entries.items()
+                        if table in dict(versions)]:
+                del self._entries[key]
+
+    def track_writes(self, session_factory) -> None:
+        """Invalidate on commit of ORM writes made in this process
+
+        Ghi bằng bulk_insert_mappings / query.delete() không đi qua đây, nhưng vẫn làm đổi version
+        nên entry cũ không bao giờ được trả về.
+        """
+        @event.listens_for(session_factory, "after_flush")
+        def _collect(session, flush_context):
+            tables = session.info.setdefault("written_tables", set())
+            for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+                table = getattr(instance, "__tablename__", None)
+                if table:
+                    tables.add(table)
+
+        @event.listens_for(session_factory, "after_commit")
+        def _invalidate(session):
+            for table in session.info.pop("written_tables", ()):
+                self.invalidate(table)
+
+        @event.listens_for(session_factory, "after_rollback")
+        def _discard(session):
+            session.info.pop("written_tables", None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = len(self._entries)
+            size = sum(len(body) for _, _, body in self._entries.values())
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified
+        }
@@ -0,0 +1,175 @@
+import re
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import select, func
+
+from app.database import SessionLocal, CV, JobDescription, CVSkill, CVLanguage, JDSkill
+from .metadata_encoder import MetadataEncoder
+
+# Các cách viết khác nhau của cùng một skill
+SKILL_ALIASES = {
+    "reactjs": "react", "react.js": "react", "react js": "react",
+    "vuejs": "vue", "vue.js": "vue", "vue js": "vue",
+    "angularjs": "angular", "angular.js": "angular",
+    "nodejs": "node.js", "node js": "node.js", "node": "node.js",
+    "nextjs": "next.js", "next js": "next.js",
+    "js": "javascript", "ecmascript": "javascript",
+    "ts": "typescript",
+    "golang": "go",
+    "postgres": "postgresql", "postgre": "postgresql",
+    "mongo": "mongodb",
+    "k8s": "kubernetes",
+    "c sharp": "c#", "csharp": "c#",
+    "dotnet": ".net", "dot net": ".net",
+    "aws cloud": "aws", "amazon web services": "aws",
+    "gcp": "google cloud", "google cloud platform": "google cloud",
+}
+
+# Giới hạn số biến trong một câu lệnh IN (...) của SQLite
+SQL_IN_BATCH = 500
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+class SkillIndex:
+    """Keep cv_skills / cv_languages / jd_skills in sync with the JSON columns and query them
+
+    Các bảng chuẩn hóa cho phép trả lời "React AND TypeScript AND Japanese" bằng index
+    (skill, cv_id) thay vì quét JSON trong Python.
+    """
+
+    def __init__(self, metadata_encoder: Optional[MetadataEncoder] = None):
+        self.metadata_encoder = metadata_encoder or MetadataEncoder()
+
+    @staticmethod
+    def normalize_skill(value: Any) -> Optional[str]:
+        skill = _SPACE_RE.sub(" ", str(value or "")).strip().lower()
+        if not skill:
+            return None
+        return SKILL_ALIASES.get(skill, skill)
+
+    def normalize_skills(self, values: List[Any]) -> List[str]:
+        return list(dict.fromkeys(skill for skill in (self.normalize_skill(v) for v in values or []) if skill))
+
+    def normalize_languages(self, values: List[Any]) -> List[str]:
+        return list(dict.fromkeys(
+            language for language in (self.metadata_encoder.normalize_language(v) for v in values or []) if language
+        ))
+
+    def sync_cv(self, db, cv_id: int, cv_data: Dict[str, Any]) -> None:
+        """Replace the skill/language rows of one CV (caller commits)"""
+        self.remove_cv(db, cv_id)
+        db.bulk_insert_mappings(CVSkill, [
+            {"cv_id": cv_id, "skill": skill} for skill in self.normalize_skills(cv_data.get("skills"))
+        ])
+        db.bulk_insert_mappings(CVLanguage, [
+            {"cv_id": cv_id, "language": language} for language in self.normalize_languages(cv_data.get("languages"))
+        ])
+
+    def sync_jd(self, db, jd_id: int, jd_data: Dict[str, Any]) -> None:
+        """Replace the skill rows of one JD (caller commits); a skill both required and preferred counts as required"""
+        self.remove_jd(db, jd_id)
+        required = self.normalize_skills(jd_data.get("required_skills"))
+        preferred = [skill for skill in self.normalize_skills(jd_data.get("preferred_skills")) if skill not in required]
+        db.bulk_insert_mappings(JDSkill, [
+            {"jd_id": jd_id, "skill": skill, "required": 1} for skill in required
+        ] + [
+            {"jd_id": jd_id, "skill": skill, "required": 0} for skill in preferred
+        ])
+
+    def remove_cv(self, db, cv_id: int) -> None:
+        db.query(CVSkill).filter(CVSkill.cv_id == cv_id).delete(synchronize_session=False)
+        db.query(CVLanguage).filter(CVLanguage.cv_id == cv_id).delete(synchronize_session=False)
+
+    def remove_jd(self, db, jd_id: int) -> None:
+        db.query(JDSkill).filter(JDSkill.jd_id == jd_id).delete(synchronize_session=False)
+
+    def clear(self, db, cvs: bool = True, jds: bool = True) -> None:
+        if cvs:
+            db.query(CVSkill).delete(synchronize_session=False)
+            db.query(CVLanguage).delete(synchronize_session=False)
+        if jds:
+            db.query(JDSkill).delete(synchronize_session=False)
+
+    def backfill(self, batch_size: int = 1000) -> Dict[str, int]:
+        """Rebuild all rows from the JSON columns in id-ordered pages (one transaction per page)"""
+        counts = {"cvs": 0, "jds": 0}
+        db = SessionLocal()
+        try:
+            self.clear(db)
+            db.commit()
+            for model, key in ((CV, "cvs"), (JobDescription, "jds")):
+                last_id = 0
+                while True:
+                    records = db.query(model).filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+                    if not records:
+                        break
+                    for record in records:
+                        if model is CV:
+                            self.sync_cv(db, record.id, {"skills": record.skills, "languages": record.languages})
+                        else:
+                            self.sync_jd(db, record.id, {
+                                "required_skills": record.required_skills,
+                                "preferred_skills": record.preferred_skills
+                            })
+                    db.commit()
+                    counts[key] += len(records)
+                    last_id = records[-1].id
+            return counts
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def filter_cvs_query(self, db, all_skills: List[str] = None, any_skills: List[str] = None,
+                         languages: List[str] = None, status: Optional[str] = None,
+                         role_category: Optional[str] = None, min_experience: Optional[int] = None,
+                         max_experience: Optional[int] = None):
+        """CV query for: every skill in all_skills AND at least one of any_skills AND every language
+
+        Mỗi điều kiện AND là một subquery GROUP BY cv_id HAVING COUNT = n trên index (skill, cv_id).
+        """
+        query = db.query(CV)
+        required = self.normalize_skills(all_skills)
+        if required:
+            query = query.filter(CV.id.in_(
+                select(CVSkill.cv_id)
+                .where(CVSkill.skill.in_(required))
+                .group_by(CVSkill.cv_id)
+                .having(func.count(CVSkill.skill) == len(required))
+            ))
+        optional = self.normalize_skills(any_skills)
+        if optional:
+            query = query.filter(CV.id.in_(select(CVSkill.cv_id).where(CVSkill.skill.in_(optional))))
+        required_languages = self.normalize_languages(languages)
+        if required_languages:
+            query = query.filter(CV.id.in_(
+                select(CVLanguage.cv_id)
+                .where(CVLanguage.language.in_(required_languages))
+                .group_by(CVLanguage.cv_id)
+                .having(func.count(CVLanguage.language) == len(required_languages))
+            ))
+        if status:
+            query = query.filter(CV.status == status)
+        if role_category:
+            query = query.filter(CV.role_category == role_category)
+        if min_experience is not None:
+            query = query.filter(CV.experience_years >= min_experience)
+        if max_experience is not None:
+            query = query.filter(CV.experience_years <= max_experience)
+        return query
+
+    def matched_skills(self, db, cv_ids: List[int], skills: List[str]) -> Dict[int, List[str]]:
+        """Which of the requested skills each CV has (for highlighting results)"""
+        normalized = self.normalize_skills(skills)
+        matched: Dict[int, List[str]] = {}
+        if not normalized or not cv_ids:
+            return matched
+        for start in range(0, len(cv_ids), SQL_IN_BATCH):
+            rows = db.query(CVSkill.cv_id, CVSkill.skill).filter(
+                CVSkill.cv_id.in_(cv_ids[start:start + SQL_IN_BATCH]), CVSkill.skill.in_(normalized)
+            ).all()
+            for row in rows:
+                matched.setdefault(row.cv_id, []).append(row.skill)
+        return matched
@@ -2,117 +2,455 @@ import chromadb
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
 import os
-from .embedding_service import EmbeddingService
+import re
+from .embedding_service import EmbeddingService, EMBEDDING_FIELDS, MAX_CHUNKS_PER_DOCUMENT
+from .metadata_encoder import MetadataEncoder
+from .compact_vector_store import CompactVectorStore, COMPACT_VECTOR_STORE, COMPACT_VECTOR_DIR
+
+# Mỗi field lấy n_results * factor ứng viên từ ANN trước khi chấm điểm tổng có trọng số
+FIELD_CANDIDATE_FACTOR = int(os.getenv("MULTI_VECTOR_CANDIDATE_FACTOR", "3"))
+
+# Chunk search: số chunk lấy từ ANN = n_results * factor, nhưng không vượt quá CHUNK_MAX_CANDIDATES
+CHUNK_CANDIDATE_FACTOR = int(os.getenv("CHUNK_CANDIDATE_FACTOR", "5"))
+CHUNK_MAX_CANDIDATES = int(os.getenv("CHUNK_MAX_CANDIDATES", "500"))
+
+# Key của metadata riêng cho vector con (field/chunk), giữ nguyên khi đồng bộ metadata của document
+DERIVED_METADATA_KEYS = ("parent_id", "field", "chunk_index")
+
+
+def hnsw_config_from_env() -> Dict[str, int]:
+    """HNSW parameters for Chroma collections; unset values keep Chroma's defaults
+    
+    CHROMA_HNSW_CONSTRUCTION_EF và CHROMA_HNSW_M chỉ có hiệu lực khi collection được tạo mới,
+    CHROMA_HNSW_SEARCH_EF được áp dụng cho cả collection đã tồn tại.
+    """
+    config = {}
+    for key, env_name in (("hnsw:construction_ef", "CHROMA_HNSW_CONSTRUCTION_EF"),
+                          ("hnsw:M", "CHROMA_HNSW_M"),
+                          ("hnsw:search_ef", "CHROMA_HNSW_SEARCH_EF")):
+        value = os.getenv(env_name)
+        if value:
+            config[key] = int(value)
+    return config
+
 
 class VectorService:
-    def __init__(self):
+    def __init__(self, hnsw_config: Optional[Dict[str, int]] = None, compact: bool = COMPACT_VECTOR_STORE):
         self.embedding_service = EmbeddingService()
+        self.metadata_encoder = MetadataEncoder()
+        # False cho tới khi mọi vector CV có metadata "status" (vector lưu trước facet metadata thì không có);
+        # trong lúc đó JD→CV matching lọc status bằng SQL thay vì trong Chroma
+        self.cv_status_metadata_ready = False
+        self.hnsw_config = hnsw_config if hnsw_config is not None else hnsw_config_from_env()
+        # COMPACT_VECTOR_STORE=1: vector + metadata của cv/jd nằm trong compact store thay vì
+        # collection cv_embeddings/jd_embeddings của Chroma (field/chunk vẫn ở Chroma)
+        self.compact_stores: Dict[str, CompactVectorStore] = {
+            name: CompactVectorStore(COMPACT_VECTOR_DIR, name) for name in ("cv", "jd")
+        } if compact else {}
         # Initialize ChromaDB client
         self.client = chromadb.PersistentClient(path="./chroma_db")
         
         # Create collections for CVs and JDs
-        self.cv_collection = self.client.get_or_create_collection(
-            name="cv_embeddings",
-            metadata={"description": "CV embeddings for similarity search"}
+        self.cv_collection = self._get_or_create_collection(
+            "cv_embeddings", "CV embeddings for similarity search"
+        )
+        self.jd_collection = self._get_or_create_collection(
+            "jd_embeddings", "JD embeddings for similarity search"
+        )
+        # Field-level vectors (multi-vector), id dạng "<parent_id>:<field>"
+        self.cv_field_collection = self._get_or_create_collection(
+            "cv_field_embeddings", "Per-field CV embeddings (skills, role, work history, domain)"
         )
-        self.jd_collection = self.client.get_or_create_collection(
-            name="jd_embeddings", 
-            metadata={"description": "JD embeddings for similarity search"}
+        self.jd_field_collection = self._get_or_create_collection(
+            "jd_field_embeddings", "Per-field JD embeddings (skills, role, work history, domain)"
+        )
+        # Chunk kinh nghiệm làm việc của CV, id dạng "<cv_id>#<chunk_index>"
+        self.cv_chunk_collection = self._get_or_create_collection(
+            "cv_chunk_embeddings", "CV work-experience chunk embeddings"
         )
     
-    def store_cv_embedding(self, cv_id: int, embedding: np.ndarray, metadata: Dict[str, Any] = None) -> None:
-        """Store CV embedding in ChromaDB"""
+    def _get_or_create_collection(self, name: str, description: str):
+        """Create the collection with the configured HNSW parameters
+        
+        Chroma chỉ đọc hnsw:construction_ef / hnsw:M lúc tạo index; với collection đã có,
+        chỉ cập nhật hnsw:search_ef nếu khác cấu hình.
+        """
         try:
-            self.cv_collection.add(
-                ids=[str(cv_id)],
-                embeddings=[embedding.tolist()],
-                metadatas=[metadata or {}]
+            collection = self.client.get_collection(name=name)
+        except Exception:
+            return self.client.create_collection(
+                name=name,
+                metadata={"description": description, **self.hnsw_config}
             )
+        
+        search_ef = self.hnsw_config.get("hnsw:search_ef")
+        current = collection.metadata or {}
+        if search_ef and current.get("hnsw:search_ef") != search_ef:
+            try:
+                collection.modify(metadata={**current, "hnsw:search_ef": search_ef})
+            except Exception as e:
+                print(f"Warning: Could not update hnsw:search_ef of {name}: {str(e)}")
+        for key in ("hnsw:construction_ef", "hnsw:M"):
+            if key in self.hnsw_config and current.get(key) != self.hnsw_config[key]:
+                print(f"Warning: {key}={self.hnsw_config[key]} ignored for existing collection {name} "
+                      f"(recreate the collection and run /embeddings/reindex to apply)")
+        return collection
+    
+    def store_cv_embedding(self, cv_id: int, embedding: np.ndarray, metadata: Dict[str, Any] = None) -> None:
+        """Store CV embedding in ChromaDB (upsert so a reused id never fails)"""
+        try:
+            self._upsert_main("cv", [cv_id], [embedding], [metadata or {}])
         except Exception as e:
             raise Exception(f"Error storing CV embedding: {str(e)}")
     
     def store_jd_embedding(self, jd_id: int, embedding: np.ndarray, metadata: Dict[str, Any] = None) -> None:
-        """Store JD embedding in ChromaDB"""
+        """Store JD embedding in ChromaDB (upsert so a reused id never fails)"""
         try:
-            self.jd_collection.add(
-                ids=[str(jd_id)],
-                embeddings=[embedding.tolist()],
-                metadatas=[metadata or {}]
-            )
+            self._upsert_main("jd", [jd_id], [embedding], [metadata or {}])
         except Exception as e:
             raise Exception(f"Error storing JD embedding: {str(e)}")
     
+    def build_cv_metadata(self, cv_data: Dict[str, Any], status: str = "new") -> Dict[str, Any]:
+        """Build Chroma metadata for a CV (scalar-only, list fields flattened by MetadataEncoder)"""
+        return self.metadata_encoder.encode_cv(cv_data, status)
+    
+    def build_jd_metadata(self, jd_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build Chroma metadata for a JD (scalar-only)"""
+        return self.metadata_encoder.encode_jd(jd_data)
+    
+    def update_cv_status(self, cv_id: int, status: str) -> None:
+        """Keep the status facet in sync when a CV moves through the pipeline"""
+        try:
+            existing = self.get_metadatas("cv", [cv_id])
+            if cv_id not in existing:
+                return
+            self._update_main_metadatas("cv", [cv_id], [{**existing[cv_id], "status": status}])
+            
+            for collection, derived_ids in self._derived_vectors("cv", [cv_id]):
+                derived = collection.get(ids=derived_ids, include=["metadatas"])
+                if derived['ids']:
+                    collection.update(
+                        ids=derived['ids'],
+                        metadatas=[{**(derived_metadata or {}), "status": status} for derived_metadata in derived['metadatas']]
+                    )
+        except Exception as e:
+            print(f"Warning: Could not update status of CV embedding {cv_id}: {str(e)}")
+    
+    def update_metadatas(self, collection_name: str, ids: List[int], metadatas: List[Dict[str, Any]]) -> None:
+        """Replace metadata of existing vectors without re-embedding"""
+        existing = set(self.get_metadatas(collection_name, ids))
+        pairs = [(str(item_id), metadata) for item_id, metadata in zip(ids, metadatas) if int(item_id) in existing]
+        if not pairs:
+            return
+        try:
+            self._update_main_metadatas(collection_name, [item_id for item_id, _ in pairs],
+                                        [metadata for _, metadata in pairs])
+            
+            # Field/chunk vectors mang cùng metadata (để facet filter áp dụng được cho multi-vector search)
+            metadata_by_id = dict(pairs)
+            for derived_collection, derived_ids in self._derived_vectors(collection_name, [item_id for item_id, _ in pairs]):
+                derived = derived_collection.get(ids=derived_ids, include=["metadatas"])
+                if derived['ids']:
+                    derived_collection.update(
+                        ids=derived['ids'],
+                        metadatas=[
+                            {**metadata_by_id[str(derived_metadata["parent_id"])],
+                             **{key: derived_metadata[key] for key in DERIVED_METADATA_KEYS if key in derived_metadata}}
+                            for derived_metadata in derived['metadatas']
+                        ]
+                    )
+        except Exception as e:
+            raise Exception(f"Error updating {collection_name} metadata: {str(e)}")
+    
+    def upsert_cv_embeddings(self, cv_ids: List[int], embeddings: List[np.ndarray], metadatas: List[Dict[str, Any]]) -> None:
+        """Insert or replace many CV embeddings in one ChromaDB call"""
+        if not cv_ids:
+            return
+        try:
+            self._upsert_main("cv", cv_ids, embeddings, metadatas)
+        except Exception as e:
+            raise Exception(f"Error upserting CV embeddings: {str(e)}")
+    
+    def upsert_jd_embeddings(self, jd_ids: List[int], embeddings: List[np.ndarray], metadatas: List[Dict[str, Any]]) -> None:
+        """Insert or replace many JD embeddings in one ChromaDB call"""
+        if not jd_ids:
+            return
+        try:
+            self._upsert_main("jd", jd_ids, embeddings, metadatas)
+        except Exception as e:
+            raise Exception(f"Error upserting JD embeddings: {str(e)}")
+    
+    @staticmethod
+    def field_vector_id(parent_id: Any, field: str) -> str:
+        return f"{parent_id}:{field}"
+    
+    def _field_collection(self, collection_name: str):
+        return self.cv_field_collection if collection_name == "cv" else self.jd_field_collection
+    
+    def upsert_field_embeddings(self, collection_name: str,
+                                items: List[Tuple[int, Dict[str, np.ndarray], Dict[str, Any]]]) -> None:
+        """Replace the per-field vectors of many documents: items are (parent_id, {field: embedding}, metadata)
+        
+        Field không còn dữ liệu sẽ bị xóa để không giữ lại vector cũ.
+        """
+        if not items:
+            return
+        ids, embeddings, metadatas, removed = [], [], [], []
+        for parent_id, field_embeddings, metadata in items:
+            for field in EMBEDDING_FIELDS:
+                vector_id = self.field_vector_id(parent_id, field)
+                if field in field_embeddings:
+                    ids.append(vector_id)
+                    embeddings.append(field_embeddings[field].tolist())
+                    metadatas.append({**(metadata or {}), "parent_id": int(parent_id), "field": field})
+                else:
+                    removed.append(vector_id)
+        collection = self._field_collection(collection_name)
+        try:
+            if removed:
+                collection.delete(ids=removed)
+            if ids:
+                collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas)
+        except Exception as e:
+            raise Exception(f"Error upserting {collection_name} field embeddings: {str(e)}")
+    
+    @staticmethod
+    def chunk_vector_id(parent_id: Any, chunk_index: int) -> str:
+        return f"{parent_id}#{chunk_index}"
+    
+    def _derived_vectors(self, collection_name: str, parent_ids: List[Any]) -> List[Tuple[Any, List[str]]]:
+        """(collection, ids) of every field/chunk vector that may exist for these documents"""
+        derived = [(
+            self._field_collection(collection_name),
+            [self.field_vector_id(parent_id, field) for parent_id in parent_ids for field in EMBEDDING_FIELDS]
+        )]
+        if collection_name == "cv":
+            derived.append((
+                self.cv_chunk_collection,
+                [self.chunk_vector_id(parent_id, index) for parent_id in parent_ids for index in range(MAX_CHUNKS_PER_DOCUMENT)]
+            ))
+        return derived
+    
+    def delete_derived_embeddings(self, collection_name: str, parent_ids: List[Any], batch_size: int = 5000) -> None:
+        """Delete the field and chunk vectors of documents"""
+        for collection, ids in self._derived_vectors(collection_name, parent_ids):
+            for start in range(0, len(ids), batch_size):
+                collection.delete(ids=ids[start:start + batch_size])
+    
+    def upsert_cv_chunk_embeddings(self, items: List[Tuple[int, List[Tuple[str, np.ndarray]], Dict[str, Any]]]) -> None:
+        """Replace the chunk vectors of many CVs: items are (cv_id, [(chunk_text, embedding)], metadata)"""
+        if not items:
+            return
+        ids, embeddings, documents, metadatas, removed = [], [], [], [], []
+        for cv_id, chunks, metadata in items:
+            for index, (text, embedding) in enumerate(chunks):
+                ids.append(self.chunk_vector_id(cv_id, index))
+                embeddings.append(embedding.tolist())
+                documents.append(text)
+                metadatas.append({**(metadata or {}), "parent_id": int(cv_id), "chunk_index": index})
+            # CV ngắn đi sau khi parse lại: xóa các chunk thừa
+            removed.extend(self.chunk_vector_id(cv_id, index) for index in range(len(chunks), MAX_CHUNKS_PER_DOCUMENT))
+        try:
+            if removed:
+                self.cv_chunk_collection.delete(ids=removed)
+            if ids:
+                self.cv_chunk_collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        except Exception as e:
+            raise Exception(f"Error upserting CV chunk embeddings: {str(e)}")
+    
+    def search_cv_chunks(self, query_embedding: Any, n_results: int = 10, similarity_threshold: float = 0.6,
+                         aggregation: str = "max", top_n: int = 3,
+                         where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float, Dict[str, Any]]]:
+        """Chunk-level ANN search aggregated per CV
+        
+        Lấy tối đa min(n_results * CHUNK_CANDIDATE_FACTOR, CHUNK_MAX_CANDIDATES) chunk gần nhất rồi gộp theo CV:
+        aggregation="max" lấy chunk tốt nhất, "mean" lấy trung bình top_n chunk tốt nhất của CV đó.
+        Returns (cv_id, score, {"chunk_index", "chunk_text", "chunk_similarity"}) sorted by score.
+        """
+        if aggregation not in ("max", "mean"):
+            raise ValueError("aggregation must be one of: max, mean")
+        if top_n < 1:
+            raise ValueError("top_n must be at least 1")
+        results = self.cv_chunk_collection.query(
+            query_embeddings=[list(query_embedding)],
+            n_results=min(n_results * CHUNK_CANDIDATE_FACTOR, CHUNK_MAX_CANDIDATES),
+            include=["distances", "metadatas", "documents"],
+            where=where
+        )
+        
+        hits: Dict[int, List[Tuple[float, int, str]]] = {}
+        for distance, metadata, document in zip(results['distances'][0], results['metadatas'][0], results['documents'][0]):
+            similarity = 1 - (distance / 2)  # Approximate conversion
+            hits.setdefault(int(metadata["parent_id"]), []).append((similarity, metadata.get("chunk_index"), document))
+        
+        scored = []
+        for cv_id, chunk_hits in hits.items():
+            chunk_hits.sort(key=lambda hit: hit[0], reverse=True)
+            best_similarity, best_index, best_text = chunk_hits[0]
+            if aggregation == "max":
+                score = best_similarity
+            else:
+                score = sum(hit[0] for hit in chunk_hits[:top_n]) / len(chunk_hits[:top_n])
+            if score >= similarity_threshold:
+                scored.append((cv_id, score, {
+                    "chunk_index": best_index, "chunk_text": best_text, "chunk_similarity": best_similarity
+                }))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:n_results]
+    
+    def find_similar_cvs_for_jd_by_chunks(self, jd_id: int, n_results: int = 10, similarity_threshold: float = 0.7,
+                                          aggregation: str = "max", top_n: int = 3, filter_by_category: bool = True,
+                                          where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float, Dict[str, Any]]]:
+        """Chunk version of find_similar_cvs_for_jd; the JD's work_history field vector is preferred as query"""
+        stored = self.get_embeddings_with_metadata("jd", [jd_id])
+        if jd_id not in stored:
+            raise ValueError(f"JD {jd_id} embedding not found")
+        jd_embedding, jd_metadata = stored[jd_id]
+        field_embeddings, _ = self.get_field_embeddings("jd", jd_id)
+        query_embedding = field_embeddings.get("work_history") or jd_embedding
+        jd_category = jd_metadata.get('job_category')
+        where_filter = self.metadata_encoder.combine(
+            {"role_category": jd_category} if filter_by_category and jd_category else None, where
+        )
+        return self.search_cv_chunks(query_embedding, n_results, similarity_threshold, aggregation, top_n, where_filter)
+    
+    def get_field_embeddings(self, collection_name: str, parent_id: int) -> Tuple[Dict[str, List[float]], Dict[str, Any]]:
+        """Stored field vectors of one document and its metadata"""
+        result = self._field_collection(collection_name).get(
+            ids=[self.field_vector_id(parent_id, field) for field in EMBEDDING_FIELDS],
+            include=["embeddings", "metadatas"]
+        )
+        field_embeddings = {
+            metadata["field"]: embedding for embedding, metadata in zip(result['embeddings'], result['metadatas'])
+        }
+        return field_embeddings, (result['metadatas'][0] if result['metadatas'] else {})
+    
+    def search_by_fields(self, collection_name: str, query_fields: Dict[str, Any], weights: Dict[str, float],
+                         n_results: int = 10, similarity_threshold: float = 0.6,
+                         where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float, Dict[str, float]]]:
+        """Weighted multi-vector search: score = sum(w_f * cos(query_f, doc_f)) / sum(w_f)
+        
+        Ứng viên là hợp các ANN hit của từng field (n_results * FIELD_CANDIDATE_FACTOR mỗi field); sau đó
+        field vector của ứng viên được lấy về và chấm chính xác. Field mà document không có được tính 0.
+        Returns (parent_id, score, {field: similarity}) sorted by score.
+        """
+        weights = {field: weight for field, weight in weights.items() if weight > 0 and field in query_fields}
+        total_weight = sum(weights.values())
+        if not total_weight:
+            return []
+        collection = self._field_collection(collection_name)
+        
+        candidates = set()
+        for field in weights:
+            results = collection.query(
+                query_embeddings=[list(query_fields[field])],
+                n_results=n_results * FIELD_CANDIDATE_FACTOR,
+                include=["metadatas"],
+                where=self.metadata_encoder.combine({"field": field}, where)
+            )
+            candidates.update(int(metadata["parent_id"]) for metadata in results['metadatas'][0])
+        if not candidates:
+            return []
+        
+        parent_ids = sorted(candidates)
+        stored = collection.get(
+            ids=[self.field_vector_id(parent_id, field) for parent_id in parent_ids for field in weights],
+            include=["embeddings", "metadatas"]
+        )
+        vectors = {
+            (int(metadata["parent_id"]), metadata["field"]): embedding
+            for embedding, metadata in zip(stored['embeddings'], stored['metadatas'])
+        }
+        
+        scored = []
+        for parent_id in parent_ids:
+            field_scores = {
+                field: self._cosine(query_fields[field], vectors[(parent_id, field)])
+                if (parent_id, field) in vectors else 0.0
+                for field in weights
+            }
+            score = sum(weights[field] * field_scores[field] for field in weights) / total_weight
+            if score >= similarity_threshold:
+                scored.append((parent_id, score, field_scores))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:n_results]
+    
+    def find_similar_by_fields(self, source: str, item_id: int, weights: Dict[str, float], n_results: int = 10,
+                               similarity_threshold: float = 0.7, filter_by_category: bool = True,
+                               where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float, Dict[str, float]]]:
+        """Multi-vector version of find_similar_cvs_for_jd / find_similar_jds_for_cv (field ↔ cùng field)"""
+        target = "jd" if source == "cv" else "cv"
+        source_category_key = "role_category" if source == "cv" else "job_category"
+        target_category_key = "job_category" if source == "cv" else "role_category"
+        
+        field_embeddings, metadata = self.get_field_embeddings(source, item_id)
+        if not field_embeddings:
+            raise ValueError(f"{source.upper()} {item_id} field embeddings not found")
+        category = metadata.get(source_category_key) if filter_by_category else None
+        where_filter = self.metadata_encoder.combine({target_category_key: category} if category else None, where)
+        return self.search_by_fields(target, field_embeddings, weights, n_results, similarity_threshold, where_filter)
+    
+    def search_by_text_fields(self, collection_name: str, query_text: str, weights: Dict[str, float],
+                              n_results: int = 10, similarity_threshold: float = 0.6,
+                              where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float, Dict[str, float]]]:
+        """Embed the query once and score it against every weighted field"""
+        query_embedding = self.embedding_service.generate_embedding(query_text).tolist()
+        return self.search_by_fields(
+            collection_name, {field: query_embedding for field in weights}, weights,
+            n_results, similarity_threshold, where
+        )
+    
+    @staticmethod
+    def _cosine(a: Any, b: Any) -> float:
+        a = np.asarray(a, dtype=np.float32)
+        b = np.asarray(b, dtype=np.float32)
+        norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+        return float(a @ b / norm) if norm else 0.0
+    
     def find_similar_jds_for_cv(self, cv_id: int, n_results: int = 10, 
-                               similarity_threshold: float = 0.7, filter_by_category: bool = True) -> List[Tuple[int, float]]:
+                               similarity_threshold: float = 0.7, filter_by_category: bool = True,
+                               where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
         """Find similar JDs for a given CV"""
         try:
             # Get CV embedding and metadata
-            cv_result = self.cv_collection.get(ids=[str(cv_id)], include=["embeddings", "metadatas"])
-            if not cv_result['embeddings']:
+            stored = self.get_embeddings_with_metadata("cv", [cv_id])
+            if cv_id not in stored:
                 raise ValueError(f"CV {cv_id} embedding not found")
             
-            cv_embedding = cv_result['embeddings'][0]
-            cv_category = cv_result['metadatas'][0].get('role_category') if cv_result['metadatas'] else None
+            cv_embedding, cv_metadata = stored[cv_id]
+            cv_category = cv_metadata.get('role_category')
             
             # Prepare where filter for category matching
-            where_filter = None
+            where_filter = where
             if filter_by_category and cv_category:
-                where_filter = {"job_category": cv_category}
+                where_filter = self.metadata_encoder.combine({"job_category": cv_category}, where)
             
-            # Search for similar JDs
-            results = self.jd_collection.query(
-                query_embeddings=[cv_embedding],
-                n_results=n_results,
-                include=["distances"],
-                where=where_filter
-            )
-            
-            # Convert ChromaDB distances to similarity scores and filter by threshold
-            similar_jds = []
-            for jd_id, distance in zip(results['ids'][0], results['distances'][0]):
-                # ChromaDB uses L2 distance, convert to cosine similarity
-                similarity = 1 - (distance / 2)  # Approximate conversion
-                if similarity >= similarity_threshold:
-                    similar_jds.append((int(jd_id), similarity))
-            
-            return similar_jds
+            # Search for similar JDs (compact store hoặc ChromaDB, xem query_many)
+            return self.query_many("jd", [cv_embedding], n_results, similarity_threshold, where_filter)[0]
             
         except Exception as e:
             raise Exception(f"Error finding similar JDs: {str(e)}")
     
     def find_similar_cvs_for_jd(self, jd_id: int, n_results: int = 10,
-                               similarity_threshold: float = 0.7, filter_by_category: bool = True) -> List[Tuple[int, float]]:
-        """Find similar CVs for a given JD"""
+                               similarity_threshold: float = 0.7, filter_by_category: bool = True,
+                               where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        """Find similar CVs for a given JD; `where` holds facet filters pushed into the ANN query"""
         try:
             # Get JD embedding and metadata
-            jd_result = self.jd_collection.get(ids=[str(jd_id)], include=["embeddings", "metadatas"])
-            if not jd_result['embeddings']:
+            stored = self.get_embeddings_with_metadata("jd", [jd_id])
+            if jd_id not in stored:
                 raise ValueError(f"JD {jd_id} embedding not found")
             
-            jd_embedding = jd_result['embeddings'][0]
-            jd_category = jd_result['metadatas'][0].get('job_category') if jd_result['metadatas'] else None
+            jd_embedding, jd_metadata = stored[jd_id]
+            jd_category = jd_metadata.get('job_category')
             
             # Prepare where filter for category matching
-            where_filter = None
+            where_filter = where
             if filter_by_category and jd_category:
-                where_filter = {"role_category": jd_category}
+                where_filter = self.metadata_encoder.combine({"role_category": jd_category}, where)
             
-            # Search for similar CVs
-            results = self.cv_collection.query(
-                query_embeddings=[jd_embedding],
-                n_results=n_results,
-                include=["distances"],
-                where=where_filter
-            )
-            
-            # Convert distances to similarity scores and filter by threshold
-            similar_cvs = []
-            for cv_id, distance in zip(results['ids'][0], results['distances'][0]):
-                similarity = 1 - (distance / 2)  # Approximate conversion
-                if similarity >= similarity_threshold:
-                    similar_cvs.append((int(cv_id), similarity))
-            
-            return similar_cvs
+            # Search for similar CVs (compact store hoặc ChromaDB, xem query_many)
+            return self.query_many("cv", [jd_embedding], n_results, similarity_threshold, where_filter)[0]
             
         except Exception as e:
             raise Exception(f"Error finding similar CVs: {str(e)}")
@@ -120,88 +458,135 @@ class VectorService:
     def delete_cv_embedding(self, cv_id: int) -> None:
         """Delete CV embedding from ChromaDB"""
         try:
-            self.cv_collection.delete(ids=[str(cv_id)])
+            self._delete_main("cv", [cv_id])
+            self.delete_derived_embeddings("cv", [cv_id])
         except Exception as e:
             print(f"Warning: Could not delete CV embedding {cv_id}: {str(e)}")
     
     def delete_jd_embedding(self, jd_id: int) -> None:
         """Delete JD embedding from ChromaDB"""
         try:
-            self.jd_collection.delete(ids=[str(jd_id)])
+            self._delete_main("jd", [jd_id])
+            self.delete_derived_embeddings("jd", [jd_id])
         except Exception as e:
             print(f"Warning: Could not delete JD embedding {jd_id}: {str(e)}")
     
     def update_cv_embedding(self, cv_id: int, embedding: np.ndarray, metadata: Dict[str, Any] = None) -> None:
         """Update CV embedding in ChromaDB"""
         try:
-            self.cv_collection.upsert(
-                ids=[str(cv_id)],
-                embeddings=[embedding.tolist()],
-                metadatas=[metadata or {}]
-            )
+            self._upsert_main("cv", [cv_id], [embedding], [metadata or {}])
         except Exception as e:
             raise Exception(f"Error updating CV embedding: {str(e)}")
     
     def update_jd_embedding(self, jd_id: int, embedding: np.ndarray, metadata: Dict[str, Any] = None) -> None:
         """Update JD embedding in ChromaDB"""
         try:
-            self.jd_collection.upsert(
-                ids=[str(jd_id)],
-                embeddings=[embedding.tolist()],
-                metadatas=[metadata or {}]
-            )
+            self._upsert_main("jd", [jd_id], [embedding], [metadata or {}])
         except Exception as e:
             raise Exception(f"Error updating JD embedding: {str(e)}")
     
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get statistics about the collections"""
         return {
-            "cv_count": self.cv_collection.count(),
-            "jd_count": self.jd_collection.count(),
+            "cv_count": self._count_main("cv"),
+            "jd_count": self._count_main("jd"),
+            "cv_field_vector_count": self.cv_field_collection.count(),
+            "jd_field_vector_count": self.jd_field_collection.count(),
+            "cv_chunk_vector_count": self.cv_chunk_collection.count(),
             "collections": {
                 "cv_collection": self.cv_collection.name,
                 "jd_collection": self.jd_collection.name
-            }
+            },
+            "hnsw": {
+                "cv_collection": {k: v for k, v in (self.cv_collection.metadata or {}).items() if k.startswith("hnsw:")},
+                "jd_collection": {k: v for k, v in (self.jd_collection.metadata or {}).items() if k.startswith("hnsw:")}
+            },
+            "compact": {name: store.stats() for name, store in self.compact_stores.items()}
         }
     
+    def get_all_ids(self, collection_name: str, page_size: int = 10000) -> List[str]:
+        """Fetch all ids of a collection in pages without loading embeddings or metadata"""
+        store = self.compact_stores.get(collection_name)
+        if store is not None:
+            return [str(item_id) for item_id in store.ids()]
+        collection = self.cv_collection if collection_name == "cv" else self.jd_collection
+        return self.get_collection_ids(collection, page_size)
+    
+    def derived_collections(self, collection_name: str) -> Dict[str, Any]:
+        """Field (and for CVs chunk) collections of a document type, by kind"""
+        collections = {"fields": self._field_collection(collection_name)}
+        if collection_name == "cv":
+            collections["chunks"] = self.cv_chunk_collection
+        return collections
+    
+    @staticmethod
+    def derived_parent_id(vector_id: str) -> int:
+        """Parent document id of a field ("<id>:<field>") or chunk ("<id>#<n>") vector id"""
+        return int(re.split(r"[:#]", vector_id, 1)[0])
+    
+    @staticmethod
+    def get_collection_ids(collection, page_size: int = 10000) -> List[str]:
+        ids = []
+        offset = 0
+        while True:
+            page = collection.get(include=[], limit=page_size, offset=offset)
+            ids.extend(page['ids'])
+            if len(page['ids']) < page_size:
+                return ids
+            offset += page_size
+    
+    def ids_missing_metadata(self, collection_name: str, key: str, page_size: int = 10000) -> List[int]:
+        """Ids of vectors whose metadata lacks key (stored before the key was introduced)"""
+        store = self.compact_stores.get(collection_name)
+        if store is not None:
+            return store.ids_missing_metadata(key)
+        collection = self.cv_collection if collection_name == "cv" else self.jd_collection
+        ids = []
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids.extend(int(item_id) for item_id, metadata in zip(page['ids'], page['metadatas'])
+                       if key not in (metadata or {}))
+            if len(page['ids']) < page_size:
+                return ids
+            offset += page_size
+    
+    def delete_embeddings(self, collection_name: str, ids: List[str], batch_size: int = 5000) -> None:
+        """Delete many embeddings by id in batches"""
+        try:
+            for start in range(0, len(ids), batch_size):
+                self._delete_main(collection_name, ids[start:start + batch_size])
+            self.delete_derived_embeddings(collection_name, ids, batch_size)
+        except Exception as e:
+            raise Exception(f"Error deleting {collection_name} embeddings: {str(e)}")
+    
+    def clear_cv_embeddings(self) -> None:
+        """Clear all CV embeddings from ChromaDB"""
+        self.delete_embeddings("cv", self.get_all_ids("cv"))
+    
+    def clear_jd_embeddings(self) -> None:
+        """Clear all JD embeddings from ChromaDB"""
+        self.delete_embeddings("jd", self.get_all_ids("jd"))
+    
     def clear_all_embeddings(self) -> None:
         """Clear all embeddings from ChromaDB"""
         try:
-            # Delete all documents in collections
-            cv_all = self.cv_collection.get()
-            if cv_all['ids']:
-                self.cv_collection.delete(ids=cv_all['ids'])
-            
-            jd_all = self.jd_collection.get()
-            if jd_all['ids']:
-                self.jd_collection.delete(ids=jd_all['ids'])
+            # Delete all documents in collections (ids only, không tải embeddings)
+            self.clear_cv_embeddings()
+            self.clear_jd_embeddings()
                 
         except Exception as e:
             raise Exception(f"Error clearing embeddings: {str(e)}")
     
     def search_cvs_by_text(self, query_text: str, n_results: int = 10, 
-                          similarity_threshold: float = 0.6) -> List[Tuple[int, float]]:
+                          similarity_threshold: float = 0.6, where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
         """Search CVs using text query by generating embedding and finding similar CVs"""
         try:
             # Generate embedding for the query text
             query_embedding = self.embedding_service.generate_embedding(query_text)
             
             # Search for similar CVs using the query embedding
-            results = self.cv_collection.query(
-                query_embeddings=[query_embedding.tolist()],
-                n_results=n_results,
-                include=["distances"]
-            )
-            
-            # Convert distances to similarity scores and filter by threshold
-            similar_cvs = []
-            for cv_id, distance in zip(results['ids'][0], results['distances'][0]):
-                # ChromaDB uses L2 distance, convert to cosine similarity
-                similarity = 1 - (distance / 2)  # Approximate conversion
-                if similarity >= similarity_threshold:
-                    similar_cvs.append((int(cv_id), similarity))
-            
-            return similar_cvs
+            return self.query_many("cv", [query_embedding.tolist()], n_results, similarity_threshold, where)[0]
             
         except Exception as e:
             raise Exception(f"Error searching CVs by text: {str(e)}")
@@ -214,21 +599,195 @@ class VectorService:
             query_embedding = self.embedding_service.generate_embedding(query_text)
             
             # Search for similar JDs using the query embedding
-            results = self.jd_collection.query(
-                query_embeddings=[query_embedding.tolist()],
+            return self.query_many("jd", [query_embedding.tolist()], n_results, similarity_threshold)[0]
+            
+        except Exception as e:
+            raise Exception(f"Error searching JDs by text: {str(e)}")
+
+    def _to_similarities(self, ids: List[str], distances: List[float], similarity_threshold: float) -> List[Tuple[int, float]]:
+        """Convert ChromaDB distances to (id, similarity) pairs above the threshold"""
+        similar = []
+        for item_id, distance in zip(ids, distances):
+            similarity = 1 - (distance / 2)  # Approximate conversion
+            if similarity >= similarity_threshold:
+                similar.append((int(item_id), similarity))
+        return similar
+    
+    def query_many(self, collection_name: str, query_embeddings: List[List[float]], n_results: int = 10,
+                   similarity_threshold: float = 0.6, where: Optional[Dict[str, Any]] = None) -> List[List[Tuple[int, float]]]:
+        """Run many query vectors in a single call (compact store when enabled, otherwise ChromaDB)"""
+        if not query_embeddings:
+            return []
+        store = self.compact_stores.get(collection_name)
+        if store is not None:
+            # where được prefilter trong compact store, điểm là cosine chính xác sau khi rescore float32
+            return [
+                [(item_id, similarity) for item_id, similarity in hits if similarity >= similarity_threshold]
+                for hits in store.search(np.asarray(query_embeddings, dtype=np.float32), n_results, where)
+            ]
+        collection = self.cv_collection if collection_name == "cv" else self.jd_collection
+        results = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            include=["distances"],
+            where=where
+        )
+        return [
+            self._to_similarities(ids, distances, similarity_threshold)
+            for ids, distances in zip(results['ids'], results['distances'])
+        ]
+    
+    def _upsert_main(self, collection_name: str, ids: List[Any], embeddings: List[np.ndarray],
+                     metadatas: List[Dict[str, Any]]) -> None:
+        store = self.compact_stores.get(collection_name)
+        if store is not None:
+            store.upsert([int(item_id) for item_id in ids], embeddings, metadatas)
+            return
+        collection = self.cv_collection if collection_name == "cv" else self.jd_collection
+        collection.upsert(
+            ids=[str(item_id) for item_id in ids],
+            embeddings=[embedding.tolist() for embedding in embeddings],
+            metadatas=metadatas
+        )
+    
+    def _update_main_metadatas(self, collection_name: str, ids: List[Any], metadatas: List[Dict[str, Any]]) -> None:
+        store = self.compact_stores.get(collection_name)
+        if store is not None:
+            store.update_metadatas([int(item_id) for item_id in ids], metadatas)
+            return
+        collection = self.cv_collection if collection_name == "cv" else self.jd_collection
+        collection.update(ids=[str(item_id) for item_id in ids], metadatas=metadatas)
+    
+    def _delete_main(self, collection_name: str, ids: List[Any]) -> None:
+        store = self.compact_stores.get(collection_name)
+        if store is None:
+            collection = self.cv_collection if collection_name == "cv" else self.jd_collection
+            collection.delete(ids=[str(item_id) for item_id in ids])
+            return
+        # Id không phải số (vd. do reconcile tìm thấy) không thể có trong compact store
+        numeric_ids = []
+        for item_id in ids:
+            try:
+                numeric_ids.append(int(item_id))
+            except ValueError:
+                continue
+        store.delete(numeric_ids)
+    
+    def _count_main(self, collection_name: str) -> int:
+        store = self.compact_stores.get(collection_name)
+        if store is not None:
+            return store.count()
+        return (self.cv_collection if collection_name == "cv" else self.jd_collection).count()
+    
+    def migrate_to_compact_store(self, collection_name: str, page_size: int = 1000) -> int:
+        """Copy vectors + metadata of the ChromaDB collection into the compact store (run once after enabling it)
+        
+        Id đã có trong compact store được giữ nguyên (có thể mới hơn bản trong ChromaDB), nên chạy lại
+        nhiều lần là an toàn. Returns the number of vectors copied.
+        """
+        store = self.compact_stores.get(collection_name)
+        if store is None:
+            raise ValueError("Compact vector store is disabled (set COMPACT_VECTOR_STORE=1)")
+        collection = self.cv_collection if collection_name == "cv" else self.jd_collection
+        existing = set(store.ids())
+        offset = 0
+        total = 0
+        while True:
+            page = collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+            items = []
+            for item_id, embedding, metadata in zip(page['ids'], page['embeddings'], page['metadatas']):
+                try:
+                    numeric_id = int(item_id)
+                except ValueError:
+                    continue
+                if numeric_id not in existing:
+                    items.append((numeric_id, embedding, metadata or {}))
+            if items:
+                store.upsert([item[0] for item in items], [item[1] for item in items], [item[2] for item in items])
+            total += len(items)
+            if len(page['ids']) < page_size:
+                return total
+            offset += page_size
+    
+    def get_metadatas(self, collection_name: str, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Stored metadata of many ids (ids without a vector are absent)"""
+        store = self.compact_stores.get(collection_name)
+        if store is not None:
+            return {item_id: metadata for item_id, (_, metadata) in store.get(ids, include_vectors=False).items()}
+        collection = self.cv_collection if collection_name == "cv" else self.jd_collection
+        result = collection.get(ids=[str(item_id) for item_id in ids], include=["metadatas"])
+        return {int(item_id): metadata or {} for item_id, metadata in zip(result['ids'], result['metadatas'])}
+    
+    def get_embeddings_with_metadata(self, collection_name: str, ids: List[int]) -> Dict[int, Tuple[List[float], Dict[str, Any]]]:
+        """Fetch stored embeddings and metadata for many ids in one call"""
+        store = self.compact_stores.get(collection_name)
+        if store is not None:
+            return store.get(ids)
+        collection = self.cv_collection if collection_name == "cv" else self.jd_collection
+        result = collection.get(ids=[str(item_id) for item_id in ids], include=["embeddings", "metadatas"])
+        return {
+            int(item_id): (embedding, metadata or {})
+            for item_id, embedding, metadata in zip(result['ids'], result['embeddings'], result['metadatas'])
+        }
+    
+    def _find_similar_grouped(self, source: str, ids: List[int], n_results: int, similarity_threshold: float,
+                              filter_by_category: bool, where: Optional[Dict[str, Any]]) -> Dict[int, List[Tuple[int, float]]]:
+        """Query the opposite collection for many source ids, one query per category group"""
+        target = "jd" if source == "cv" else "cv"
+        source_category_key = "role_category" if source == "cv" else "job_category"
+        target_category_key = "job_category" if source == "cv" else "role_category"
+        
+        stored = self.get_embeddings_with_metadata(source, ids)
+        groups: Dict[Optional[str], List[int]] = {}
+        for item_id, (_, metadata) in stored.items():
+            category = metadata.get(source_category_key) if filter_by_category else None
+            groups.setdefault(category or None, []).append(item_id)
+        
+        results = {}
+        for category, group_ids in groups.items():
+            group_where = self.metadata_encoder.combine({target_category_key: category} if category else None, where)
+            group_results = self.query_many(
+                target,
+                [stored[item_id][0] for item_id in group_ids],
                 n_results=n_results,
-                include=["distances"]
+                similarity_threshold=similarity_threshold,
+                where=group_where
             )
-            
-            # Convert distances to similarity scores and filter by threshold
-            similar_jds = []
-            for jd_id, distance in zip(results['ids'][0], results['distances'][0]):
-                # ChromaDB uses L2 distance, convert to cosine similarity
-                similarity = 1 - (distance / 2)  # Approximate conversion
-                if similarity >= similarity_threshold:
-                    similar_jds.append((int(jd_id), similarity))
-            
-            return similar_jds
-            
+            results.update(zip(group_ids, group_results))
+        return results
+    
+    def find_similar_jds_for_cvs(self, cv_ids: List[int], n_results: int = 10, similarity_threshold: float = 0.7,
+                                 filter_by_category: bool = True) -> Dict[int, List[Tuple[int, float]]]:
+        """Batch version of find_similar_jds_for_cv; CVs without embedding are absent from the result"""
+        try:
+            return self._find_similar_grouped("cv", cv_ids, n_results, similarity_threshold, filter_by_category, None)
+        except Exception as e:
+            raise Exception(f"Error finding similar JDs: {str(e)}")
+    
+    def find_similar_cvs_for_jds(self, jd_ids: List[int], n_results: int = 10, similarity_threshold: float = 0.7,
+                                 filter_by_category: bool = True, where: Optional[Dict[str, Any]] = None) -> Dict[int, List[Tuple[int, float]]]:
+        """Batch version of find_similar_cvs_for_jd; JDs without embedding are absent from the result"""
+        try:
+            return self._find_similar_grouped("jd", jd_ids, n_results, similarity_threshold, filter_by_category, where)
+        except Exception as e:
+            raise Exception(f"Error finding similar CVs: {str(e)}")
+    
+    def search_cvs_by_texts(self, query_texts: List[str], n_results: int = 10, similarity_threshold: float = 0.6,
+                            where: Optional[Dict[str, Any]] = None) -> List[List[Tuple[int, float]]]:
+        """Embed all queries in one OpenAI call and search them in one ChromaDB query"""
+        try:
+            embeddings = self.embedding_service.generate_embeddings(query_texts)
+            return self.query_many("cv", [embedding.tolist() for embedding in embeddings],
+                                   n_results, similarity_threshold, where)
+        except Exception as e:
+            raise Exception(f"Error searching CVs by text: {str(e)}")
+    
+    def search_jds_by_texts(self, query_texts: List[str], n_results: int = 10,
+                            similarity_threshold: float = 0.6) -> List[List[Tuple[int, float]]]:
+        """Embed all queries in one OpenAI call and search them in one ChromaDB query"""
+        try:
+            embeddings = self.embedding_service.generate_embeddings(query_texts)
+            return self.query_many("jd", [embedding.tolist() for embedding in embeddings],
+                                   n_results, similarity_threshold)
         except Exception as e:
-            raise Exception(f"Error searching JDs by text: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error searching JDs by text: {str(e)}")
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import zipfile
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from .ingestion_service import is_supported_file, upload_path
+
+# Giới hạn chống zip bomb: số file trong archive, tổng dung lượng sau giải nén, dung lượng mỗi file
+ZIP_MAX_MEMBERS = int(os.getenv("ZIP_MAX_MEMBERS", "1000"))
+ZIP_MAX_UNCOMPRESSED_BYTES = int(os.getenv("ZIP_MAX_UNCOMPRESSED_MB", "1024")) * 1024 * 1024
+ZIP_MAX_MEMBER_BYTES = int(os.getenv("ZIP_MAX_MEMBER_MB", "50")) * 1024 * 1024
+ZIP_READ_CHUNK_BYTES = 1024 * 1024
+
+
+class ZipIngestSource:
+    """Feed the supported members of a ZIP archive into the ingestion pipeline one at a time
+
+    Archive không được giải nén hết ra đĩa: mỗi member chỉ được ghi vào uploads/<folder> khi
+    pipeline còn slot (pipeline lấy item tiếp theo sau khi có slot trống). Kích thước khai báo
+    trong central directory được kiểm tra trước, kích thước thật được đếm khi đọc nên header
+    giả mạo cũng không vượt được giới hạn.
+    """
+
+    def __init__(self, archive_path: str, folder: str = "cvs", max_members: int = ZIP_MAX_MEMBERS,
+                 max_uncompressed_bytes: int = ZIP_MAX_UNCOMPRESSED_BYTES,
+                 max_member_bytes: int = ZIP_MAX_MEMBER_BYTES):
+        self.archive_path = archive_path
+        self.folder = folder
+        self.max_members = max_members
+        self.max_uncompressed_bytes = max_uncompressed_bytes
+        self.max_member_bytes = max_member_bytes
+        self.members: List[Tuple[int, zipfile.ZipInfo]] = []
+        # Event của member bị bỏ qua / lỗi khi đọc, caller lấy ra bằng drain_events()
+        self.events: List[Dict[str, Any]] = []
+        self.total_entries = 0
+        self.bytes_read = 0
+
+    def plan(self) -> None:
+        """Read the central directory, enforce the limits and pick the members to ingest
+
+        Raises ValueError if the file is not a ZIP or the archive exceeds the limits.
+        """
+        try:
+            with zipfile.ZipFile(self.archive_path) as archive:
+                entries = [info for info in archive.infolist() if not info.is_dir()]
+        except zipfile.BadZipFile as e:
+            raise ValueError(f"Invalid ZIP archive: {str(e)}")
+
+        if len(entries) > self.max_members:
+            raise ValueError(f"ZIP archive has {len(entries)} files, limit is {self.max_members}")
+        declared = sum(info.file_size for info in entries)
+        if declared > self.max_uncompressed_bytes:
+            raise ValueError(
+                f"ZIP archive uncompressed size {declared} bytes exceeds limit of {self.max_uncompressed_bytes} bytes"
+            )
+
+        self.total_entries = len(entries)
+        for index, info in enumerate(entries):
+            filename = os.path.basename(info.filename)
+            # File rác của macOS (__MACOSX/, ._abc.pdf) và file ẩn
+            if info.filename.startswith("__MACOSX/") or filename.startswith("."):
+                self._skip(index, info.filename, "Hidden or metadata file")
+            elif not is_supported_file(filename):
+                self._skip(index, info.filename, "Only PDF and DOCX files are supported")
+            elif info.flag_bits & 0x1:
+                self._skip(index, info.filename, "Encrypted files are not supported")
+            elif info.file_size > self.max_member_bytes:
+                self._skip(index, info.filename, f"File exceeds limit of {self.max_member_bytes} bytes")
+            else:
+                self.members.append((index, info))
+
+    def _skip(self, index: int, filename: str, reason: str) -> None:
+        self.events.append({"index": index, "filename": filename, "stage": "skipped", "reason": reason})
+
+    def drain_events(self) -> List[Dict[str, Any]]:
+        events, self.events = self.events, []
+        return events
+
+    def _extract_member(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> Tuple[str, int]:
+        """Copy one member to uploads/<folder> in chunks, counting the real uncompressed bytes"""
+        file_path = upload_path(os.path.basename(info.filename), self.folder)
+        size = 0
+        try:
+            with archive.open(info) as source, open(file_path, "wb") as target:
+                while True:
+                    chunk = source.read(ZIP_READ_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_member_bytes:
+                        raise ValueError(f"File exceeds limit of {self.max_member_bytes} bytes")
+                    if self.bytes_read + size > self.max_uncompressed_bytes:
+                        raise OverflowError(
+                            f"ZIP archive uncompressed size exceeds limit of {self.max_uncompressed_bytes} bytes"
+                        )
+                    target.write(chunk)
+        except Exception:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        self.bytes_read += size
+        return file_path, size
+
+    async def items(self) -> AsyncIterator[Tuple[int, str, str]]:
+        """(index, file_path, filename) for IngestionService.stream; extraction runs in a worker thread"""
+        archive = await asyncio.to_thread(zipfile.ZipFile, self.archive_path)
+        try:
+            for position, (index, info) in enumerate(self.members):
+                try:
+                    file_path, size = await asyncio.to_thread(self._extract_member, archive, info)
+                except OverflowError as e:
+                    # Vượt tổng dung lượng: dừng đọc archive, các file còn lại bị đánh dấu failed
+                    for remaining_index, remaining in self.members[position:]:
+                        self.events.append({
+                            "index": remaining_index, "filename": remaining.filename, "stage": "failed", "error": str(e)
+                        })
+                    return
+                except Exception as e:
+                    self.events.append({
+                        "index": index, "filename": info.filename, "stage": "failed",
+                        "error": f"Error processing file: {str(e)}"
+                    })
+                    continue
+                self.events.append({"index": index, "filename": info.filename, "stage": "saved", "bytes": size})
+                yield index, file_path, info.filename
+        finally:
+            archive.close()
@@ -0,0 +1,116 @@
+import os
+import re
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+# Tên file upload/preview đã duy nhất (timestamp + uuid) nên nội dung không bao giờ đổi
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Single byte range -> (start, end) inclusive; None if unsatisfiable, ValueError if not a single range"""
+    match = _RANGE_RE.match(range_header.strip())
+    if not match:
+        # Nhiều range (multipart/byteranges) hoặc cú pháp khác: trả cả file
+        raise ValueError(range_header)
+    first, last = match.groups()
+    if not first and not last:
+        raise ValueError(range_header)
+    if not first:
+        # bytes=-500: 500 byte cuối
+        length = int(last)
+        if length == 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        # Range sai cú pháp (RFC 9110): bỏ qua header
+        raise ValueError(range_header)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
+
+class FileRangeResponse(Response):
+    """206 Partial Content for one byte range of a file, streamed in chunks"""
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, start: int, end: int, size: int, headers: dict, media_type: Optional[str] = None,
+                 method: str = "GET"):
+        super().__init__(status_code=206, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.send_body = method.upper() != "HEAD"
+        self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # File bị cắt ngắn trong lúc đọc: đóng response
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class UploadStaticFiles(StaticFiles):
+    """StaticFiles with immutable cache headers and single-range (HTTP 206) support
+
+    StaticFiles của Starlette 0.27 bỏ qua header Range, nên trình xem PDF phải tải cả file.
+    """
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        if not isinstance(response, FileResponse) or status_code != 200:
+            return response
+        response.headers["accept-ranges"] = "bytes"
+
+        request_headers = Headers(scope=scope)
+        range_header = request_headers.get("range")
+        if not range_header:
+            return response
+        # If-Range: chỉ trả range khi file phía client vẫn là bản hiện tại
+        if_range = request_headers.get("if-range")
+        if if_range and if_range not in (response.headers.get("etag"), response.headers.get("last-modified")):
+            return response
+
+        size = stat_result.st_size
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return response
+        if byte_range is None:
+            return Response(status_code=416, headers={
+                "content-range": f"bytes */{size}",
+                "accept-ranges": "bytes",
+                "cache-control": IMMUTABLE_CACHE_CONTROL
+            })
+
+        headers = {
+            key: response.headers[key]
+            for key in ("etag", "last-modified", "cache-control", "accept-ranges") if key in response.headers
+        }
+        return FileRangeResponse(
+            full_path, byte_range[0], byte_range[1], size, headers,
+            media_type=response.media_type, method=scope["method"]
+        )
@@ -0,0 +1,55 @@
+"""
+Chấm điểm toàn bộ CV trong một thư mục với toàn bộ JD trong thư mục khác, không qua HTTP API
+
+Ví dụ:
+    python batch_match.py --cvs ./cv_folder --jds ./jd_folder --output report.csv
+    python batch_match.py --cvs ./cv_folder --jds ./jd_folder --output report.parquet --no-llm
+
+Chạy lại cùng lệnh sẽ tiếp tục từ checkpoint (mặc định <output>.checkpoint/).
+Parse CV/JD và embedding vẫn cần OpenAI; --no-llm chỉ bỏ bước LLM chấm điểm từng cặp.
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from dotenv import load_dotenv
+
+from app.services.batch_matcher import BatchMatcher, MatchCheckpoint
+from app.services.ingestion_service import BULK_UPLOAD_CONCURRENCY, INGEST_BATCH_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline CV×JD score matrix to CSV or Parquet")
+    parser.add_argument("--cvs", required=True, help="Folder with CV files (PDF/DOCX, recursive)")
+    parser.add_argument("--jds", required=True, help="Folder with JD files (PDF/DOCX, recursive)")
+    parser.add_argument("--output", required=True, help="Output file (.csv or .parquet)")
+    parser.add_argument("--format", choices=("csv", "parquet"), default=None,
+                        help="Output format; defaults to the output file extension")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint folder (default: <output>.checkpoint)")
+    parser.add_argument("--workers", type=int, default=None, help="Text extraction processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=BULK_UPLOAD_CONCURRENCY,
+                        help="Parallel OpenAI parse/compare requests")
+    parser.add_argument("--no-llm", action="store_true",
+                        help="Skip the per-pair LLM comparison and score with rule score + embedding cosine "
+                             "only; parsing and embedding still call OpenAI (OPENAI_API_KEY required)")
+    args = parser.parse_args()
+
+    for folder in (args.cvs, args.jds):
+        if not os.path.isdir(folder):
+            parser.error(f"{folder} is not a directory")
+    output_format = args.format or ("parquet" if args.output.lower().endswith(".parquet") else "csv")
+
+    load_dotenv()
+    matcher = BatchMatcher(
+        MatchCheckpoint(args.checkpoint or f"{args.output}.checkpoint"),
+        use_llm=not args.no_llm,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency
+    )
+    report = asyncio.run(matcher.run(args.cvs, args.jds, args.output, output_format))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark so sánh token và latency: so sánh từng cặp CV-JD vs so sánh batch nhiều JD trong một prompt
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.compare_batch_benchmark --cv-id 1 --jd-ids 1 2 3 4 5
+"""
+import argparse
+import asyncio
+import time
+
+from dotenv import load_dotenv
+
+from app.database import SessionLocal, CV, JobDescription
+from app.services.openai_service import OpenAIService, BATCH_COMPARE_SIZE
+
+
+def _usage_delta(before: dict, after: dict) -> dict:
+    return {key: after[key] - before[key] for key in after}
+
+
+async def run_benchmark(cv_id: int, jd_ids: list, batch_size: int) -> dict:
+    db = SessionLocal()
+    try:
+        cv_record = db.query(CV).filter(CV.id == cv_id).first()
+        if not cv_record:
+            raise ValueError(f"CV with id {cv_id} not found")
+        jd_records = db.query(JobDescription).filter(JobDescription.id.in_(jd_ids)).all()
+        jds = [(jd.id, jd.raw_data) for jd in jd_records]
+        if not jds:
+            raise ValueError("No JDs found")
+    finally:
+        db.close()
+
+    service = OpenAIService()
+
+    # Per-pair: một request GPT-4 cho mỗi JD
+    before = dict(service.token_usage)
+    started = time.perf_counter()
+    for _, jd_data in jds:
+        await service.compare_cv_jd(cv_record.raw_data, jd_data)
+    per_pair = _usage_delta(before, service.token_usage)
+    per_pair["seconds"] = round(time.perf_counter() - started, 2)
+
+    # Batched: CV gửi một lần cho mỗi nhóm batch_size JD
+    before = dict(service.token_usage)
+    started = time.perf_counter()
+    await service.compare_cv_jd_batch(cv_record.raw_data, jds, batch_size=batch_size)
+    batched = _usage_delta(before, service.token_usage)
+    batched["seconds"] = round(time.perf_counter() - started, 2)
+
+    return {"jd_count": len(jds), "batch_size": batch_size, "per_pair": per_pair, "batched": batched}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-pair vs batched OpenAI CV-JD comparison")
+    parser.add_argument("--cv-id", type=int, required=True)
+    parser.add_argument("--jd-ids", type=int, nargs="+", required=True)
+    parser.add_argument("--batch-size", type=int, default=BATCH_COMPARE_SIZE)
+    args = parser.parse_args()
+
+    load_dotenv()
+    report = asyncio.run(run_benchmark(args.cv_id, args.jd_ids, args.batch_size))
+
+    print(f"JDs compared: {report['jd_count']} (batch size {report['batch_size']})")
+    print(f"{'mode':<10}{'requests':>10}{'prompt':>10}{'completion':>12}{'seconds':>10}")
+    for mode in ("per_pair", "batched"):
+        row = report[mode]
+        print(f"{mode:<10}{row['requests']:>10}{row['prompt_tokens']:>10}{row['completion_tokens']:>12}{row['seconds']:>10}")
+
+    if report["per_pair"]["prompt_tokens"]:
+        saved = 1 - report["batched"]["prompt_tokens"] / report["per_pair"]["prompt_tokens"]
+        print(f"Prompt tokens saved: {saved:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark recall/latency/memory của HNSW index (cùng thư viện hnswlib mà ChromaDB dùng)
+
+Sinh vector tổng hợp 1536 chiều (giống text-embedding-ada-002, dạng cụm và đã chuẩn hóa),
+build index với từng bộ tham số (M, ef_construction), đo recall@k so với brute-force chính xác,
+latency p50/p99 cho từng query đơn với mỗi ef_search và kích thước index.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.hnsw_benchmark --sizes 10000 100000 500000 --m 16 32 --ef-construction 100 200 --ef-search 10 50 100
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import hnswlib
+
+
+def synthetic_embeddings(count: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Clustered, L2-normalized vectors (random Gaussian data is unrealistically hard for ANN)"""
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = np.empty((count, dim), dtype=np.float32)
+    chunk = 50000
+    for start in range(0, count, chunk):
+        end = min(start + chunk, count)
+        labels = rng.integers(0, clusters, size=end - start)
+        vectors[start:end] = centers[labels] + 0.5 * rng.standard_normal((end - start, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def exact_top_k(data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Brute-force ground truth; vectors are normalized so L2 order == inner-product order"""
+    truth = np.empty((len(queries), k), dtype=np.int64)
+    for start in range(0, len(queries), 100):
+        scores = queries[start:start + 100] @ data.T
+        top = np.argpartition(-scores, k, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        truth[start:start + 100] = np.take_along_axis(top, order, axis=1)
+    return truth
+
+
+def index_size_bytes(index: hnswlib.Index) -> int:
+    """Size of the serialized index (vectors + graph links), close to its in-memory footprint"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "index.bin")
+        index.save_index(path)
+        return os.path.getsize(path)
+
+
+def run(sizes, dim, m_values, ef_construction_values, ef_search_values, k, num_queries, clusters, threads, seed):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for size in sizes:
+        data = synthetic_embeddings(size, dim, clusters, rng)
+        queries = synthetic_embeddings(num_queries, dim, clusters, rng)
+        started = time.perf_counter()
+        truth = exact_top_k(data, queries, k)
+        brute_force_ms = (time.perf_counter() - started) * 1000 / num_queries
+
+        for m in m_values:
+            for ef_construction in ef_construction_values:
+                # Chroma mặc định dùng space "l2"
+                index = hnswlib.Index(space="l2", dim=dim)
+                index.init_index(max_elements=size, ef_construction=ef_construction, M=m)
+                index.set_num_threads(threads)
+                started = time.perf_counter()
+                index.add_items(data, np.arange(size))
+                build_seconds = time.perf_counter() - started
+                memory_mb = index_size_bytes(index) / (1024 * 1024)
+
+                # Query từng vector một như API thật
+                index.set_num_threads(1)
+                for ef_search in ef_search_values:
+                    index.set_ef(max(ef_search, k))
+                    latencies = []
+                    hits = 0
+                    for query, expected in zip(queries, truth):
+                        started = time.perf_counter()
+                        labels, _ = index.knn_query(query, k=k)
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        hits += len(set(labels[0].tolist()) & set(expected.tolist()))
+                    rows.append({
+                        "size": size, "M": m, "ef_construction": ef_construction, "ef_search": ef_search,
+                        "recall": hits / (k * num_queries),
+                        "p50_ms": float(np.percentile(latencies, 50)),
+                        "p99_ms": float(np.percentile(latencies, 99)),
+                        "brute_force_ms": brute_force_ms,
+                        "build_seconds": build_seconds,
+                        "memory_mb": memory_mb
+                    })
+                    print_row(rows[-1], k)
+                index.set_num_threads(threads)
+                del index
+    return rows
+
+
+def print_header(k: int):
+    print(f"{'size':>8}{'M':>5}{'ef_c':>6}{'ef_s':>6}{f'recall@{k}':>11}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'exact ms':>10}{'build s':>9}{'index MB':>10}")
+
+
+def print_row(row: dict, k: int):
+    print(f"{row['size']:>8}{row['M']:>5}{row['ef_construction']:>6}{row['ef_search']:>6}{row['recall']:>11.4f}"
+          f"{row['p50_ms']:>9.3f}{row['p99_ms']:>9.3f}{row['brute_force_ms']:>10.3f}"
+          f"{row['build_seconds']:>9.1f}{row['memory_mb']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HNSW recall/latency benchmark for CHROMA_HNSW_* settings")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--m", type=int, nargs="+", default=[16])
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[100])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print_header(args.k)
+    run(args.sizes, args.dim, args.m, args.ef_construction, args.ef_search,
+        args.k, args.queries, args.clusters, args.threads, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark int8 compact vector store (app/services/compact_vector_store.py) so với float32
+
+Đo recall@k của shortlist int8 (không rescore) và sau khi rescore float32 trên shortlist
+(k * rescore factor ứng viên), latency p50/p99 mỗi query và số byte mỗi vector: phần int8 được quét
+mỗi query và phần float32 chỉ đọc từ đĩa khi rescore.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.quantization_benchmark --sizes 10000 100000 --rescore-factor 2 4 8
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.compact_vector_store import CompactVectorStore
+from benchmarks.hnsw_benchmark import synthetic_embeddings, exact_top_k
+
+
+def recall(found, expected) -> int:
+    return len(set(found) & set(expected.tolist()))
+
+
+def run(sizes, dim, k, rescore_factors, num_queries, clusters, seed):
+    rng = np.random.default_rng(seed)
+    print(f"{'size':>8}{'factor':>8}{f'int8 recall@{k}':>17}{f'rescored recall@{k}':>21}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'scan B/vec':>12}{'f32 B/vec':>11}{'ratio':>7}")
+    for size in sizes:
+        data = synthetic_embeddings(size, dim, clusters, rng)
+        queries = synthetic_embeddings(num_queries, dim, clusters, rng)
+        truth = exact_top_k(data, queries, k)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = CompactVectorStore(tmp_dir, "bench")
+            for start in range(0, size, 10000):
+                store.upsert(list(range(start, min(start + 10000, size))), data[start:start + 10000])
+            # Số byte mỗi vector (không tính phần capacity còn trống của file .npy)
+            stats = store.stats()
+            bytes_per_vector = stats["scanned_bytes_per_vector"]
+            float32_bytes_per_vector = stats["rescore_bytes_per_vector"]
+
+            for factor in rescore_factors:
+                approx_hits = 0
+                rescored_hits = 0
+                latencies = []
+                for query, expected in zip(queries, truth):
+                    started = time.perf_counter()
+                    rescored = store.search(query, k, rescore_factor=factor)[0]
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    approx = store.approximate_search(query, k)[0]
+                    approx_hits += recall([item_id for item_id, _ in approx], expected)
+                    rescored_hits += recall([item_id for item_id, _ in rescored], expected)
+
+                print(f"{size:>8}{factor:>8}{approx_hits / (k * num_queries):>17.4f}"
+                      f"{rescored_hits / (k * num_queries):>21.4f}"
+                      f"{np.percentile(latencies, 50):>9.2f}{np.percentile(latencies, 99):>9.2f}"
+                      f"{bytes_per_vector:>12}{float32_bytes_per_vector:>11}"
+                      f"{float32_bytes_per_vector / bytes_per_vector:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="int8 compact vector store recall/latency/size benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--clusters", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    run(args.sizes, args.dim, args.k, args.rescore_factor, args.queries, args.clusters, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark serialize response list CV: Pydantic model từng row + JSONResponse so với dict + ORJSONResponse
+
+Đo thời gian serialize (best of N) và số byte trên đường truyền khi không nén, GZip và Brotli
+(nếu đã cài brotli) cho listing 1k/10k row giống GET /cvs.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.serialization_benchmark --sizes 1000 10000
+"""
+import argparse
+import gzip
+import random
+import time
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from app.middleware import GZIP_COMPRESS_LEVEL, BROTLI_QUALITY
+from app.models.schemas import CVResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SKILLS = ["python", "react", "typescript", "node.js", "aws", "docker", "kubernetes", "java", "go", "postgresql",
+          "mongodb", "redis", "vue", "angular", "c#", ".net", "spring", "django", "fastapi", "terraform"]
+ROLES = ["Backend Developer", "Frontend Developer", "Fullstack Developer", "DevOps Engineer", "QA Engineer"]
+
+
+def synthetic_rows(count: int, rng: random.Random) -> list:
+    """Rows shaped like GET /cvs items"""
+    created = datetime(2024, 1, 1)
+    return [
+        {
+            "id": index,
+            "filename": f"cv_{index}.pdf",
+            "file_url": f"/uploads/cvs/20240101_000000_{index:08x}_cv_{index}.pdf",
+            "name": f"Candidate {index}",
+            "email": f"candidate{index}@example.com",
+            "phone": f"+84 9{rng.randint(10000000, 99999999)}",
+            "role": rng.choice(ROLES),
+            "experience_years": rng.randint(0, 15),
+            "birth_year": rng.randint(1975, 2002),
+            "languages": rng.sample(["English", "Japanese", "Vietnamese", "Korean"], 2),
+            "project_scope": rng.sample(["outsource", "product", "AI", "blockchain"], 2),
+            "customer": rng.sample(["JP", "VN", "USA", "EU"], 2),
+            "location": rng.choice(["Hà Nội", "Hồ Chí Minh", "Đà Nẵng"]),
+            "skills": rng.sample(SKILLS, 8),
+            "education": ["Đại học Bách Khoa Hà Nội - Kỹ sư Công nghệ thông tin"],
+            "work_experience": [
+                f"{rng.choice(ROLES)} tại Company {rng.randint(1, 500)} ({2015 + j}-{2016 + j}): "
+                "phát triển và vận hành hệ thống, review code, hướng dẫn thành viên mới"
+                for j in range(3)
+            ],
+            "certifications": ["AWS Certified Solutions Architect - Associate"],
+            "created_at": created + timedelta(minutes=index),
+            "status": "new"
+        }
+        for index in range(count)
+    ]
+
+
+def best_of(repeat: int, func):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(sizes, repeat, seed):
+    rng = random.Random(seed)
+    adapter = TypeAdapter(list[CVResponse])
+
+    def pydantic_body(rows):
+        # Như endpoint cũ: dựng CVResponse từng row, FastAPI validate theo response_model rồi JSONResponse
+        models = [CVResponse(**row) for row in rows]
+        return JSONResponse(adapter.dump_python(adapter.validate_python(models), mode="json")).body
+
+    def orjson_body(rows):
+        return ORJSONResponse(rows).body
+
+    header = f"{'rows':>7}{'method':>10}{'serialize ms':>14}{'raw KB':>10}{'gzip KB':>10}{'gzip ms':>9}"
+    if brotli:
+        header += f"{'br KB':>9}{'br ms':>8}"
+    print(header)
+    for size in sizes:
+        rows = synthetic_rows(size, rng)
+        for method, render in (("pydantic", pydantic_body), ("orjson", orjson_body)):
+            serialize_ms, body = best_of(repeat, lambda: render(rows))
+            gzip_ms, gzipped = best_of(repeat, lambda: gzip.compress(body, compresslevel=GZIP_COMPRESS_LEVEL))
+            line = (f"{size:>7}{method:>10}{serialize_ms:>14.1f}{len(body) / 1024:>10.1f}"
+                    f"{len(gzipped) / 1024:>10.1f}{gzip_ms:>9.1f}")
+            if brotli:
+                br_ms, compressed = best_of(repeat, lambda: brotli.compress(body, quality=BROTLI_QUALITY))
+                line += f"{len(compressed) / 1024:>9.1f}{br_ms:>8.1f}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pydantic/JSONResponse vs dict/ORJSONResponse list serialization")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    run(args.sizes, args.repeat, args.seed)
+
+
+if __name__ == "__main__":
+    main()
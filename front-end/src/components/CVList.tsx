@@ -8,7 +8,7 @@ import {
   compareCvJdWithAI,
   AICompareResponse,
 } from '../services/api';
-import FileViewerSimple from './FileViewerSimple';
+import FilePreview from './FilePreview';
 import './CVListVertical.css';
 
 const CVList: React.FC = () => {
@@ -149,9 +149,13 @@ const CVList: React.FC = () => {
                 {cv.file_url && (
                   <div className="detail-row file-preview-container">
                     <strong>Xem trước:</strong>
-                    <div className="file-preview" style={{ height: '300px', marginTop: '10px' }}>
-                      <FileViewerSimple fileUrl={cv.file_url} fileName={cv.filename} />
-                    </div>
+                    <FilePreview
+                      fileUrl={cv.file_url}
+                      fileName={cv.filename}
+                      thumbnailUrl={cv.thumbnail_url}
+                      previewUrl={cv.preview_url}
+                      height="300px"
+                    />
                   </div>
                 )}
 
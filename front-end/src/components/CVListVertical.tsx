@@ -11,7 +11,7 @@ import {
   searchCVs,
   CVSearchResult,
 } from '../services/api';
-import FileViewerSimple from './FileViewerSimple';
+import FilePreview from './FilePreview';
 import './CVListVertical.css';
 
 interface CVDetailModalProps {
@@ -115,9 +115,12 @@ const CVDetailModal: React.FC<CVDetailModalProps> = ({ cv, isOpen, onClose, onAp
               {cv.file_url && (
                 <div className="detail-item file-preview-container">
                   <strong>Xem trước:</strong>
-                  <div className="file-preview">
-                    <FileViewerSimple fileUrl={cv.file_url} fileName={cv.filename} />
-                  </div>
+                  <FilePreview
+                    fileUrl={cv.file_url}
+                    fileName={cv.filename}
+                    thumbnailUrl={cv.thumbnail_url}
+                    previewUrl={cv.preview_url}
+                  />
                 </div>
               )}
               <div className="detail-item">
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { getCVs, CVResponse, API_BASE_URL, EmbeddingMatchJD, compareCvJdWithAI, AICompareResponse, findJDsForCV } from '../services/api';
-import FileViewerSimple from './FileViewerSimple';
+import FilePreview from './FilePreview';
 import './CVListVertical.css';
 
 interface CVDetailModalProps {
@@ -95,9 +95,12 @@ const CVDetailModal: React.FC<CVDetailModalProps> = ({ cv, isOpen, onClose }) =>
               {cv.file_url && (
                 <div className="detail-item file-preview-container">
                   <strong>Xem trước:</strong>
-                  <div className="file-preview">
-                    <FileViewerSimple fileUrl={cv.file_url} fileName={cv.filename} />
-                  </div>
+                  <FilePreview
+                    fileUrl={cv.file_url}
+                    fileName={cv.filename}
+                    thumbnailUrl={cv.thumbnail_url}
+                    previewUrl={cv.preview_url}
+                  />
                 </div>
               )}
               <div className="detail-item">
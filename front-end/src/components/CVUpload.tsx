@@ -1,5 +1,16 @@
 import React, { useState } from 'react';
-import { uploadCV, bulkUploadCVs, BulkUploadResponse, BulkUploadResult } from '../services/api';
+import { uploadCV, bulkUploadCVsStream, BulkUploadResponse, BulkUploadResult, UploadProgressEvent } from '../services/api';
+
+const STAGE_LABELS: Record<string, string> = {
+  saved: 'Saved',
+  extracted: 'Text extracted',
+  parsed: 'Parsed',
+  stored: 'Stored',
+  embedded: 'Embedded',
+  completed: '✓ Done',
+  duplicate: '✓ Duplicate',
+  failed: '✗ Failed',
+};
 
 const CVUpload: React.FC = () => {
   const [selectedFiles, setSelectedFiles] = useState<File[]>([]);
@@ -7,6 +18,7 @@ const CVUpload: React.FC = () => {
   const [uploadResult, setUploadResult] = useState<BulkUploadResponse | null>(null);
   const [error, setError] = useState<string>('');
   const [uploadMode, setUploadMode] = useState<'single' | 'multiple'>('single');
+  const [progress, setProgress] = useState<Record<number, UploadProgressEvent>>({});
 
   const handleFileChange = (event: React.ChangeEvent<HTMLInputElement>) => {
     const files = event.target.files;
@@ -59,8 +71,30 @@ const CVUpload: React.FC = () => {
           }]
         };
       } else {
-        // Bulk upload
-        result = await bulkUploadCVs(selectedFiles);
+        // Bulk upload: stream per-file progress, files finish in any order
+        const terminal: Record<number, UploadProgressEvent> = {};
+        setProgress({});
+        await bulkUploadCVsStream(selectedFiles, (event) => {
+          if (event.index === undefined) return;
+          const index = event.index;
+          setProgress((previous) => ({ ...previous, [index]: event }));
+          if (['completed', 'duplicate', 'failed'].includes(event.stage)) {
+            terminal[index] = event;
+          }
+        });
+        const results: BulkUploadResult[] = selectedFiles.map((file, index) => ({
+          filename: file.name,
+          success: !!terminal[index] && terminal[index].stage !== 'failed',
+          result: terminal[index]?.result,
+          error: terminal[index] ? terminal[index].error : 'No result received',
+        }));
+        const successful = results.filter((item) => item.success).length;
+        result = {
+          total_files: selectedFiles.length,
+          successful_uploads: successful,
+          failed_uploads: selectedFiles.length - successful,
+          results,
+        };
       }
       
       setUploadResult(result);
@@ -69,9 +103,10 @@ const CVUpload: React.FC = () => {
       const fileInput = document.getElementById('cv-file-input') as HTMLInputElement;
       if (fileInput) fileInput.value = '';
     } catch (err: any) {
-      setError(err.response?.data?.detail || 'Upload failed. Please try again.');
+      setError(err.response?.data?.detail || err.message || 'Upload failed. Please try again.');
     } finally {
       setUploading(false);
+      setProgress({});
     }
   };
 
@@ -148,6 +183,20 @@ const CVUpload: React.FC = () => {
         </button>
       </div>
 
+      {uploading && Object.keys(progress).length > 0 && (
+        <div className="selected-files">
+          <h4>Progress:</h4>
+          <ul>
+            {selectedFiles.map((file, index) => (
+              <li key={index} className="file-item">
+                {file.name}: {progress[index] ? STAGE_LABELS[progress[index].stage] || progress[index].stage : 'Waiting'}
+                {progress[index]?.total_ms !== undefined && ` (${(progress[index].total_ms! / 1000).toFixed(1)}s)`}
+              </li>
+            ))}
+          </ul>
+        </div>
+      )}
+
       {error && (
         <div className="error-message">
           {error}
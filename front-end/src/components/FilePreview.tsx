@@ -0,0 +1,65 @@
+import React, { useEffect, useState } from 'react';
+import { API_BASE_URL } from '../services/api';
+import FileViewerSimple from './FileViewerSimple';
+
+interface FilePreviewProps {
+  fileUrl: string;
+  fileName: string;
+  thumbnailUrl?: string;
+  previewUrl?: string;
+  height?: string;
+}
+
+const toFullUrl = (url: string) => (url.startsWith('http') ? url : `${API_BASE_URL}${url}`);
+
+// Thẻ CV chỉ tải ảnh trang 1 hoặc text xem trước (vài KB); file đầy đủ chỉ được tải khi người dùng mở
+const FilePreview: React.FC<FilePreviewProps> = ({ fileUrl, fileName, thumbnailUrl, previewUrl, height }) => {
+  const [showFull, setShowFull] = useState(false);
+  const [previewText, setPreviewText] = useState<string>('');
+
+  useEffect(() => {
+    if (thumbnailUrl || !previewUrl) {
+      return;
+    }
+    let cancelled = false;
+    fetch(toFullUrl(previewUrl))
+      .then((response) => (response.ok ? response.text() : ''))
+      .then((text) => {
+        if (!cancelled) setPreviewText(text);
+      })
+      .catch(() => {
+        if (!cancelled) setPreviewText('');
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [thumbnailUrl, previewUrl]);
+
+  if (showFull) {
+    return (
+      <div>
+        <button className="btn btn-secondary btn-sm" onClick={() => setShowFull(false)}>
+          Thu gọn
+        </button>
+        <div className="file-preview" style={height ? { height } : undefined}>
+          <FileViewerSimple fileUrl={fileUrl} fileName={fileName} />
+        </div>
+      </div>
+    );
+  }
+
+  return (
+    <div className="file-preview-summary">
+      {thumbnailUrl ? (
+        <img className="file-thumbnail" src={toFullUrl(thumbnailUrl)} alt={fileName} loading="lazy" />
+      ) : previewText ? (
+        <pre className="file-text-preview">{previewText}</pre>
+      ) : null}
+      <button className="btn btn-secondary btn-sm" onClick={() => setShowFull(true)}>
+        Xem file đầy đủ
+      </button>
+    </div>
+  );
+};
+
+export default FilePreview;
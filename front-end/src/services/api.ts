@@ -14,6 +14,8 @@ export interface CVResponse {
   id: number;
   filename: string;
   file_url?: string;
+  thumbnail_url?: string;
+  preview_url?: string;
   name?: string;
   email?: string;
   phone?: string;
@@ -36,6 +38,8 @@ export interface JDResponse {
   id: number;
   filename: string;
   file_url?: string;
+  thumbnail_url?: string;
+  preview_url?: string;
   job_title: string;
   company: string;
   required_skills: string[];
@@ -152,6 +156,63 @@ export const bulkUploadCVs = async (files: File[]): Promise<BulkUploadResponse>
   return response.data;
 };
 
+export type UploadStage =
+  | 'saved' | 'extracted' | 'parsed' | 'stored' | 'embedded'
+  | 'completed' | 'duplicate' | 'failed' | 'summary';
+
+export interface UploadProgressEvent {
+  index?: number;
+  filename?: string;
+  stage: UploadStage;
+  elapsed_ms?: number;
+  total_ms?: number;
+  result?: FileUploadResponse;
+  error?: string;
+  total_files?: number;
+  successful_uploads?: number;
+  failed_uploads?: number;
+}
+
+// NDJSON progress stream: one event per line, in completion order (match files by `index`)
+export const bulkUploadCVsStream = async (
+  files: File[],
+  onEvent: (event: UploadProgressEvent) => void
+): Promise<void> => {
+  const formData = new FormData();
+  files.forEach((file) => {
+    formData.append('files', file);
+  });
+
+  const response = await fetch(`${API_BASE_URL}/upload/cvs/bulk/stream`, {
+    method: 'POST',
+    body: formData,
+  });
+  if (!response.ok || !response.body) {
+    let detail = `Upload failed (${response.status})`;
+    try {
+      detail = (await response.json()).detail || detail;
+    } catch {
+      // keep default message
+    }
+    throw new Error(detail);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop() || '';
+    lines.filter((line) => line.trim()).forEach((line) => onEvent(JSON.parse(line)));
+  }
+  if (buffer.trim()) {
+    onEvent(JSON.parse(buffer));
+  }
+};
+
 export const uploadJD = async (file: File): Promise<FileUploadResponse> => {
   const formData = new FormData();
   formData.append('file', file);
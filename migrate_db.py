@@ -28,6 +28,40 @@ def migrate_database():
         if 'status' not in columns:
             print("Thêm cột status vào bảng cvs...")
             cursor.execute("ALTER TABLE cvs ADD COLUMN status TEXT DEFAULT 'new'")
+        if 'embedding_text_hash' not in columns:
+            print("Thêm cột embedding_text_hash vào bảng cvs...")
+            cursor.execute("ALTER TABLE cvs ADD COLUMN embedding_text_hash TEXT")
+        if 'embedding_model' not in columns:
+            print("Thêm cột embedding_model vào bảng cvs...")
+            cursor.execute("ALTER TABLE cvs ADD COLUMN embedding_model TEXT")
+        if 'minhash_signature' not in columns:
+            print("Thêm cột minhash_signature vào bảng cvs...")
+            cursor.execute("ALTER TABLE cvs ADD COLUMN minhash_signature BLOB")
+        if 'duplicate_of' not in columns:
+            print("Thêm cột duplicate_of vào bảng cvs...")
+            cursor.execute("ALTER TABLE cvs ADD COLUMN duplicate_of INTEGER")
+            cursor.execute("CREATE INDEX IF NOT EXISTS ix_cvs_duplicate_of ON cvs (duplicate_of)")
+        if 'extracted_text' not in columns:
+            print("Thêm cột extracted_text vào bảng cvs...")
+            cursor.execute("ALTER TABLE cvs ADD COLUMN extracted_text TEXT")
+        if 'parser_version' not in columns:
+            print("Thêm cột parser_version vào bảng cvs...")
+            cursor.execute("ALTER TABLE cvs ADD COLUMN parser_version TEXT")
+        if 'has_field_embeddings' not in columns:
+            # Record cũ chưa có vector field: /embeddings/reindex sẽ tạo
+            print("Thêm cột has_field_embeddings vào bảng cvs...")
+            cursor.execute("ALTER TABLE cvs ADD COLUMN has_field_embeddings INTEGER DEFAULT 0")
+        if 'has_chunk_embeddings' not in columns:
+            print("Thêm cột has_chunk_embeddings vào bảng cvs...")
+            cursor.execute("ALTER TABLE cvs ADD COLUMN has_chunk_embeddings INTEGER DEFAULT 0")
+        if 'thumbnail_path' not in columns:
+            print("Thêm cột thumbnail_path vào bảng cvs...")
+            cursor.execute("ALTER TABLE cvs ADD COLUMN thumbnail_path TEXT")
+        if 'preview_path' not in columns:
+            print("Thêm cột preview_path vào bảng cvs...")
+            cursor.execute("ALTER TABLE cvs ADD COLUMN preview_path TEXT")
+        # Bộ lọc /cvs/filter và /cvs?status= lọc theo status
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_cvs_status ON cvs (status)")
         
         cursor.execute("PRAGMA table_info(job_descriptions)")
         columns = [column[1] for column in cursor.fetchall()]
@@ -38,6 +72,37 @@ def migrate_database():
         if 'file_path' not in columns:
             print("Thêm cột file_path vào bảng job_descriptions...")
             cursor.execute("ALTER TABLE job_descriptions ADD COLUMN file_path TEXT")
+        if 'embedding_text_hash' not in columns:
+            print("Thêm cột embedding_text_hash vào bảng job_descriptions...")
+            cursor.execute("ALTER TABLE job_descriptions ADD COLUMN embedding_text_hash TEXT")
+        if 'embedding_model' not in columns:
+            print("Thêm cột embedding_model vào bảng job_descriptions...")
+            cursor.execute("ALTER TABLE job_descriptions ADD COLUMN embedding_model TEXT")
+        if 'extracted_text' not in columns:
+            print("Thêm cột extracted_text vào bảng job_descriptions...")
+            cursor.execute("ALTER TABLE job_descriptions ADD COLUMN extracted_text TEXT")
+        if 'parser_version' not in columns:
+            print("Thêm cột parser_version vào bảng job_descriptions...")
+            cursor.execute("ALTER TABLE job_descriptions ADD COLUMN parser_version TEXT")
+        if 'has_field_embeddings' not in columns:
+            print("Thêm cột has_field_embeddings vào bảng job_descriptions...")
+            cursor.execute("ALTER TABLE job_descriptions ADD COLUMN has_field_embeddings INTEGER DEFAULT 0")
+        if 'thumbnail_path' not in columns:
+            print("Thêm cột thumbnail_path vào bảng job_descriptions...")
+            cursor.execute("ALTER TABLE job_descriptions ADD COLUMN thumbnail_path TEXT")
+        if 'preview_path' not in columns:
+            print("Thêm cột preview_path vào bảng job_descriptions...")
+            cursor.execute("ALTER TABLE job_descriptions ADD COLUMN preview_path TEXT")
+        
+        cursor.execute("PRAGMA table_info(comparison_history)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if columns and 'model_tier' not in columns:
+            print("Thêm cột model_tier vào bảng comparison_history...")
+            cursor.execute("ALTER TABLE comparison_history ADD COLUMN model_tier TEXT")
+        if columns and 'model' not in columns:
+            print("Thêm cột model vào bảng comparison_history...")
+            cursor.execute("ALTER TABLE comparison_history ADD COLUMN model TEXT")
         
         conn.commit()
         print("Migration hoàn thành!")
@@ -0,0 +1,27 @@
+"""
+Script tạo các bảng cv_skills, cv_languages, jd_skills và điền dữ liệu từ cột JSON skills/languages hiện có
+
+Chạy lại an toàn: dữ liệu cũ trong các bảng được xóa và dựng lại từ đầu.
+"""
+import os
+
+from app.database import create_tables
+from app.services.skill_index import SkillIndex
+
+db_path = "cv_match.db"
+
+def migrate_skill_tables():
+    if not os.path.exists(db_path):
+        print("Database không tồn tại, sẽ được tạo mới khi chạy app")
+        return
+    
+    # create_all chỉ tạo các bảng/index còn thiếu
+    create_tables()
+    try:
+        counts = SkillIndex().backfill()
+        print(f"Đã backfill skill/language cho {counts['cvs']} CV và {counts['jds']} JD")
+    except Exception as e:
+        print(f"Lỗi migration: {e}")
+
+if __name__ == "__main__":
+    migrate_skill_tables()